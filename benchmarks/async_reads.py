@@ -0,0 +1,93 @@
+"""
+Compare the sync (DRF) and async implementations of the read endpoints under
+uvicorn with many simultaneous keep-alive clients.
+
+    pip install uvicorn
+    python benchmarks/async_reads.py --clients 200 --duration 10
+
+The server is started twice against the benchmark database (see
+common.setup_django), once with ASYNC_READ_VIEWS=0 and once with
+ASYNC_READ_VIEWS=1. The benchmark accounts from common.prepare(), plus
+questions if the bank is empty, are created first.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from common import ROOT, http_request, latency_summary, prepare, setup_django, wait_for_port
+
+ENDPOINTS = ['/api/tournaments/leaderboard/', '/api/questions/random/', '/api/tournaments/active/']
+
+
+async def client(host, port, paths, token, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = 0
+    try:
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            status, _ = await http_request(reader, writer, host, 'GET', path, token)
+            latencies.append(time.perf_counter() - started)
+            if status >= 500:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def load(host, port, paths, token, clients, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    results = await asyncio.gather(
+        *(client(host, port, paths, token, deadline, latencies, errors) for _ in range(clients)),
+        return_exceptions=True
+    )
+    failed = [r for r in results if isinstance(r, Exception)]
+    return latencies, errors, failed
+
+
+def run(mode, args, token):
+    env = dict(os.environ, ASYNC_READ_VIEWS='1' if mode == 'async' else '0')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'myproject.asgi:application', '--host', args.host,
+         '--port', str(args.port), '--log-level', 'warning', '--no-access-log'],
+        cwd=ROOT, env=env
+    )
+    try:
+        wait_for_port(args.host, args.port)
+        latencies, errors, failed = asyncio.run(
+            load(args.host, args.port, ENDPOINTS, token, args.clients, args.duration)
+        )
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "mode": mode,
+        "clients": args.clients,
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / args.duration, 1),
+        **latency_summary(latencies),
+        "server_errors": len(errors),
+        "failed_clients": len(failed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    setup_django()
+    token = prepare()['player']
+    print(json.dumps([run(mode, args, token) for mode in ('sync', 'async')], indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Helpers shared by the benchmark scripts: Django setup, benchmark fixtures, a
+minimal keep-alive HTTP client and latency summaries.
+"""
+import json
+import os
+import socket
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PLAYER_EMAIL = 'benchmark@example.com'
+NEWCOMER_EMAIL = 'benchmark-newcomer@example.com'
+ADMIN_EMAIL = 'benchmark-admin@example.com'
+PASSWORD = 'benchmark'
+
+
+def setup_django():
+    """
+    Set up Django against DATABASE_URL, by default a benchmarks.sqlite3 of its
+    own next to db.sqlite3, and bring its schema up to date. Servers started by
+    the scripts inherit the same DATABASE_URL.
+    """
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///benchmarks.sqlite3')
+    import django
+    from django.core.management import call_command
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+
+def seed(scale, seed=0):
+    """Fill the database at one of myapp.seeding.SCALES unless it already has questions"""
+    from django.db import connection
+    from myapp.models import Question
+    from myapp.seeding import SCALES, Seeder, bulk_load_pragmas
+
+    if Question.objects.exists():
+        return None
+    with bulk_load_pragmas(connection):
+        return Seeder(seed=seed, log=lambda message: print(f"seeded {message}", file=sys.stderr)).run(SCALES[scale])
+
+
+def _user(email, **extra):
+    from myapp.models import User
+
+    user = User.objects.filter(email=email).first()
+    if user is None:
+        user = User.objects.create_user(
+            email=email, password=PASSWORD, full_name=email.split('@')[0].title(), date_of_birth='2000-01-01', **extra
+        )
+    return user
+
+
+def prepare():
+    """
+    Create the benchmark accounts and return their tokens: 'player' has an
+    active tournament, 'newcomer' has none and 'admin' is staff. Seeds a small
+    question bank if there is none.
+    """
+    from rest_framework.authtoken.models import Token
+    from myapp.models import Question, TournamentAttempt, TournamentQuestion
+    from myapp.question_bank import bulk_create_questions
+
+    player = _user(PLAYER_EMAIL)
+    newcomer = _user(NEWCOMER_EMAIL)
+    admin = _user(ADMIN_EMAIL, is_staff=True, is_superuser=True)
+    if not Question.objects.exists():
+        bulk_create_questions([
+            (f"Benchmark question {i}: what is {i} + {i}?",
+             [{"text": str(i * 2 + k), "index": k, "is_correct": k == 0} for k in range(4)])
+            for i in range(200)
+        ])
+    if not TournamentAttempt.objects.filter(user=player, completed=False).exists():
+        tournament = TournamentAttempt.objects.create(user=player)
+        TournamentQuestion.objects.bulk_create([
+            TournamentQuestion(tournament=tournament, question_id=question_id, position=i + 1)
+            for i, question_id in enumerate(Question.objects.order_by('id').values_list('id', flat=True)[:5])
+        ])
+    TournamentAttempt.objects.filter(user=newcomer, completed=False).delete()
+    return {user_name: Token.objects.get_or_create(user=user)[0].key
+            for user_name, user in (('player', player), ('newcomer', newcomer), ('admin', admin))}
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else (values[0] if values else 0)
+
+
+def latency_summary(latencies):
+    """p50/p95/p99 and mean of a list of seconds, in milliseconds"""
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0,
+    }
+
+
+def wait_for_port(host, port, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+async def http_request(reader, writer, host, method, path, token=None, body=None):
+    """
+    Send one HTTP/1.1 request on an open keep-alive connection and read the
+    response; returns (status, body bytes). Bodies are sent as JSON.
+    """
+    payload = b'' if body is None else json.dumps(body).encode()
+    head = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+    if token:
+        head += f"Authorization: Token {token}\r\n"
+    if body is not None:
+        head += f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+    writer.write(head.encode() + b"\r\n" + payload)
+    response = await reader.readuntil(b"\r\n\r\n")
+    status = int(response.split(b" ", 2)[1])
+    length = 0
+    for line in response.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    return status, await reader.readexactly(length)
@@ -0,0 +1,220 @@
+"""
+Per-endpoint micro-benchmarks through the Django test client.
+
+    python benchmarks/endpoints.py --scale medium --iterations 200 > before.json
+    python benchmarks/endpoints.py --only tournament --iterations 50
+
+Every API endpoint is called in-process with token authentication, the way a
+real client calls it, --iterations times after --warmup calls (or until it has
+used --max-seconds). Each call runs in a transaction that is rolled back
+afterwards, so write endpoints see the same database every time and runs can
+be compared with each other; on_commit work such as live updates is skipped.
+For each endpoint the JSON output gives latency percentiles and SQL queries
+per request.
+
+The benchmark database (see common.setup_django) is first seeded at --scale
+if it is empty (see myapp.seeding). Room endpoints also change in-memory room
+state, which is put back before each call. The server-sent event streams
+never finish, so they are left out.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from collections import Counter
+
+from common import NEWCOMER_EMAIL, PASSWORD, PLAYER_EMAIL, latency_summary, prepare, seed, setup_django
+
+
+def fixtures():
+    """Ids the request bodies refer to"""
+    from myapp import rooms
+    from myapp.models import HardQuestion, Question, TournamentAttempt, TournamentRoom, User
+
+    player = User.objects.get(email=PLAYER_EMAIL)
+    question = Question.objects.filter(choices__isnull=False).prefetch_related('choices').order_by('id').first()
+    choices = sorted(question.choices.all(), key=lambda choice: choice.index)
+    correct = next(choice for choice in choices if choice.is_correct)
+    quiz = [
+        {"question_id": q.id, "is_correct": True, "selected_choice_id": next(c.id for c in q.choices.all() if c.is_correct)}
+        for q in Question.objects.filter(choices__is_correct=True).prefetch_related('choices').order_by('id')[:5]
+    ]
+    hard = HardQuestion.objects.order_by('id').first()
+    tournament = TournamentAttempt.objects.filter(user=player, completed=False).order_by('-start_time').first()
+    room = TournamentRoom.objects.filter(host=player, status=TournamentRoom.LOBBY).first()
+    lobby = rooms.get_state(room.code) if room else rooms.create_room(player, 5, 20)
+    # A running room whose first question stays open for the whole run
+    running = rooms.create_room(player, 5, 3600)
+    rooms.start_room(running.code, player)
+    running.starts_at = time.time() - 1
+    return {
+        "question_id": question.id,
+        "choice_id": correct.id,
+        "quiz": quiz,
+        "hard_question_id": hard.id if hard else None,
+        "hard_answer": hard.correct_answer if hard else None,
+        "tournament_id": tournament.id,
+        "tournament_question_id": tournament.tournament_questions.order_by('position').first().id,
+        "player_id": player.id,
+        "newcomer_id": User.objects.get(email=NEWCOMER_EMAIL).id,
+        "lobby": lobby,
+        "running": running,
+    }
+
+
+def scenarios(ctx):
+    """(name, method, path, account, body, reset) for every endpoint; reset() runs before each call"""
+    from myapp.models import TournamentRoom
+
+    question_id, choice_id = ctx['question_id'], ctx['choice_id']
+    lobby, running = ctx['lobby'], ctx['running']
+
+    def leave_lobby():
+        lobby.players.pop(ctx['newcomer_id'], None)
+
+    def reopen_lobby():
+        lobby.status, lobby.starts_at = TournamentRoom.LOBBY, None
+
+    def unanswer():
+        running.players[ctx['player_id']].last_position = -1
+        running.pending_answers.clear()  # saved inside the rolled-back transaction
+
+    items = [
+        ('register', 'post', '/api/register/', None, {
+            "email": "benchmark-register@example.com", "full_name": "Register", "password": PASSWORD,
+            "password2": PASSWORD, "date_of_birth": "2000-01-01",
+        }),
+        ('login', 'post', '/api/login/', None, {"email": PLAYER_EMAIL, "password": PASSWORD}),
+        ('question-list', 'get', '/api/questions/create/', 'admin', None),
+        ('question-create', 'post', '/api/questions/create/?allow_duplicates=true', 'admin', {
+            "question_text": "Benchmark: which planet is known as the red planet?",
+            "choices": [{"text": text, "index": i, "is_correct": i == 1} for i, text in enumerate(
+                ("Venus", "Mars", "Jupiter", "Mercury")
+            )],
+        }),
+        ('question-search', 'get', '/api/questions/search/?q=what+is', 'admin', None),
+        ('question-stats', 'get', f'/api/questions/{question_id}/stats/', 'admin', None),
+        ('question-random', 'get', '/api/questions/random/', None, None),
+        ('question-random-multiple', 'get', '/api/questions/random-multiple/?count=10', 'player', None),
+        ('question-attempt', 'post', '/api/questions/attempt/', 'player', {
+            "question_id": question_id, "is_correct": True, "selected_choice_id": choice_id,
+        }),
+        ('question-attempt-public', 'post', '/api/questions/attempt/public/', None, {
+            "question_id": question_id, "is_correct": True, "selected_choice_id": choice_id,
+        }),
+        ('quiz-result', 'post', '/api/user/quiz-result/', 'player', {
+            "score": len(ctx['quiz']), "total": len(ctx['quiz']), "questions": ctx['quiz'],
+        }),
+        ('user-progress', 'get', '/api/user/progress/', 'player', None),
+        ('user-profile', 'get', '/api/user/profile/', 'player', None),
+        ('user-profile-update', 'put', '/api/user/profile/', 'player', {"full_name": "Benchmark Player"}),
+        ('review-due', 'get', '/api/review/due/', 'player', None),
+        ('tournament-leaderboard', 'get', '/api/tournaments/leaderboard/', None, None),
+        ('tournament-active', 'get', '/api/tournaments/active/', 'player', None),
+        ('tournament-start', 'post', '/api/tournaments/start/', 'newcomer', {}),
+        ('tournament-questions', 'get', f"/api/tournaments/{ctx['tournament_id']}/questions/", 'player', None),
+        ('tournament-submit', 'post', '/api/tournaments/submit-answer/', 'player', {
+            "tournament_question_id": ctx['tournament_question_id'], "selected_choice_id": choice_id,
+        }),
+        ('tournament-complete', 'post', '/api/tournaments/complete/', 'player', {
+            "tournament_id": ctx['tournament_id'], "time_spent": 42.5,
+        }),
+        ('room-create', 'post', '/api/rooms/create/', 'player', {"question_count": 5, "seconds_per_question": 20}),
+        ('room-detail', 'get', f"/api/rooms/{lobby.code}/", 'player', None),
+        ('room-join', 'post', f"/api/rooms/{lobby.code}/join/", 'newcomer', {}, leave_lobby),
+        ('room-start', 'post', f"/api/rooms/{lobby.code}/start/", 'player', {}, reopen_lobby),
+        ('room-answer', 'post', f"/api/rooms/{running.code}/answer/", 'player', {
+            "position": 0, "selected_choice_id": next(iter(running.answer_keys[0])),
+        }, unanswer),
+        ('hard-question-list', 'get', '/api/hard-questions/create/', 'admin', None),
+        ('hard-question-create', 'post', '/api/hard-questions/create/', 'admin', {
+            "question_text": "Benchmark: what is the cube root of 27?", "correct_answer": "3", "difficulty": 2,
+        }),
+        ('hard-question-random', 'get', '/api/hard-questions/random/?count=5', None, None),
+        ('metrics', 'get', '/api/metrics/', 'admin', None),
+    ]
+    if ctx['hard_question_id']:
+        hard_id, answer = ctx['hard_question_id'], ctx['hard_answer']
+        items += [
+            ('hard-question-stats', 'get', f'/api/hard-questions/{hard_id}/stats/', 'admin', None),
+            ('hard-question-attempt', 'post', '/api/hard-questions/attempt/', 'player', {
+                "question_id": hard_id, "user_answer": answer,
+            }),
+            ('hard-question-attempt-public', 'post', '/api/hard-questions/attempt/public/', None, {
+                "question_id": hard_id, "user_answer": answer,
+            }),
+            ('hard-quiz-result', 'post', '/api/hard-questions/quiz-result/', 'player', {
+                "score": 1, "total": 1, "questions": [{"question_id": hard_id, "user_answer": answer, "is_correct": True}],
+            }),
+        ]
+    return [item if len(item) == 6 else item + (None,) for item in items]
+
+
+def measure(client, method, path, headers, body, reset, args):
+    from django.db import connection, reset_queries, transaction
+    from django.test.utils import CaptureQueriesContext
+
+    latencies, queries, statuses = [], [], Counter()
+    budget = time.perf_counter() + args.max_seconds
+    for i in range(args.warmup + args.iterations):
+        if reset is not None:
+            reset()
+        reset_queries()  # the log holds at most 9000 queries, after which nothing more is captured
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, method)(path, body, content_type='application/json', **headers)
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        if i >= args.warmup:
+            latencies.append(elapsed)
+            queries.append(len(captured))
+            statuses[response.status_code] += 1
+            if time.perf_counter() > budget:
+                break
+    return latencies, queries, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=10.0, help="Time budget per endpoint")
+    parser.add_argument('--scale', default='small', help="Seeding scale for an empty database")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', help="Run only endpoints whose name contains this text")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    seed(args.scale, args.seed)
+    tokens = prepare()
+    ctx = fixtures()
+    client = Client()
+
+    results = []
+    for name, method, path, account, body, reset in scenarios(ctx):
+        if args.only and args.only not in name:
+            continue
+        headers = {'HTTP_AUTHORIZATION': f'Token {tokens[account]}'} if account else {}
+        latencies, queries, statuses = measure(client, method, path, headers, body, reset, args)
+        results.append({
+            "endpoint": name,
+            "method": method.upper(),
+            "path": path,
+            "requests": len(latencies),
+            **latency_summary(latencies),
+            "queries_per_request": round(statistics.fmean(queries), 2) if queries else 0,
+            "max_queries": max(queries, default=0),
+            "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        })
+        print(f"{name}: {results[-1]['p50_ms']} ms p50, {results[-1]['queries_per_request']} queries", file=sys.stderr)
+    print(json.dumps({"scale": args.scale, "iterations": args.iterations, "endpoints": results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Concurrent load against a local server with a realistic mix of reads and writes.
+
+    pip install uvicorn
+    python benchmarks/load.py --workers 4 --connections 50 --duration 30 > load.json
+    python benchmarks/load.py --url 127.0.0.1:8000   # an already running server
+
+Unless --url is given, uvicorn is started against the benchmark database (see
+common.setup_django), seeded at --scale first if it is empty. --workers client
+processes each keep --connections keep-alive connections busy for --duration
+seconds, picking endpoints from MIX by weight. Writes are committed, as in
+production.
+
+The JSON output has throughput, p50/p95/p99 latency per endpoint and overall,
+and SQL queries per request taken from the server's own metrics endpoint
+before and after the run. Metrics are per server process, so query counts are
+only complete with one server worker (the default).
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+
+from common import ROOT, http_request, latency_summary, prepare, seed, setup_django, wait_for_port
+
+# (URL name, weight, method, path, account, body); bodies may use the fixture ids in {braces}
+MIX = [
+    ('tournament-leaderboard', 20, 'GET', '/api/tournaments/leaderboard/', None, None),
+    ('random-question', 15, 'GET', '/api/questions/random/', None, None),
+    ('random-multiple-questions', 10, 'GET', '/api/questions/random-multiple/?count=10', 'player', None),
+    ('random-hard-questions', 5, 'GET', '/api/hard-questions/random/?count=5', None, None),
+    ('tournament-active', 10, 'GET', '/api/tournaments/active/', 'player', None),
+    ('user-progress', 5, 'GET', '/api/user/progress/', 'player', None),
+    ('user-profile', 5, 'GET', '/api/user/profile/', 'player', None),
+    ('review-due', 5, 'GET', '/api/review/due/', 'player', None),
+    ('question-attempt', 15, 'POST', '/api/questions/attempt/', 'player', {
+        "question_id": "{question_id}", "is_correct": True, "selected_choice_id": "{choice_id}",
+    }),
+    ('hard-question-attempt', 5, 'POST', '/api/hard-questions/attempt/', 'player', {
+        "question_id": "{hard_question_id}", "user_answer": "{hard_answer}",
+    }),
+    ('quiz-result', 5, 'POST', '/api/user/quiz-result/', 'player', {
+        "score": 1, "total": 1,
+        "questions": [{"question_id": "{question_id}", "is_correct": True, "selected_choice_id": "{choice_id}"}],
+    }),
+]
+
+_METRIC_RE = re.compile(r'^myapp_request_queries_(sum|count)\{view="([^"]*)"\} (\S+)$', re.MULTILINE)
+
+
+def fixtures():
+    from myapp.models import Choice, HardQuestion
+
+    choice = Choice.objects.filter(is_correct=True).order_by('question_id').first()
+    hard = HardQuestion.objects.order_by('id').first()
+    return {
+        "question_id": choice.question_id,
+        "choice_id": choice.id,
+        "hard_question_id": hard.id if hard else None,
+        "hard_answer": hard.correct_answer if hard else None,
+    }
+
+
+def fill(body, ids):
+    """The body with "{name}" placeholders replaced by fixture ids"""
+    if isinstance(body, dict):
+        return {key: fill(value, ids) for key, value in body.items()}
+    if isinstance(body, list):
+        return [fill(value, ids) for value in body]
+    if isinstance(body, str) and body.startswith('{') and body.endswith('}'):
+        return ids[body[1:-1]]
+    return body
+
+
+async def connection(host, port, requests, tokens, deadline, results):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for name, method, path, account, body in requests:
+            if time.perf_counter() >= deadline:
+                break
+            started = time.perf_counter()
+            status, _ = await http_request(reader, writer, host, method, path, tokens.get(account), body)
+            latencies, statuses = results[name]
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+    finally:
+        writer.close()
+
+
+def worker(job):
+    """One client process: returns {endpoint: (latencies, statuses)}"""
+    index, args, host, port, tokens, mix = job
+    rng = random.Random(args.seed + index)
+    weights = [item[1] for item in mix]
+    results = defaultdict(lambda: ([], Counter()))
+
+    def requests():
+        while True:
+            name, _, method, path, account, body = rng.choices(mix, weights)[0]
+            yield name, method, path, account, body
+
+    async def run():
+        deadline = time.perf_counter() + args.duration
+        outcomes = await asyncio.gather(
+            *(connection(host, port, requests(), tokens, deadline, results) for _ in range(args.connections)),
+            return_exceptions=True
+        )
+        return sum(isinstance(outcome, Exception) for outcome in outcomes)
+
+    failed = asyncio.run(run())
+    return {name: (latencies, dict(statuses)) for name, (latencies, statuses) in results.items()}, failed
+
+
+def scrape_queries(host, port, token):
+    """view -> (total queries, requests) from the metrics endpoint"""
+    async def fetch():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            return await http_request(reader, writer, host, 'GET', '/api/metrics/', token)
+        finally:
+            writer.close()
+
+    status, body = asyncio.run(fetch())
+    if status != 200:
+        return {}
+    totals = defaultdict(lambda: [0.0, 0.0])
+    for kind, view, value in _METRIC_RE.findall(body.decode()):
+        totals[view][0 if kind == 'sum' else 1] = float(value)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--connections', type=int, default=25, help="Connections per worker")
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--url', help="host:port of a running server; otherwise uvicorn is started")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--server-workers', type=int, default=1)
+    parser.add_argument('--scale', default='small', help="Seeding scale for an empty database")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    seed(args.scale, args.seed)
+    tokens = prepare()
+    ids = fixtures()
+    mix = [
+        (name, weight, method, path, account, fill(body, ids))
+        for name, weight, method, path, account, body in MIX
+        if ids['hard_question_id'] or 'hard' not in name
+    ]
+
+    server = None
+    host, port = args.host, args.port
+    if args.url:
+        host, port = args.url.rsplit(':', 1)
+        port = int(port)
+    else:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'myproject.asgi:application', '--host', host, '--port', str(port),
+             '--workers', str(args.server_workers), '--log-level', 'warning', '--no-access-log'],
+            cwd=ROOT, env=dict(os.environ, INSTRUMENTATION_SAMPLE_RATE='1.0')
+        )
+    try:
+        wait_for_port(host, port)
+        before = scrape_queries(host, port, tokens['admin'])
+        started = time.perf_counter()
+        with multiprocessing.Pool(args.workers) as pool:
+            outcomes = pool.map(worker, [(i, args, host, port, tokens, mix) for i in range(args.workers)])
+        elapsed = time.perf_counter() - started
+        after = scrape_queries(host, port, tokens['admin'])
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    merged = defaultdict(lambda: ([], Counter()))
+    for results, _ in outcomes:
+        for name, (latencies, statuses) in results.items():
+            merged[name][0].extend(latencies)
+            merged[name][1].update(statuses)
+
+    endpoints = []
+    for name, (latencies, statuses) in sorted(merged.items()):
+        queries, requests = (after.get(name, (0, 0))[i] - before.get(name, (0, 0))[i] for i in (0, 1))
+        endpoints.append({
+            "endpoint": name,
+            "requests": len(latencies),
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            **latency_summary(latencies),
+            "queries_per_request": round(queries / requests, 2) if requests else None,
+            "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        })
+    everything = [latency for latencies, _ in merged.values() for latency in latencies]
+    print(json.dumps({
+        "workers": args.workers,
+        "connections": args.workers * args.connections,
+        "duration_s": round(elapsed, 2),
+        "requests": len(everything),
+        "requests_per_second": round(len(everything) / elapsed, 1),
+        **latency_summary(everything),
+        "failed_connections": sum(failed for _, failed in outcomes),
+        "endpoints": endpoints,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
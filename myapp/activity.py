@@ -0,0 +1,178 @@
+"""
+Per-user daily activity rollups and streaks.
+
+Every answer, hard question attempt and tournament start adds to the user's
+DailyActivity row for that day, in the user's own timezone, and to their
+ActivitySummary, in the same transaction as the write; a batch of answers
+updates each of those rows once. Progress figures for any recent window are
+then a short range read on the (user, day) unique index, and lifetime totals
+and streaks are a single row.
+"""
+from datetime import timedelta
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import F
+
+from . import archive
+from .models import ActivitySummary, DailyActivity
+from .timewindows import local_day
+
+COUNTERS = ('answers', 'correct_answers', 'hard_attempts', 'hard_correct', 'tournaments')
+SPARKLINE_DAYS = 30
+
+
+def advance_streak(summary, day):
+    """Extend or restart the streak for activity on `day`; earlier days don't change it"""
+    last = summary.last_active_day
+    if last is not None and day <= last:
+        return
+    if last is not None and day == last + timedelta(days=1):
+        summary.current_streak += 1
+    else:
+        summary.current_streak = 1
+    summary.longest_streak = max(summary.longest_streak, summary.current_streak)
+    summary.last_active_day = day
+
+
+def record(user, when, **counts):
+    """Add counts (keyword arguments named after COUNTERS) to the user's rollups"""
+    record_many([(user, when, counts)])
+
+
+def record_many(records):
+    """
+    Add (user, when, counts) records, counts keyed by COUNTERS, to their users'
+    rollups with the same few queries however many records and users there are.
+    """
+    records = list(records)
+    fields = [field for field in COUNTERS if any(field in counts for _, _, counts in records)]
+    days = {}  # (user_id, day) -> counters
+    for user, when, counts in records:
+        totals = days.setdefault((user.id, local_day(user, when)), dict.fromkeys(fields, 0))
+        for field, value in counts.items():
+            totals[field] += value
+    if not days:
+        return
+    user_ids = {user_id for user_id, _ in days}
+
+    with transaction.atomic():
+        DailyActivity.objects.bulk_create(
+            [DailyActivity(user_id=user_id, day=day) for user_id, day in days], ignore_conflicts=True
+        )
+        rows = DailyActivity.objects.filter(
+            user_id__in=user_ids, day__in={day for _, day in days}
+        ).only('id', 'user_id', 'day')
+        changed = []
+        for row in rows:
+            totals = days.get((row.user_id, row.day))
+            if totals is not None:
+                for field, value in totals.items():
+                    setattr(row, field, F(field) + value)
+                changed.append(row)
+        DailyActivity.objects.bulk_update(changed, fields)
+
+        ActivitySummary.objects.bulk_create(
+            [ActivitySummary(user_id=user_id) for user_id in user_ids], ignore_conflicts=True
+        )
+        summaries = {
+            summary.user_id: summary
+            for summary in ActivitySummary.objects.select_for_update().filter(user_id__in=user_ids).order_by('pk')
+        }
+        for (user_id, day), totals in sorted(days.items()):
+            summary = summaries[user_id]
+            for field, value in totals.items():
+                setattr(summary, field, getattr(summary, field) + value)
+            advance_streak(summary, day)
+        ActivitySummary.objects.bulk_update(
+            summaries.values(), fields + ['current_streak', 'longest_streak', 'last_active_day']
+        )
+
+
+def current_streak(summary, today):
+    """The stored streak, or 0 once a whole day has passed without activity"""
+    if summary is None or summary.last_active_day is None:
+        return 0
+    if summary.last_active_day >= today - timedelta(days=1):
+        return summary.current_streak
+    return 0
+
+
+def daily_rows(user, first_day, last_day):
+    """Map day -> DailyActivity for a window, from one index range read"""
+    rows = DailyActivity.objects.filter(user=user, day__gte=first_day, day__lte=last_day)
+    return {row.day: row for row in rows}
+
+
+def window_totals(rows_by_day, first_day, last_day):
+    totals = dict.fromkeys(COUNTERS, 0)
+    for day, row in rows_by_day.items():
+        if first_day <= day <= last_day:
+            for field in COUNTERS:
+                totals[field] += getattr(row, field)
+    return totals
+
+
+def sparkline(rows_by_day, first_day, last_day):
+    days = []
+    day = first_day
+    while day <= last_day:
+        row = rows_by_day.get(day)
+        days.append({
+            "day": day,
+            "answers": row.answers if row else 0,
+            "correct_answers": row.correct_answers if row else 0,
+            "hard_attempts": row.hard_attempts if row else 0,
+            "tournaments": row.tournaments if row else 0,
+        })
+        day += timedelta(days=1)
+    return days
+
+
+def rebuild(get_model):
+    """
+    Recompute every DailyActivity and ActivitySummary row from the attempt tables
+    and their archives.
+    `get_model` is apps.get_model, so migrations can pass their historical registry.
+    """
+    User = get_model('myapp', 'User')
+    DailyActivity = get_model('myapp', 'DailyActivity')
+    ActivitySummary = get_model('myapp', 'ActivitySummary')
+    sources = (
+        (get_model('myapp', 'UserAnswer'), 'created_at', 'answers', 'correct_answers'),
+        (get_model('myapp', 'HardQuestionAttempt'), 'created_at', 'hard_attempts', 'hard_correct'),
+        (get_model('myapp', 'TournamentAttempt'), 'start_time', 'tournaments', None),
+    )
+
+    # Older historical models (migration 0012) predate User.timezone and count in UTC
+    user_fields = [f.name for f in User._meta.concrete_fields if f.name in ('id', 'timezone')]
+    users = {user.id: user for user in User.objects.only(*user_fields)}
+    days = {}  # (user_id, day) -> counters
+    for model, time_field, count_field, correct_field in sources:
+        fields = ['user_id', time_field] + (['is_correct'] if correct_field else [])
+        archived = archive.rows(get_model, model, fields)
+        for row in chain(archived, model.objects.order_by().values_list(*fields).iterator(chunk_size=10000)):
+            user = users.get(row[0])
+            if user is None:
+                continue  # archived rows of a deleted user
+            counters = days.setdefault((row[0], local_day(user, row[1])), dict.fromkeys(COUNTERS, 0))
+            counters[count_field] += 1
+            if correct_field and row[2]:
+                counters[correct_field] += 1
+
+    summaries = {}
+    for (user_id, day), counters in sorted(days.items()):
+        summary = summaries.setdefault(user_id, ActivitySummary(user_id=user_id))
+        for field in COUNTERS:
+            setattr(summary, field, getattr(summary, field) + counters[field])
+        advance_streak(summary, day)
+
+    with transaction.atomic():
+        DailyActivity.objects.all().delete()
+        ActivitySummary.objects.all().delete()
+        DailyActivity.objects.bulk_create(
+            (DailyActivity(user_id=user_id, day=day, **counters) for (user_id, day), counters in days.items()),
+            batch_size=2000
+        )
+        ActivitySummary.objects.bulk_create(summaries.values(), batch_size=2000)
+    return len(days), len(summaries)
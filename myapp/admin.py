@@ -2,7 +2,14 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.forms import ReadOnlyPasswordHashField
 from django import forms
-from .models import User, Question, Choice, QuestionAttempt, HardQuestion, HardQuestionAttempt
+from django.core.exceptions import ObjectDoesNotExist
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from .models import ArchiveFile, User, Question, Choice, QuestionAttempt, HardQuestion, HardQuestionAttempt
+from . import slowqueries
+from .dedupe import index_questions
+from .search import search_ids
+from .stats import accuracy
 
 class UserCreationForm(forms.ModelForm):
     password1 = forms.CharField(label='Password', widget=forms.PasswordInput)
@@ -62,19 +69,56 @@ class ChoiceInline(admin.TabularInline):
     model = Choice
     extra = 4
 
-class QuestionAdmin(admin.ModelAdmin):
-    list_display = ('question_text', 'created_at')
+class FullTextSearchMixin:
+    """Answer changelist searches from the FTS index instead of LIKE scans"""
+    search_result_limit = 1000
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        ids = search_ids(self.model, search_term, limit=self.search_result_limit)
+        if ids is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(id__in=ids), False
+
+class AnswerStatsMixin:
+    """Attempt and accuracy columns read from the per-question stats rollup"""
+    list_select_related = ('stats',)
+
+    def _stats(self, obj):
+        try:
+            return obj.stats
+        except ObjectDoesNotExist:
+            return None
+
+    @admin.display(description='Attempts')
+    def attempts(self, obj):
+        stats = self._stats(obj)
+        return stats.attempts if stats else 0
+
+    @admin.display(description='Accuracy')
+    def accuracy(self, obj):
+        value = accuracy(self._stats(obj))
+        return f"{value:.0f}%" if value is not None else '-'
+
+class QuestionAdmin(AnswerStatsMixin, FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ('question_text', 'attempts', 'accuracy', 'created_at')
     inlines = [ChoiceInline]
     search_fields = ['question_text']
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Choices are saved with the inlines, so the question can be indexed only now
+        index_questions([form.instance])
+
 class QuestionAttemptAdmin(admin.ModelAdmin):
     list_display = ('user', 'question', 'is_correct', 'created_at')
     list_filter = ('is_correct', 'created_at')
     search_fields = ['user__email', 'question__question_text']
 
 # Hard Question admin interfaces
-class HardQuestionAdmin(admin.ModelAdmin):
-    list_display = ('question_text', 'correct_answer', 'difficulty', 'created_at')
+class HardQuestionAdmin(AnswerStatsMixin, FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ('question_text', 'correct_answer', 'difficulty', 'attempts', 'accuracy', 'created_at')
     list_filter = ('difficulty', 'created_at')
     search_fields = ['question_text', 'correct_answer']
     fieldsets = (
@@ -88,8 +132,37 @@ class HardQuestionAttemptAdmin(admin.ModelAdmin):
     search_fields = ['user__email', 'question__question_text', 'user_answer']
     readonly_fields = ('user', 'question', 'user_answer', 'is_correct', 'created_at')
 
+class ArchiveFileAdmin(admin.ModelAdmin):
+    """The archive ledger is written only by archive_attempts (see myapp/archive.py)"""
+    list_display = ('path', 'table', 'month', 'rows', 'first_id', 'last_id', 'created_at')
+    list_filter = ('table', 'month')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 admin.site.register(User, UserAdmin)
 admin.site.register(Question, QuestionAdmin)
 admin.site.register(QuestionAttempt, QuestionAttemptAdmin)
 admin.site.register(HardQuestion, HardQuestionAdmin)
-admin.site.register(HardQuestionAttempt, HardQuestionAttemptAdmin)
\ No newline at end of file
+admin.site.register(HardQuestionAttempt, HardQuestionAttemptAdmin)
+admin.site.register(ArchiveFile, ArchiveFileAdmin)
+
+
+def slow_query_log_view(request):
+    """Browse this process's slow-query log (see myapp/slowqueries.py); POST clears it"""
+    if request.method == 'POST':
+        slowqueries.reset()
+        return redirect(request.path)
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Slow queries',
+        'entries': sorted(slowqueries.entries(), key=lambda entry: entry.total_ms, reverse=True),
+        'threshold_ms': slowqueries.get_threshold_ms(),
+    }
+    return TemplateResponse(request, 'admin/slow_queries.html', context)
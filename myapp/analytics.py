@@ -0,0 +1,194 @@
+"""
+Cohort analytics for admin reporting.
+
+Grouping with Django aggregates costs one query per cohort, or per question
+and cohort. Instead each report loads the columns it needs once into NumPy
+arrays, maps every user to a cohort index, and computes all groups in one
+pass: sums with np.bincount over (flattened) group indexes, and maxima with
+np.maximum.at, which has no bincount equivalent.
+
+Cohorts are a user's signup week (weeks start on Monday, UTC) or age band.
+Per-user totals come from ActivitySummary, which also counts archived
+answers. The question matrix reads the answers themselves, archives
+included.
+
+Reports are cached under a key that includes data_version(), a handful of
+index lookups that change whenever users, answers or attempts are added,
+rows are archived, or the question bank changes. Deletions don't change the
+version, so cached reports also expire after ANALYTICS_CACHE_SECONDS.
+"""
+from datetime import date
+
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from . import archive, question_pool
+from .models import ActivitySummary, ArchiveFile, HardQuestionAttempt, Question, User, UserAnswer
+
+COHORTS = ('signup_week', 'age_band')
+AGE_BANDS = ((0, 'under 18'), (18, '18-24'), (25, '25-34'), (35, '35-44'), (45, '45-54'), (55, '55-64'), (65, '65+'))
+MATRIX_LIMIT = 50
+EPOCH = date(1970, 1, 1)
+
+
+def get_cache_seconds():
+    return getattr(settings, 'ANALYTICS_CACHE_SECONDS', 3600)
+
+
+def _latest_id(model):
+    return model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def data_version():
+    return '-'.join(str(part) for part in (
+        _latest_id(User), _latest_id(UserAnswer), _latest_id(HardQuestionAttempt), _latest_id(ArchiveFile),
+        question_pool.bank_version('question'),
+    ))
+
+
+def cached(name, compute, *args):
+    key = f"analytics:{name}:{':'.join(map(str, args))}:{data_version()}"
+    return cache.get_or_set(key, lambda: compute(*args), get_cache_seconds())
+
+
+def _columns(queryset, columns, dtype):
+    """
+    One array per column of a values_list() queryset. Rows are read in chunks
+    straight from the driver, skipping Django's per-value converters.
+    """
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    chunks = []
+    with connections[queryset.db].chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(50000):
+            chunks.append(np.array(rows, dtype=dtype).reshape(-1, len(columns)))
+    table = np.concatenate(chunks) if chunks else np.empty((0, len(columns)), dtype)
+    return [table[:, i] for i in range(len(columns))]
+
+
+def user_cohorts(by, today=None):
+    """Sorted user ids, the cohort index of each user, and the cohort labels"""
+    rows = list(User.objects.order_by('pk').values_list('pk', 'created_at' if by == 'signup_week' else 'date_of_birth'))
+    user_ids = np.array([pk for pk, _ in rows], dtype=np.int64)
+    # created_at is an aware UTC datetime, date_of_birth a date
+    days = np.array(
+        [((value.date() if by == 'signup_week' else value) - EPOCH).days for _, value in rows], dtype='datetime64[D]'
+    )
+
+    if by == 'signup_week':
+        # 1970-01-01 was a Thursday, so Monday-based weeks start 3 days earlier
+        week = (days.astype(np.int64) + 3) // 7
+        weeks, cohort = np.unique(week, return_inverse=True)
+        labels = [str(np.datetime64(int(w) * 7 - 3, 'D')) for w in weeks]
+        return user_ids, cohort, labels
+
+    today = today or date.today()
+    years = days.astype('datetime64[Y]').astype(np.int64) + 1970
+    months = days.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    month_days = (days - days.astype('datetime64[M]')).astype(np.int64) + 1
+    birthday_ahead = (months > today.month) | ((months == today.month) & (month_days > today.day))
+    age = today.year - years - birthday_ahead
+    edges = np.array([edge for edge, _ in AGE_BANDS])
+    cohort = np.searchsorted(edges, age, side='right') - 1
+    return user_ids, np.maximum(cohort, 0), [label for _, label in AGE_BANDS]
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = numerator / denominator * 100
+    return [round(float(value), 2) if denominator_value else None
+            for value, denominator_value in zip(values, denominator)]
+
+
+def compute_cohort_report(by):
+    user_ids, cohort, labels = user_cohorts(by)
+    n = len(labels)
+    fields = ('user_id', 'answers', 'correct_answers', 'hard_attempts', 'hard_correct', 'longest_streak')
+    summary_user, answers, correct, hard, hard_correct, streak = _columns(
+        ActivitySummary.objects.order_by().values_list(*fields), fields, np.int64
+    )
+    # Summaries belong to existing users; map each one to its user's cohort
+    summary_cohort = cohort[np.searchsorted(user_ids, summary_user)]
+    active = (answers > 0) | (hard > 0)
+
+    def total(weights):
+        return np.bincount(summary_cohort, weights=weights, minlength=n)
+
+    longest = np.zeros(n, dtype=np.int64)
+    np.maximum.at(longest, summary_cohort, streak)
+    users = np.bincount(cohort, minlength=n)
+    active_users = total(active)
+    answer_totals, correct_totals = total(answers), total(correct)
+    hard_totals, hard_correct_totals = total(hard), total(hard_correct)
+    accuracy, hard_accuracy = _ratio(correct_totals, answer_totals), _ratio(hard_correct_totals, hard_totals)
+
+    return {
+        "by": by,
+        "cohorts": [
+            {
+                "cohort": labels[i],
+                "users": int(users[i]),
+                "active_users": int(active_users[i]),
+                "answers": int(answer_totals[i]),
+                "correct_answers": int(correct_totals[i]),
+                "accuracy": accuracy[i],
+                "hard_attempts": int(hard_totals[i]),
+                "hard_correct": int(hard_correct_totals[i]),
+                "hard_accuracy": hard_accuracy[i],
+                "longest_streak": int(longest[i]),
+            }
+            for i in range(n) if users[i]
+        ],
+    }
+
+
+def compute_question_matrix(by, limit=MATRIX_LIMIT):
+    """Accuracy of the `limit` most answered questions, per cohort"""
+    user_ids, cohort, labels = user_cohorts(by)
+    n = len(labels)
+    fields = ('user_id', 'question_id', 'is_correct')
+    answer_user, question, outcome = _columns(UserAnswer.objects.order_by().values_list(*fields), fields, np.int64)
+    archived = np.array(list(archive.rows(apps.get_model, UserAnswer, fields)), np.int64).reshape(-1, 3)
+    if len(archived):
+        answer_user = np.concatenate([archived[:, 0], answer_user])
+        question = np.concatenate([archived[:, 1], question])
+        outcome = np.concatenate([archived[:, 2], outcome])
+
+    question_ids = np.array(Question.objects.order_by('pk').values_list('pk', flat=True), dtype=np.int64)
+    # Archived answers may belong to users or questions deleted since
+    known = np.isin(answer_user, user_ids) & np.isin(question, question_ids)
+    answer_cohort = cohort[np.searchsorted(user_ids, answer_user[known])]
+    question_index = np.searchsorted(question_ids, question[known])
+
+    cells = question_index * n + answer_cohort
+    attempts = np.bincount(cells, minlength=len(question_ids) * n).reshape(-1, n)
+    correct = np.bincount(cells, weights=outcome[known], minlength=len(question_ids) * n).reshape(-1, n)
+
+    totals = attempts.sum(axis=1)
+    top = np.argsort(-totals, kind='stable')[:limit]
+    top = top[totals[top] > 0]
+    texts = dict(Question.objects.filter(pk__in=question_ids[top].tolist()).values_list('pk', 'question_text'))
+    return {
+        "by": by,
+        "cohorts": labels,
+        "questions": [
+            {
+                "question_id": int(question_ids[i]),
+                "question_text": texts.get(int(question_ids[i])),
+                "attempts": attempts[i].tolist(),
+                "accuracy": _ratio(correct[i], attempts[i]),
+            }
+            for i in top
+        ],
+    }
+
+
+def cohort_report(by):
+    return cached('cohorts', compute_cohort_report, by)
+
+
+def question_matrix(by, limit=MATRIX_LIMIT):
+    return cached('question_matrix', compute_question_matrix, by, limit)
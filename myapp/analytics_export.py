@@ -0,0 +1,266 @@
+"""
+Columnar exports of the attempt history for offline analysis.
+
+Each table is written as typed NumPy arrays, one per column, which pandas and
+NumPy read without parsing:
+
+    <directory>/useranswer/000000000001.npz
+    <directory>/_watermarks.json
+
+An export only covers rows with an id above the table's watermark from the
+previous run, and the file is named after the first id it could contain. A
+run that fails before updating the watermarks is simply redone by the next
+one, which overwrites the partial file. Rows are streamed through the same
+chunked cursor QuerySet.iterator() uses, a server-side cursor on PostgreSQL,
+but as the driver returns them: Django's per-value timestamp converters
+would cost more than the rest of the export. Chunks are appended to raw column files and the arrays are assembled
+from those, so memory stays constant however large the export.
+
+Files are compressed .npz by default. With compress=False each export is a
+directory of .npy files that load(mmap=True) maps without copying.
+
+Column types: ids and counts are int64 or int32, booleans bool, floats
+float64 with NaN for NULL, timestamps datetime64[us] in UTC with NaT for
+NULL. Text columns are stored Arrow-style as `<name>.data`, the UTF-8 bytes of
+all values, and `<name>.offsets`, n + 1 positions into them; strings() decodes
+them.
+
+UserAnswer and HardQuestionAttempt rows never change once written.
+Tournaments do until they are completed, so a tournament export stops before
+the oldest tournament that is still open and was started less than
+`settle` ago. Tournament questions follow their tournament's watermark.
+"""
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+import numpy as np
+from django.db import connections, models
+from django.utils import timezone
+
+from .models import HardQuestionAttempt, TournamentAttempt, TournamentQuestion, UserAnswer
+
+WATERMARKS = '_watermarks.json'
+CHUNK_SIZE = 20000
+SETTLE = timedelta(hours=24)
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+NAT = np.iinfo(np.int64).min
+
+TABLES = {
+    'useranswer': UserAnswer,
+    'hardquestionattempt': HardQuestionAttempt,
+    'tournamentattempt': TournamentAttempt,
+    'tournamentquestion': TournamentQuestion,
+}
+
+
+def column_kind(field):
+    if isinstance(field, models.BooleanField):
+        return 'bool'
+    if isinstance(field, models.DateTimeField):
+        return 'datetime'
+    if isinstance(field, models.FloatField):
+        return 'float'
+    if isinstance(field, (models.CharField, models.TextField)):
+        return 'text'
+    if isinstance(field, (models.IntegerField, models.SmallIntegerField)) and not field.primary_key:
+        return 'int32'
+    return 'int64'  # ids and foreign keys
+
+
+def _microseconds(value):
+    """Microseconds since the epoch of a driver timestamp: naive UTC on SQLite, aware on PostgreSQL"""
+    if value is None:
+        return NAT
+    if value.tzinfo is not None:
+        value = value.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // MICROSECOND
+
+
+class ColumnWriter:
+    """Appends chunks of rows to raw per-column files, then assembles them into .npy arrays"""
+
+    def __init__(self, path, fields):
+        self.path = path
+        self.fields = fields
+        self.rows = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.workdir = Path(tempfile.mkdtemp(prefix=f'.{path.name}.', dir=path.parent))
+        self.arrays = {}  # array name -> (dtype, raw file)
+        self.text_sizes = {}  # text column -> bytes written so far
+        for field in fields:
+            kind = column_kind(field)
+            if kind == 'text':
+                self._open(f'{field.attname}.data', np.uint8)
+                self._open(f'{field.attname}.offsets', np.int64).write(np.zeros(1, np.int64).tobytes())
+                self.text_sizes[field.attname] = 0
+            else:
+                dtype = {'bool': np.bool_, 'datetime': 'datetime64[us]', 'float': np.float64}.get(kind, kind)
+                self._open(field.attname, dtype)
+
+    def _open(self, name, dtype):
+        raw = open(self.workdir / f'{name}.raw', 'wb')
+        self.arrays[name] = (np.dtype(dtype), raw)
+        return raw
+
+    def append(self, rows):
+        for i, field in enumerate(self.fields):
+            kind = column_kind(field)
+            values = [row[i] for row in rows]
+            name = field.attname
+            if kind == 'text':
+                encoded = [(value or '').encode() for value in values]
+                ends = np.cumsum([len(value) for value in encoded], dtype=np.int64) + self.text_sizes[name]
+                self.arrays[f'{name}.data'][1].write(b''.join(encoded))
+                self.arrays[f'{name}.offsets'][1].write(ends.tobytes())
+                if len(ends):
+                    self.text_sizes[name] = int(ends[-1])
+                continue
+            dtype, raw = self.arrays[name]
+            if kind == 'datetime':
+                array = np.array([_microseconds(value) for value in values], np.int64).view(dtype)
+            elif kind == 'float':
+                array = np.array([np.nan if value is None else value for value in values], dtype)
+            else:
+                array = np.array(values, dtype)
+            raw.write(array.tobytes())
+        self.rows += len(rows)
+
+    def finish(self, compress=True):
+        """Write the .npz file, or the directory of .npy files, and remove the raw files"""
+        target = self.path.with_suffix('.npz') if compress else self.path
+        staged = self.workdir / target.name
+        try:
+            if compress:
+                with zipfile.ZipFile(staged, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+                    for name in self.arrays:
+                        with archive.open(f'{name}.npy', 'w', force_zip64=True) as member:
+                            self._copy_array(name, member)
+            else:
+                staged.mkdir()
+                for name in self.arrays:
+                    with open(staged / f'{name}.npy', 'wb') as out:
+                        self._copy_array(name, out)
+            if target.is_dir():
+                shutil.rmtree(target)
+            os.replace(staged, target)
+        finally:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+        return target
+
+    def _copy_array(self, name, out):
+        dtype, raw = self.arrays[name]
+        raw.close()
+        size = os.path.getsize(raw.name)
+        header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False,
+                  'shape': (size // dtype.itemsize,)}
+        np.lib.format.write_array_header_1_0(out, header)
+        with open(raw.name, 'rb') as source:
+            shutil.copyfileobj(source, out, 1 << 20)
+
+
+def read_watermarks(directory):
+    try:
+        with open(Path(directory) / WATERMARKS) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_watermarks(directory, watermarks):
+    path = Path(directory) / WATERMARKS
+    partial = path.with_name(path.name + '.partial')
+    with open(partial, 'w') as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+    os.replace(partial, path)
+
+
+def export_bounds(table, after_id, now=None, settle=SETTLE):
+    """The rows of one increment, and the new watermark (None if there is nothing to export)"""
+    if table in ('tournamentattempt', 'tournamentquestion'):
+        tournaments = TournamentAttempt.objects.filter(pk__gt=after_id)
+        open_since = tournaments.filter(
+            completed=False, start_time__gte=(now or timezone.now()) - settle
+        ).order_by('pk').values_list('pk', flat=True).first()
+        if open_since is not None:
+            tournaments = tournaments.filter(pk__lt=open_since)
+        upper = tournaments.order_by('-pk').values_list('pk', flat=True).first()
+        if upper is None:
+            return None, None
+        if table == 'tournamentquestion':
+            rows = TournamentQuestion.objects.filter(tournament_id__gt=after_id, tournament_id__lte=upper)
+            return rows.order_by('tournament_id', 'position'), upper
+        return tournaments.filter(pk__lte=upper).order_by('pk'), upper
+
+    model = TABLES[table]
+    upper = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    if upper is None or upper <= after_id:
+        return None, None
+    return model.objects.filter(pk__gt=after_id, pk__lte=upper).order_by('pk'), upper
+
+
+def export_table(directory, table, after_id=0, chunk_size=CHUNK_SIZE, compress=True, now=None, settle=SETTLE):
+    """
+    Export the rows of `table` above `after_id`. Returns (path, rows, new
+    watermark), or (None, 0, after_id) when there is nothing new.
+    """
+    rows, upper = export_bounds(table, after_id, now, settle)
+    if rows is None:
+        return None, 0, after_id
+    fields = TABLES[table]._meta.concrete_fields
+    writer = ColumnWriter(Path(directory) / table / f'{after_id + 1:012d}', fields)
+    queryset = rows.values_list(*[field.attname for field in fields])
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    with connections[queryset.db].chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while chunk := cursor.fetchmany(chunk_size):
+            writer.append(chunk)
+    return writer.finish(compress), writer.rows, upper
+
+
+def export(directory, tables=None, chunk_size=CHUNK_SIZE, compress=True, full=False, settle=SETTLE):
+    """
+    Export every table's new rows and advance its watermark; yields (table,
+    path, rows) per table. `full` replaces a table's earlier exports.
+    """
+    directory = Path(directory)
+    watermarks = read_watermarks(directory)
+    now = timezone.now()
+    for table in tables or TABLES:
+        if full:
+            # Start over; the earlier increments would overlap the new file
+            shutil.rmtree(directory / table, ignore_errors=True)
+            watermarks.pop(table, None)
+        after_id = watermarks.get(table, {}).get('last_id', 0)
+        path, count, upper = export_table(directory, table, after_id, chunk_size, compress, now, settle)
+        if path is not None:
+            watermarks[table] = {'last_id': upper, 'exported_at': now.isoformat()}
+            write_watermarks(directory, watermarks)
+        yield table, path, count
+
+
+def load(path, mmap=True):
+    """
+    The columns of one export as {name: array}. Directories of .npy files are
+    memory-mapped when `mmap` is set; .npz files are decompressed into memory.
+    """
+    path = Path(path)
+    if path.is_dir():
+        return {
+            array.stem: np.load(array, mmap_mode='r' if mmap else None)
+            for array in sorted(path.glob('*.npy'))
+        }
+    with np.load(path) as npz:
+        return {name: npz[name] for name in npz.files}
+
+
+def strings(columns, name):
+    """Decode a text column of load()'s result into a list of str"""
+    data, offsets = columns[f'{name}.data'], columns[f'{name}.offsets']
+    raw = data.tobytes()
+    return [raw[start:end].decode() for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import instrumentation, nplusone, slowqueries
+        from .search import ensure_search_indexes
+
+        # Full-text indexes live outside the migration graph, see myapp/search.py
+        post_migrate.connect(ensure_search_indexes, sender=self)
+        # Per-request query metrics, N+1 detection and the slow-query log,
+        # see myapp/instrumentation.py, myapp/nplusone.py and myapp/slowqueries.py
+        connection_created.connect(instrumentation.install_wrapper)
+        connection_created.connect(nplusone.install_wrapper)
+        connection_created.connect(slowqueries.install_wrapper)
@@ -0,0 +1,137 @@
+"""
+Archival of old attempt rows.
+
+UserAnswer, QuestionAttempt and HardQuestionAttempt rows older than the
+retention window are moved out of their tables into gzipped JSON Lines files
+under ARCHIVE_DIR, one directory per table and month:
+
+    archive/myapp.useranswer/2025-03/1-5000.jsonl.gz
+
+Each row is one JSON object of the model's column values. Rows move in chunks
+by primary key: a chunk's files are written and synced first, then the rows
+are deleted and an ArchiveFile entry is added for each file in one
+transaction. ArchiveFile is the ledger of what was archived. A file without
+an entry, left behind by an interrupted run, is ignored by readers and
+overwritten or left alone by the next run.
+
+Nothing that users see is lost. Lifetime figures were already counted into
+the rollups (activity summaries and answer stats) when each row was written.
+The windows read from raw rows, such as this week's answers across the app,
+are shorter than MIN_RETENTION_DAYS. The rebuild functions and
+calibrate_ratings read archived rows through rows() as well as the tables, so
+recomputed figures stay exact.
+"""
+import gzip
+import json
+import os
+from datetime import date, timedelta
+from itertools import groupby
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ArchiveFile
+
+ARCHIVED_MODELS = ('UserAnswer', 'QuestionAttempt', 'HardQuestionAttempt')
+MIN_RETENTION_DAYS = 14  # covers the current week in every timezone
+CHUNK_SIZE = 5000
+
+
+def get_archive_dir():
+    return settings.ARCHIVE_DIR
+
+
+def cutoff(days, now=None):
+    if days < MIN_RETENTION_DAYS:
+        raise ValueError(f"Rows newer than {MIN_RETENTION_DAYS} days can't be archived")
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def _write(path, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + '.partial')
+    with open(partial, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as compressed:
+            for row in rows:
+                compressed.write(json.dumps(row, cls=DjangoJSONEncoder).encode() + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(partial, path)
+
+
+def _month(row):
+    return row['created_at'].year, row['created_at'].month
+
+
+def _month_and_id(row):
+    return _month(row), row['id']
+
+
+def archive_chunk(model, before, after_id=0, chunk_size=CHUNK_SIZE, directory=None):
+    """
+    Move the next `chunk_size` rows with an id above `after_id` that were
+    created before `before` into archive files. Returns the last id moved and
+    the number of rows, or (None, 0) when there is nothing left.
+    """
+    directory = Path(directory or get_archive_dir())
+    table = model._meta.label_lower
+    columns = [field.attname for field in model._meta.concrete_fields]
+    rows = list(
+        model.objects.filter(pk__gt=after_id, created_at__lt=before).order_by('pk').values(*columns)[:chunk_size]
+    )
+    if not rows:
+        return None, 0
+
+    files = []
+    for (year, month), month_rows in groupby(sorted(rows, key=_month_and_id), key=_month):
+        month_rows = list(month_rows)
+        first_id, last_id = month_rows[0]['id'], month_rows[-1]['id']
+        relative = f'{table}/{year:04d}-{month:02d}/{first_id}-{last_id}.jsonl.gz'
+        _write(directory / relative, month_rows)
+        files.append(ArchiveFile(
+            table=table, month=date(year, month, 1), path=relative,
+            rows=len(month_rows), first_id=first_id, last_id=last_id,
+        ))
+
+    with transaction.atomic():
+        model.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        ArchiveFile.objects.bulk_create(files)
+    return rows[-1]['id'], len(rows)
+
+
+def archive_table(model, before, chunk_size=CHUNK_SIZE, directory=None):
+    """Archive every row of `model` created before `before`, yielding the running count after each chunk"""
+    last_id, moved = 0, 0
+    while True:
+        last_id, count = archive_chunk(model, before, last_id, chunk_size, directory)
+        if last_id is None:
+            return
+        moved += count
+        yield moved
+
+
+def rows(get_model, model, fields, directory=None):
+    """
+    Tuples of `fields` for every archived row of `model`, file by file in the
+    order they were archived, with datetimes parsed back. `get_model` is
+    apps.get_model; historical registries from before the ledger existed have
+    no archived rows.
+    """
+    try:
+        ledger = get_model('myapp', 'ArchiveFile')
+    except LookupError:
+        return
+    directory = Path(directory or get_archive_dir())
+    datetimes = {
+        field.attname for field in model._meta.concrete_fields if isinstance(field, models.DateTimeField)
+    }
+    names = ledger.objects.filter(table=model._meta.label_lower).order_by('first_id').values_list('path', flat=True)
+    for name in names.iterator():
+        with gzip.open(directory / name, 'rt') as lines:
+            for line in lines:
+                row = json.loads(line)
+                yield tuple(parse_datetime(row[f]) if f in datetimes else row[f] for f in fields)
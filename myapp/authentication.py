@@ -0,0 +1,35 @@
+"""
+Token authentication for plain Django async views.
+
+DRF's TokenAuthentication only runs inside (sync) APIViews; streaming and
+other async views use this instead. Browsers' EventSource can't send an
+Authorization header, so the token may also be passed as ?token=.
+"""
+from django.http import JsonResponse
+from rest_framework.authtoken.models import Token
+
+
+def get_token_key(request):
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Token '):
+        return header[len('Token '):].strip()
+    return request.GET.get('token')
+
+
+async def aauthenticate(request):
+    """The active user owning the request's token, or None"""
+    key = get_token_key(request)
+    if not key:
+        return None
+    try:
+        token = await Token.objects.select_related('user').aget(key=key)
+    except Token.DoesNotExist:
+        return None
+    return token.user if token.user.is_active else None
+
+
+def unauthorized_response():
+    """The 401 DRF sends for unauthenticated requests to IsAuthenticated views"""
+    response = JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    response['WWW-Authenticate'] = 'Token'
+    return response
@@ -0,0 +1,178 @@
+"""
+Near-duplicate question detection with MinHash and locality-sensitive hashing.
+
+Each question (text plus choice texts) is reduced to a set of character
+shingles with all whitespace removed, so "2+2" and "2 + 2" look the same.
+A MinHash signature of NUM_BANDS * ROWS_PER_BAND values is split into bands;
+each band is hashed into a bucket and stored in QuestionLSHBucket. Questions
+sharing any bucket are candidates, and candidates are confirmed with the exact
+Jaccard similarity of their shingle sets. Lookups are indexed queries, and a
+full scan of the bank only compares questions that share a bucket.
+"""
+import functools
+import hashlib
+import random
+import re
+import struct
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Choice, Question, QuestionLSHBucket
+
+SHINGLE_SIZE = 3
+NUM_BANDS = 8
+ROWS_PER_BAND = 4
+NUM_PERMUTATIONS = NUM_BANDS * ROWS_PER_BAND
+LOOKUP_CHUNK_SIZE = 2000
+
+# Each permutation is an XOR with a random 64-bit mask: cheap enough to hash a
+# whole bank in seconds, and candidates are verified exactly anyway
+_rng = random.Random(1234567)  # fixed seed: signatures must be stable across processes
+_MASKS = [_rng.getrandbits(64) for _ in range(NUM_PERMUTATIONS)]
+
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def default_threshold():
+    return getattr(settings, 'NEAR_DUPLICATE_THRESHOLD', 0.8)
+
+
+@functools.lru_cache(maxsize=20000)
+def _shingles(question_text, choice_texts):
+    parts = [question_text] + sorted(choice_texts)
+    text = '|'.join(_WHITESPACE_RE.sub('', part or '').lower() for part in parts)
+    if len(text) < SHINGLE_SIZE:
+        grams = {text}
+    else:
+        grams = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    # Multiplicative hashing of the gram bytes; unlike hash() it is stable across processes
+    return frozenset(
+        (int.from_bytes(g.encode('utf-8'), 'little') * _GOLDEN) & _MASK64 for g in grams
+    )
+
+
+def shingles(question_text, choice_texts=()):
+    """Hashed character shingles of the question text and its sorted choice texts"""
+    return _shingles(question_text, tuple(choice_texts))
+
+
+def band_buckets(shingle_set):
+    """MinHash the shingles and return one signed 63-bit bucket per band"""
+    signature = [min(map(mask.__xor__, shingle_set)) for mask in _MASKS]
+    buckets = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f'<{ROWS_PER_BAND}Q', *rows), digest_size=8).digest()
+        buckets.append(struct.unpack('<q', digest)[0])
+    return buckets
+
+
+@functools.lru_cache(maxsize=20000)
+def question_buckets(question_text, choice_texts):
+    """Band buckets of a question; cached so checking then inserting hashes once"""
+    return band_buckets(shingles(question_text, choice_texts))
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _choice_texts(choices_data):
+    return [c.get('text', '') for c in choices_data]
+
+
+def load_question_texts(question_ids):
+    """Map question id -> (question_text, choice texts) with plain value queries"""
+    texts = {}
+    for start in range(0, len(question_ids), LOOKUP_CHUNK_SIZE):
+        chunk = question_ids[start:start + LOOKUP_CHUNK_SIZE]
+        for question_id, text in Question.objects.filter(id__in=chunk).values_list('id', 'question_text'):
+            texts[question_id] = (text, [])
+        for question_id, text in Choice.objects.filter(question_id__in=chunk).values_list('question_id', 'text'):
+            texts[question_id][1].append(text)
+    return texts
+
+
+def index_questions(questions):
+    """
+    Store LSH buckets for freshly created questions.
+    `questions` must have their choices saved already.
+    """
+    questions = list(questions)
+    if not questions:
+        return
+    choice_texts = {q.id: [] for q in questions}
+    for question_id, text in Choice.objects.filter(
+        question_id__in=choice_texts
+    ).values_list('question_id', 'text'):
+        choice_texts[question_id].append(text)
+
+    QuestionLSHBucket.objects.filter(question_id__in=choice_texts).delete()
+    # Plain executemany: model instances would cost more than the hashing
+    rows = [
+        (q.id, band, bucket)
+        for q in questions
+        for band, bucket in enumerate(question_buckets(q.question_text, tuple(choice_texts[q.id])))
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {QuestionLSHBucket._meta.db_table} (question_id, band, bucket) VALUES (%s, %s, %s)",
+            rows
+        )
+
+
+def find_near_duplicates(items, threshold=None):
+    """
+    Check (question_text, choices_data) items against the bank and each other.
+    Returns one list per item of matches, each either {"id", "similarity"} for
+    an existing question or {"index", "similarity"} for an earlier item in `items`.
+    """
+    threshold = default_threshold() if threshold is None else threshold
+    item_shingles = [shingles(text, _choice_texts(choices)) for text, choices in items]
+    item_buckets = [question_buckets(text, tuple(_choice_texts(choices))) for text, choices in items]
+
+    # Indexed lookups of every band bucket of every item
+    wanted = {(band, bucket) for buckets in item_buckets for band, bucket in enumerate(buckets)}
+    bucket_values = sorted({bucket for _, bucket in wanted})
+    hits = {}
+    for start in range(0, len(bucket_values), LOOKUP_CHUNK_SIZE):
+        rows = QuestionLSHBucket.objects.filter(
+            bucket__in=bucket_values[start:start + LOOKUP_CHUNK_SIZE]
+        ).values_list('question_id', 'band', 'bucket')
+        for question_id, band, bucket in rows:
+            if (band, bucket) in wanted:
+                hits.setdefault((band, bucket), set()).add(question_id)
+
+    candidate_ids = sorted(set().union(*hits.values())) if hits else []
+    candidate_shingles = {
+        question_id: shingles(text, choice_texts)
+        for question_id, (text, choice_texts) in load_question_texts(candidate_ids).items()
+    }
+
+    results = []
+    seen_buckets = {}  # (band, bucket) -> earlier item indexes
+    for i, (shingle_set, buckets) in enumerate(zip(item_shingles, item_buckets)):
+        matches = []
+        existing = set()
+        earlier = set()
+        for band, bucket in enumerate(buckets):
+            existing |= hits.get((band, bucket), set())
+            earlier |= seen_buckets.setdefault((band, bucket), set())
+        for question_id in sorted(existing):
+            similarity = jaccard(shingle_set, candidate_shingles.get(question_id, set()))
+            if similarity >= threshold:
+                matches.append({"id": question_id, "similarity": round(similarity, 3)})
+        for j in sorted(earlier):
+            similarity = jaccard(shingle_set, item_shingles[j])
+            if similarity >= threshold:
+                matches.append({"index": j, "similarity": round(similarity, 3)})
+        for band, bucket in enumerate(buckets):
+            seen_buckets[(band, bucket)].add(i)
+        results.append(matches)
+    return results
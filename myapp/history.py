@@ -0,0 +1,125 @@
+"""
+Adaptive question selection from compact per-user answer history.
+
+Each user has three bitmaps indexed by question id (seen, missed, mastered),
+updated with every recorded answer. Selection reads that single row instead of
+the user's answer history, and samples from the cached question id pool with
+weights that favour unseen and previously missed questions.
+"""
+import random
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UserQuestionHistory
+from .question_pool import question_ids
+
+WEIGHT_UNSEEN = 4.0
+WEIGHT_MISSED = 3.0
+WEIGHT_SEEN = 1.0
+WEIGHT_MASTERED = 0.2
+MAX_WEIGHT = max(WEIGHT_UNSEEN, WEIGHT_MISSED, WEIGHT_SEEN, WEIGHT_MASTERED)
+
+
+def _get_bit(bitmap, position):
+    byte = position >> 3
+    return byte < len(bitmap) and (bitmap[byte] >> (position & 7)) & 1
+
+
+def _set_bit(bitmap, position, value):
+    byte = position >> 3
+    if byte >= len(bitmap):
+        if not value:
+            return
+        bitmap.extend(bytes(byte - len(bitmap) + 1))
+    if value:
+        bitmap[byte] |= 1 << (position & 7)
+    else:
+        bitmap[byte] &= ~(1 << (position & 7)) & 0xFF
+
+
+def apply_answer(seen, missed, mastered, question_id, is_correct):
+    """Update the three bytearray bitmaps in place for one answer"""
+    if is_correct:
+        # A second correct answer in a row masters the question
+        was_correct = _get_bit(seen, question_id) and not _get_bit(missed, question_id)
+        _set_bit(mastered, question_id, was_correct)
+        _set_bit(missed, question_id, False)
+    else:
+        _set_bit(mastered, question_id, False)
+        _set_bit(missed, question_id, True)
+    _set_bit(seen, question_id, True)
+
+
+def record_answers(answers):
+    """Fold (user_id, question_id, is_correct) answers into their users' bitmaps, in order"""
+    by_user = {}
+    for user_id, question_id, is_correct in answers:
+        by_user.setdefault(user_id, []).append((question_id, is_correct))
+    if not by_user:
+        return
+
+    with transaction.atomic():
+        UserQuestionHistory.objects.bulk_create(
+            [UserQuestionHistory(user_id=user_id) for user_id in by_user], ignore_conflicts=True
+        )
+        # Locked, so concurrent answers by the same user don't overwrite each other's bits
+        histories = list(UserQuestionHistory.objects.select_for_update().filter(user_id__in=by_user).order_by('pk'))
+        now = timezone.now()
+        for history in histories:
+            seen = bytearray(history.seen)
+            missed = bytearray(history.missed)
+            mastered = bytearray(history.mastered)
+            for question_id, is_correct in by_user[history.user_id]:
+                apply_answer(seen, missed, mastered, question_id, is_correct)
+
+            history.seen = bytes(seen)
+            history.missed = bytes(missed)
+            history.mastered = bytes(mastered)
+            history.updated_at = now  # bulk_update skips auto_now
+        UserQuestionHistory.objects.bulk_update(histories, ['seen', 'missed', 'mastered', 'updated_at'])
+
+
+def question_weight(history, question_id):
+    if history is None or not _get_bit(history.seen, question_id):
+        return WEIGHT_UNSEEN
+    if _get_bit(history.missed, question_id):
+        return WEIGHT_MISSED
+    if _get_bit(history.mastered, question_id):
+        return WEIGHT_MASTERED
+    return WEIGHT_SEEN
+
+
+def choose_question_ids(user, count, pool=None):
+    """
+    Pick up to `count` distinct question ids, weighted by the user's history.
+    Uses rejection sampling, so the cost depends on `count`, not on the bank size.
+    """
+    pool = question_ids() if pool is None else pool
+    if len(pool) <= count:
+        return list(pool)
+
+    history = None
+    if user is not None and user.is_authenticated:
+        history = UserQuestionHistory.objects.filter(user=user).first()
+
+    chosen = []
+    chosen_set = set()
+    attempts = 0
+    max_attempts = count * 50
+    while len(chosen) < count and attempts < max_attempts:
+        attempts += 1
+        question_id = pool[random.randrange(len(pool))]
+        if question_id in chosen_set:
+            continue
+        if random.random() * MAX_WEIGHT < question_weight(history, question_id):
+            chosen.append(question_id)
+            chosen_set.add(question_id)
+
+    # Everything left is mastered or the pool is nearly exhausted: fill uniformly
+    while len(chosen) < count:
+        question_id = pool[random.randrange(len(pool))]
+        if question_id not in chosen_set:
+            chosen.append(question_id)
+            chosen_set.add(question_id)
+    return chosen
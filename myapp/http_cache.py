@@ -0,0 +1,107 @@
+"""
+Conditional GET for read endpoints.
+
+A view method decorated with @conditional(name, version) gets an ETag and a
+Last-Modified header derived from a cheap data version: a clock reading kept
+in the shared cache and replaced whenever the data behind the response
+changes (the question bank versions in myapp/question_pool.py). The version
+is read before the view body runs, so a client whose If-None-Match or
+If-Modified-Since is still current gets 304 Not Modified without any of the
+view's queries.
+
+Without a version, @conditional(name) derives the ETag from the response
+body instead. The view still runs, but an unchanged body isn't sent again.
+This suits views read from the replica, such as the leaderboard: the
+validator always describes the body that was actually sent, never a newer
+primary-side version that a lagging replica hasn't caught up with.
+
+DRF views check authentication and permissions before calling the method, so
+a 304 is never served to a client that couldn't see the full response. The
+ETag also covers the negotiated media type, so the JSON and browsable API
+renderings don't share a validator.
+
+Public reads get `Cache-Control: public` with HTTP_CACHE_MAX_AGE and
+HTTP_CACHE_STALE_WHILE_REVALIDATE, so browsers, CDNs and edge caches can serve
+them briefly. Other reads are `private, no-cache`: only the client may keep
+them, and it revalidates every time.
+"""
+import functools
+import hashlib
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(name, version, request):
+    media_type = getattr(request, 'accepted_media_type', '')  # set by DRF's content negotiation
+    return quote_etag(hashlib.md5(f'{name}:{version}:{media_type}'.encode(), usedforsecurity=False).hexdigest())
+
+
+def patch_caching_headers(response, etag, last_modified, public):
+    if response.status_code not in (200, 304):
+        return response
+    response.setdefault('ETag', etag)
+    if last_modified is not None:
+        response.setdefault('Last-Modified', http_date(last_modified))
+    if public:
+        patch_cache_control(
+            response, public=True, max_age=getattr(settings, 'HTTP_CACHE_MAX_AGE', 5),
+            stale_while_revalidate=getattr(settings, 'HTTP_CACHE_STALE_WHILE_REVALIDATE', 30),
+        )
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def _validators(name, version, request):
+    # Versions are time.time_ns() readings, so they double as modification times
+    etag = make_etag(name, version, request)
+    last_modified = version // 1_000_000_000
+    return etag, last_modified, get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def _by_content(name, request, response, public):
+    """Validate `response` by its body, once that is rendered"""
+    def finish(response):
+        etag = make_etag(name, hashlib.md5(response.content, usedforsecurity=False).hexdigest(), request)
+        response = get_conditional_response(request, etag=etag, response=response)
+        return patch_caching_headers(response, etag, None, public)
+
+    if getattr(response, 'is_rendered', True):
+        return finish(response)
+    # DRF responses are rendered after the view method returns
+    response.add_post_render_callback(finish)
+    return response
+
+
+def conditional(name, version=None, public=False):
+    """
+    Serve a view method's GET conditionally. `version` is called without
+    arguments and returns the current data version; for async views it may be
+    a coroutine function. Without it the ETag is a digest of the body.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(self, request, *args, **kwargs):
+                if version is None:
+                    return _by_content(name, request, await view(self, request, *args, **kwargs), public)
+                current = await version() if iscoroutinefunction(version) else version()
+                etag, last_modified, response = _validators(name, current, request)
+                if response is None:
+                    response = await view(self, request, *args, **kwargs)
+                return patch_caching_headers(response, etag, last_modified, public)
+        else:
+            @functools.wraps(view)
+            def wrapper(self, request, *args, **kwargs):
+                if version is None:
+                    return _by_content(name, request, view(self, request, *args, **kwargs), public)
+                etag, last_modified, response = _validators(name, version(), request)
+                if response is None:
+                    response = view(self, request, *args, **kwargs)
+                return patch_caching_headers(response, etag, last_modified, public)
+        return wrapper
+    return decorator
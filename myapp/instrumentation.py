@@ -0,0 +1,229 @@
+"""
+Per-view request metrics.
+
+InstrumentationMiddleware times every sampled request and, through a database
+execute wrapper, the queries it runs. The results are grouped by the resolved
+view name into in-process histograms of wall time, DB time, query count,
+duplicate queries and response size. MetricsAPIView exposes them in the
+Prometheus text format. Each process keeps its own numbers, which Prometheus
+adds up across scrape targets.
+
+The execute wrapper is installed on every connection once, and a request's
+recorder is found through a context variable. Queries that async views run on
+sync_to_async threads are counted too, because those threads inherit the
+context.
+
+INSTRUMENTATION_ENABLED turns the middleware off, and
+INSTRUMENTATION_SAMPLE_RATE (0-1) sets the share of requests measured.
+"""
+import bisect
+import contextlib
+import contextvars
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+WALL_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+_current = contextvars.ContextVar('instrumentation_recorder', default=None)
+
+
+class QueryRecorder:
+    __slots__ = ('count', 'duplicates', 'seconds', '_seen')
+
+    def __init__(self):
+        self.count = 0
+        self.duplicates = 0
+        self.seconds = 0.0
+        self._seen = set()
+
+    def add(self, sql, params, seconds):
+        self.count += 1
+        self.seconds += seconds
+        key = (sql, repr(params))
+        if key in self._seen:
+            self.duplicates += 1
+        else:
+            self._seen.add(key)
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    recorder = _current.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.add(sql, params, time.perf_counter() - started)
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """connection_created receiver: add the recording wrapper to each new connection"""
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+@contextlib.contextmanager
+def ignore():
+    """Don't record queries made inside this block as the request's"""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class ViewMetrics:
+    __slots__ = ('wall', 'db', 'queries', 'size', 'duplicates')
+
+    def __init__(self):
+        self.wall = Histogram(WALL_BUCKETS)
+        self.db = Histogram(WALL_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.duplicates = 0
+
+
+_lock = threading.Lock()
+_metrics = {}  # view name -> ViewMetrics
+
+
+def record(view, wall_seconds, recorder, size):
+    with _lock:
+        metrics = _metrics.get(view)
+        if metrics is None:
+            metrics = _metrics[view] = ViewMetrics()
+        metrics.wall.observe(wall_seconds)
+        metrics.db.observe(recorder.seconds)
+        metrics.queries.observe(recorder.count)
+        metrics.duplicates += recorder.duplicates
+        if size is not None:
+            metrics.size.observe(size)
+
+
+def reset():
+    with _lock:
+        _metrics.clear()
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(name, view, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum}')
+    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+    return lines
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    families = (
+        ('myapp_request_duration_seconds', 'histogram', 'Wall time of the request', 'wall'),
+        ('myapp_request_db_seconds', 'histogram', 'Time spent executing SQL', 'db'),
+        ('myapp_request_queries', 'histogram', 'SQL queries per request', 'queries'),
+        ('myapp_response_size_bytes', 'histogram', 'Response body size (non-streaming responses)', 'size'),
+    )
+    with _lock:
+        snapshot = sorted(_metrics.items())
+        lines = []
+        for name, kind, help_text, attribute in families:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for view, metrics in snapshot:
+                lines.extend(_histogram_lines(name, _label(view), getattr(metrics, attribute)))
+        lines.append('# HELP myapp_request_duplicate_queries_total Queries repeating an identical earlier query in the same request')
+        lines.append('# TYPE myapp_request_duplicate_queries_total counter')
+        for view, metrics in snapshot:
+            lines.append(f'myapp_request_duplicate_queries_total{{view="{_label(view)}"}} {metrics.duplicates}')
+    return '\n'.join(lines) + '\n'
+
+
+def is_enabled():
+    return getattr(settings, 'INSTRUMENTATION_ENABLED', True)
+
+
+def _sampled():
+    rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 1.0)
+    return rate >= 1.0 or random.random() < rate
+
+
+def view_name(request):
+    """The URL name of the view that handled the request"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match.route
+
+
+def _response_size(response):
+    return None if getattr(response, 'streaming', False) else len(response.content)
+
+
+class InstrumentationMiddleware:
+    """Place first in MIDDLEWARE so the measured time covers the whole stack"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not is_enabled() or not _sampled():
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        token = _current.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        record(view_name(request), time.perf_counter() - started, recorder, _response_size(response))
+        return response
+
+    async def __acall__(self, request):
+        if not is_enabled() or not _sampled():
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        token = _current.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        record(view_name(request), time.perf_counter() - started, recorder, _response_size(response))
+        return response
@@ -0,0 +1,125 @@
+"""
+Live leaderboard and tournament updates as server-sent events.
+
+Instead of polling tournaments/leaderboard/ and tournaments/active/, clients
+open the matching stream/ endpoint: they receive the current state at once and
+then a new event only when that state changes. Writes publish fresh snapshots
+through myapp.pubsub after commit, and a snapshot identical to the last one
+published on its topic is dropped, so repeated saves don't reach clients.
+Topics nobody in this process is streaming are skipped without building a
+snapshot at all.
+"""
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.http import StreamingHttpResponse
+
+from . import pubsub
+from .models import TournamentAttempt
+from .serializers import LeaderboardEntrySerializer
+
+LEADERBOARD_TOPIC = 'leaderboard'
+LEADERBOARD_SIZE = 5
+
+
+def tournament_topic(user_id):
+    return f'tournament:{user_id}'
+
+
+def leaderboard_entries():
+    """The top completions with every answer correct, fastest first"""
+    return TournamentAttempt.objects.filter(
+        completed=True,
+        correct_count=F('questions_count')
+    ).select_related('user').order_by('total_seconds')[:LEADERBOARD_SIZE]
+
+
+def leaderboard_snapshot():
+    return LeaderboardEntrySerializer(leaderboard_entries(), many=True).data
+
+
+async def aleaderboard_snapshot():
+    entries = [entry async for entry in leaderboard_entries()]
+    return LeaderboardEntrySerializer(entries, many=True).data
+
+
+def tournament_state(user_id):
+    """The user's active tournament and how far they are through it"""
+    tournament = TournamentAttempt.objects.filter(
+        user_id=user_id,
+        completed=False
+    ).order_by('-start_time').first()
+    if tournament is None:
+        return {"active": False}
+    return {
+        "active": True,
+        "tournament_id": tournament.id,
+        "start_time": tournament.start_time,
+        "questions_count": tournament.questions_count,
+        "answered_count": tournament.tournament_questions.filter(answered=True).count(),
+        "correct_count": tournament.correct_count,
+    }
+
+
+def encode_event(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+
+
+def publish_if_changed(topic, snapshot):
+    """Publish `snapshot()` if anyone is subscribed to `topic` and it isn't what the topic last carried"""
+    if not pubsub.has_subscribers(topic):
+        return False
+    return pubsub.publish_if_changed(topic, encode_event(snapshot()))
+
+
+def leaderboard_changed():
+    """Call after a tournament completes or a player is renamed; publishes after commit if the top entries moved"""
+    transaction.on_commit(lambda: publish_if_changed(LEADERBOARD_TOPIC, leaderboard_snapshot))
+
+
+def tournament_changed(user_id):
+    transaction.on_commit(lambda: publish_if_changed(tournament_topic(user_id), lambda: tournament_state(user_id)))
+
+
+def _event(name, encoded):
+    return f"event: {name}\ndata: {encoded}\n\n"
+
+
+async def _event_stream(topic, event_name, snapshot, tick=None):
+    heartbeat = getattr(settings, 'LIVE_HEARTBEAT_SECONDS', 15)
+    # Django 4.2 can't tell when an ASGI client has gone away, so streams end
+    # after a while and EventSource reconnects on its own
+    deadline = time.monotonic() + getattr(settings, 'LIVE_STREAM_MAX_SECONDS', 300)
+    with pubsub.subscribe(topic) as subscription:
+        # Subscribed before reading the snapshot, so no change can fall in between
+        yield "retry: 2000\n" + _event(event_name, encode_event(await sync_to_async(snapshot)()))
+        while time.monotonic() < deadline:
+            timeout = min(heartbeat, max(deadline - time.monotonic(), 0))
+            if tick is not None:
+                # tick() publishes anything that is due and says when to call it again
+                wait = await sync_to_async(tick)()
+                if wait is not None:
+                    timeout = min(timeout, max(wait, 0))
+            message = await subscription.get(timeout=timeout)
+            if message is not None:
+                yield _event(event_name, message)
+            elif tick is None or timeout == heartbeat:
+                yield ": keepalive\n\n"
+
+
+def stream_response(topic, event_name, snapshot, tick=None):
+    """
+    A text/event-stream response of `snapshot()` followed by every change published on `topic`.
+    `tick`, if given, is called between events and returns the seconds until it is next due.
+    """
+    response = StreamingHttpResponse(
+        _event_stream(topic, event_name, snapshot, tick), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering events
+    return response
@@ -0,0 +1,44 @@
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.archive import ARCHIVED_MODELS, CHUNK_SIZE, MIN_RETENTION_DAYS, archive_table, cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        "Move answer and attempt rows older than the retention window into per-month gzipped JSON Lines "
+        "files under ARCHIVE_DIR, in chunks. Lifetime figures come from the rollups and are unaffected."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_RETENTION_DAYS,
+                            help=f"Keep rows from the last N days (at least {MIN_RETENTION_DAYS})")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows moved per transaction")
+        parser.add_argument('--table', action='append', choices=ARCHIVED_MODELS, dest='tables',
+                            help="Only archive this table; repeat for several (default: all)")
+        parser.add_argument('--dry-run', action='store_true', help="Count the rows that would move")
+
+    def handle(self, *args, **options):
+        try:
+            before = cutoff(options['days'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for name in options['tables'] or ARCHIVED_MODELS:
+            model = apps.get_model('myapp', name)
+            if options['dry_run']:
+                count = model.objects.filter(created_at__lt=before).count()
+                self.stdout.write(f"{name}: {count} rows older than {before:%Y-%m-%d}")
+                continue
+
+            started = time.monotonic()
+            moved = 0
+            for moved in archive_table(model, before, options['chunk_size']):
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{name}: {moved} rows")
+            self.stdout.write(self.style.SUCCESS(
+                f"{name}: archived {moved} rows in {time.monotonic() - started:.1f}s"
+            ))
@@ -0,0 +1,109 @@
+import math
+from itertools import chain
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from myapp import archive
+from myapp.models import HardQuestion, HardQuestionAttempt, Question, User, UserAnswer
+from myapp.ratings import DEFAULT_RATING
+
+# Elo's expected score 1 / (1 + 10^(-d/400)) is a logistic curve with slope ln(10)/400
+ELO_SCALE = 400.0 / math.log(10)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalibrate user, question and hard question ratings from the full answer history, archives included, "
+        "by fitting a Rasch model (the logistic model behind Elo) with vectorized NumPy passes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--epochs', type=int, default=200)
+        parser.add_argument('--learning-rate', type=float, default=0.5)
+        parser.add_argument('--regularization', type=float, default=0.01,
+                            help="L2 pull of every parameter towards the average rating")
+        parser.add_argument('--dry-run', action='store_true', help="Fit and report without saving")
+
+    def handle(self, *args, **options):
+        try:
+            import numpy as np
+        except ImportError:
+            raise CommandError("calibrate_ratings requires numpy (pip install numpy)")
+
+        # Users, questions and hard questions each get a dense index
+        user_ids = np.fromiter(User.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+        question_ids = np.fromiter(Question.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+        hard_ids = np.fromiter(HardQuestion.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+
+        users, items, outcomes = [], [], []
+        for model, ids, offset in ((UserAnswer, question_ids, 0), (HardQuestionAttempt, hard_ids, len(question_ids))):
+            fields = ('user_id', 'question_id', 'is_correct')
+            answers = chain(
+                archive.rows(apps.get_model, model, fields),
+                model.objects.values_list(*fields).iterator(chunk_size=50000),
+            )
+            rows = np.array(list(answers), dtype=np.int64).reshape(-1, 3)
+            # Archived answers may belong to users or questions deleted since
+            rows = rows[np.isin(rows[:, 0], user_ids) & np.isin(rows[:, 1], ids)]
+            users.append(np.searchsorted(user_ids, rows[:, 0]))
+            items.append(np.searchsorted(ids, rows[:, 1]) + offset)
+            outcomes.append(rows[:, 2].astype(np.float64))
+        users = np.concatenate(users)
+        items = np.concatenate(items)
+        outcomes = np.concatenate(outcomes)
+
+        n_users = len(user_ids)
+        n_items = len(question_ids) + len(hard_ids)
+        if len(outcomes) == 0:
+            self.stdout.write("No answers recorded, nothing to calibrate")
+            return
+
+        # Per-parameter step sizes so users with many answers don't overshoot
+        user_counts = np.bincount(users, minlength=n_users) + 1.0
+        item_counts = np.bincount(items, minlength=n_items) + 1.0
+
+        ability = np.zeros(n_users)
+        difficulty = np.zeros(n_items)
+        lr = options['learning_rate']
+        reg = options['regularization']
+        for _ in range(options['epochs']):
+            residual = outcomes - 1.0 / (1.0 + np.exp(difficulty[items] - ability[users]))
+            ability += lr * (np.bincount(users, weights=residual, minlength=n_users) - reg * ability) / user_counts
+            difficulty -= lr * (np.bincount(items, weights=residual, minlength=n_items) + reg * difficulty) / item_counts
+            # Only differences are identified; anchor the average question at the default rating
+            shift = difficulty.mean()
+            difficulty -= shift
+            ability -= shift
+
+        predicted = 1.0 / (1.0 + np.exp(difficulty[items] - ability[users]))
+        log_loss = -np.mean(outcomes * np.log(predicted) + (1 - outcomes) * np.log(1 - predicted))
+        self.stdout.write(f"Fitted {len(outcomes)} answers, log loss {log_loss:.4f}")
+
+        if options['dry_run']:
+            return
+
+        # Rows without answers keep their current rating
+        user_ratings = DEFAULT_RATING + ELO_SCALE * ability
+        item_ratings = DEFAULT_RATING + ELO_SCALE * difficulty
+        answered_users = user_counts > 1
+        answered_items = item_counts > 1
+        split = len(question_ids)
+        with transaction.atomic():
+            updated = (
+                self._save(User, user_ids[answered_users], user_ratings[answered_users]),
+                self._save(Question, question_ids[answered_items[:split]], item_ratings[:split][answered_items[:split]]),
+                self._save(HardQuestion, hard_ids[answered_items[split:]], item_ratings[split:][answered_items[split:]]),
+            )
+        self.stdout.write(self.style.SUCCESS(
+            "Updated ratings of {} users, {} questions and {} hard questions".format(*updated)
+        ))
+
+    def _save(self, model, ids, ratings):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {model._meta.db_table} SET rating = %s WHERE id = %s",
+                list(zip(ratings.tolist(), ids.tolist()))
+            )
+        return len(ids)
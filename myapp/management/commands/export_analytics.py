@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+TABLES = ('useranswer', 'hardquestionattempt', 'tournamentattempt', 'tournamentquestion')
+
+
+class Command(BaseCommand):
+    help = (
+        "Export answers, hard question attempts, tournaments and tournament questions as typed NumPy column "
+        "files for offline analysis. Each run only adds the rows written since the previous one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help="Export directory; holds one folder per table and _watermarks.json")
+        parser.add_argument('--table', action='append', choices=TABLES, dest='tables',
+                            help="Only export this table; repeat for several (default: all)")
+        parser.add_argument('--chunk-size', type=int, default=20000, help="Rows fetched from the database at a time")
+        parser.add_argument('--no-compress', action='store_true',
+                            help="Write directories of .npy files, which can be memory-mapped, instead of .npz")
+        parser.add_argument('--full', action='store_true', help="Replace the earlier exports of the tables with one export of all rows")
+        parser.add_argument('--settle-hours', type=float, default=24,
+                            help="Open tournaments younger than this hold back the tournament export")
+
+    def handle(self, *args, **options):
+        try:
+            from myapp.analytics_export import export
+        except ImportError:
+            raise CommandError("export_analytics requires numpy (pip install numpy)")
+
+        results = export(
+            options['directory'], options['tables'], chunk_size=options['chunk_size'],
+            compress=not options['no_compress'], full=options['full'],
+            settle=timedelta(hours=options['settle_hours']),
+        )
+        started = time.monotonic()
+        for table, path, rows in results:
+            elapsed = time.monotonic() - started
+            if path is None:
+                self.stdout.write(f"{table}: nothing new")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{table}: {rows} rows to {path} in {elapsed:.1f}s"))
+            started = time.monotonic()
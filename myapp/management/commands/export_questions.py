@@ -0,0 +1,54 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from myapp.models import Question
+
+
+class Command(BaseCommand):
+    help = "Export all questions with their choices to a JSONL or CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or - for stdout")
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help="Defaults to the file extension")
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help="Questions fetched from the database at a time")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+
+        # iterator() with prefetch_related keeps memory flat: choices are fetched per chunk
+        questions = Question.objects.order_by('id').prefetch_related('choices').iterator(
+            chunk_size=options['chunk_size']
+        )
+
+        stream = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        exported = 0
+        try:
+            if fmt == 'csv':
+                writer = csv.writer(stream)
+                writer.writerow(['question_id', 'question_text', 'index', 'text', 'is_correct'])
+                for question in questions:
+                    for choice in sorted(question.choices.all(), key=lambda c: c.index):
+                        writer.writerow([question.id, question.question_text, choice.index,
+                                         choice.text, int(choice.is_correct)])
+                    exported += 1
+            else:
+                for question in questions:
+                    stream.write(json.dumps({
+                        'question_text': question.question_text,
+                        'choices': [
+                            {'text': c.text, 'index': c.index, 'is_correct': c.is_correct}
+                            for c in sorted(question.choices.all(), key=lambda c: c.index)
+                        ],
+                    }) + '\n')
+                    exported += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS(f"Exported {exported} questions to {path}"))
@@ -0,0 +1,93 @@
+import json
+from itertools import combinations
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from myapp.dedupe import default_threshold, index_questions, jaccard, load_question_texts, shingles
+from myapp.models import Question, QuestionLSHBucket
+
+
+class Command(BaseCommand):
+    help = "Report near-duplicate questions using the LSH bucket index"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, help="Minimum Jaccard similarity to report")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Recompute the LSH buckets of every question first")
+        parser.add_argument('--max-bucket-size', type=int, default=200,
+                            help="Skip buckets with more questions than this (degenerate texts)")
+        parser.add_argument('--json', action='store_true', help="Print one JSON object per pair")
+
+    def handle(self, *args, **options):
+        threshold = options['threshold'] if options['threshold'] is not None else default_threshold()
+
+        if options['rebuild']:
+            self._rebuild()
+
+        # Questions sharing a bucket are candidates; the rows arrive grouped by bucket
+        pairs = set()
+        skipped_buckets = 0
+        current_key = None
+        members = []
+        rows = QuestionLSHBucket.objects.order_by('band', 'bucket').values_list(
+            'band', 'bucket', 'question_id'
+        ).iterator(chunk_size=10000)
+        for band, bucket, question_id in rows:
+            if (band, bucket) != current_key:
+                skipped_buckets += self._add_pairs(pairs, members, options['max_bucket_size'])
+                current_key = (band, bucket)
+                members = []
+            members.append(question_id)
+        skipped_buckets += self._add_pairs(pairs, members, options['max_bucket_size'])
+
+        # Confirm candidates with the exact similarity, loading only the questions involved
+        candidate_ids = sorted({i for pair in pairs for i in pair})
+        texts = {}
+        shingle_sets = {}
+        for question_id, (text, choice_texts) in load_question_texts(candidate_ids).items():
+            texts[question_id] = text
+            shingle_sets[question_id] = shingles(text, choice_texts)
+
+        results = []
+        for a, b in pairs:
+            if a in shingle_sets and b in shingle_sets:
+                similarity = jaccard(shingle_sets[a], shingle_sets[b])
+                if similarity >= threshold:
+                    results.append((similarity, a, b))
+        results.sort(key=lambda r: (-r[0], r[1], r[2]))
+
+        for similarity, a, b in results:
+            if options['json']:
+                self.stdout.write(json.dumps({
+                    'id': a, 'duplicate_id': b, 'similarity': round(similarity, 3),
+                    'question_text': texts[a], 'duplicate_text': texts[b],
+                }))
+            else:
+                self.stdout.write(f"{a}\t{b}\t{similarity:.3f}\t{texts[a]!r}\t{texts[b]!r}")
+
+        self.stderr.write(
+            f"{len(results)} near-duplicate pairs from {len(pairs)} candidates"
+            + (f" ({skipped_buckets} oversized buckets skipped)" if skipped_buckets else "")
+        )
+
+    def _add_pairs(self, pairs, members, max_bucket_size):
+        if len(members) > max_bucket_size:
+            return 1
+        pairs.update(combinations(sorted(set(members)), 2))
+        return 0
+
+    def _rebuild(self):
+        batch = []
+        indexed = 0
+        for question in Question.objects.order_by('id').iterator(chunk_size=2000):
+            batch.append(question)
+            if len(batch) >= 2000:
+                with transaction.atomic():
+                    index_questions(batch)
+                indexed += len(batch)
+                batch = []
+        with transaction.atomic():
+            index_questions(batch)
+        indexed += len(batch)
+        self.stderr.write(f"Rebuilt LSH buckets for {indexed} questions")
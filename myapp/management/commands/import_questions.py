@@ -0,0 +1,160 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from myapp.dedupe import find_near_duplicates
+from myapp.models import Question
+from myapp.question_bank import bulk_create_questions, question_text_hash, validate_question
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 't')
+
+
+def read_jsonl(stream):
+    """Yield (line_number, question_text, choices, error) from a JSONL stream"""
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, None, "Each line must be a JSON object"
+            continue
+        choices = record.get('choices') or []
+        if not isinstance(choices, list) or not all(isinstance(c, dict) for c in choices):
+            yield line_number, None, None, "choices must be a list of objects"
+            continue
+        yield line_number, record.get('question_text') or '', [
+            {
+                'text': c.get('text', ''),
+                'index': c.get('index', 0),
+                'is_correct': _parse_bool(c.get('is_correct', False)),
+            }
+            for c in choices
+        ], None
+
+
+def read_csv(stream):
+    """
+    Yield (line_number, question_text, choices, error) from a CSV stream with one row
+    per choice: question_id, question_text, index, text, is_correct.
+    Consecutive rows sharing a question_id belong to the same question.
+    """
+    reader = csv.DictReader(stream)
+    missing = {'question_id', 'question_text', 'index', 'text', 'is_correct'} - set(reader.fieldnames or [])
+    if missing:
+        raise CommandError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+
+    current_key = None
+    current_line = None
+    question_text = None
+    choices = []
+    for row in reader:
+        if row['question_id'] != current_key:
+            if current_key is not None:
+                yield current_line, question_text, choices, None
+            current_key = row['question_id']
+            current_line = reader.line_num
+            question_text = row['question_text']
+            choices = []
+        try:
+            index = int(row['index'])
+        except (TypeError, ValueError):
+            index = row['index']
+        choices.append({
+            'text': row['text'],
+            'index': index,
+            'is_correct': _parse_bool(row['is_correct']),
+        })
+    if current_key is not None:
+        yield current_line, question_text, choices, None
+
+
+class Command(BaseCommand):
+    help = "Import questions with their choices from a JSONL or CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin")
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help="Questions inserted per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Validate without writing anything")
+        parser.add_argument('--allow-near-duplicates', action='store_true',
+                            help="Import questions even if they are near-duplicates of existing ones")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+
+        # Hash every existing question once so duplicates are skipped without per-row queries
+        seen_hashes = {
+            question_text_hash(text)
+            for text in Question.objects.values_list('question_text', flat=True).iterator(chunk_size=5000)
+        }
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        reader = read_csv if fmt == 'csv' else read_jsonl
+
+        self.check_near_duplicates = not options['allow_near_duplicates']
+        self.dry_run = options['dry_run']
+        imported = duplicates = near_duplicates = invalid = 0
+        batch = []
+        try:
+            for line_number, question_text, choices, error in reader(stream):
+                error = error or validate_question(question_text, choices)
+                if error:
+                    self.stderr.write(f"line {line_number}: {error}")
+                    invalid += 1
+                    continue
+
+                text_hash = question_text_hash(question_text)
+                if text_hash in seen_hashes:
+                    duplicates += 1
+                    continue
+                seen_hashes.add(text_hash)
+
+                batch.append((question_text, choices))
+                if len(batch) >= batch_size:
+                    inserted, skipped = self._flush(batch)
+                    imported += inserted
+                    near_duplicates += skipped
+                    batch = []
+
+            if batch:
+                inserted, skipped = self._flush(batch)
+                imported += inserted
+                near_duplicates += skipped
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        verb = "Would import" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {imported} questions ({duplicates} duplicates and {near_duplicates} "
+            f"near-duplicates skipped, {invalid} invalid)"
+        ))
+
+    def _flush(self, batch):
+        """Insert a batch, dropping near-duplicates. Returns (inserted, skipped)"""
+        if self.check_near_duplicates:
+            matches = find_near_duplicates(batch)
+            kept = [item for item, item_matches in zip(batch, matches) if not item_matches]
+        else:
+            kept = batch
+        if kept and not self.dry_run:
+            with transaction.atomic():
+                bulk_create_questions(kept, batch_size=len(kept))
+        return len(kept), len(batch) - len(kept)
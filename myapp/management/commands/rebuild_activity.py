@@ -0,0 +1,12 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from myapp.activity import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily activity rollups and streaks from the attempt tables"
+
+    def handle(self, *args, **options):
+        days, users = rebuild(apps.get_model)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {days} daily rows for {users} users"))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from myapp.seeding import SCALES, VOLUME_NAMES, Seeder, bulk_load_pragmas
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic users, questions and attempt histories for volume testing. "
+        "The same --seed and volumes always produce the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=list(SCALES), default='small',
+                            help="Preset volumes; the options below override single tables")
+        for name in VOLUME_NAMES:
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, metavar='N')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10000, help="Rows per bulk_create call")
+        parser.add_argument('--days', type=int, default=365, help="How far back the generated history goes")
+        parser.add_argument('--no-rebuild', action='store_true',
+                            help="Skip rebuilding the activity rollups and answer stats afterwards")
+
+    def handle(self, *args, **options):
+        volumes = dict(SCALES[options['scale']])
+        for name in VOLUME_NAMES:
+            if options[name] is not None:
+                volumes[name] = options[name]
+
+        seeder = Seeder(
+            seed=options['seed'], batch_size=options['batch_size'], days=options['days'], log=self.stdout.write
+        )
+        started = time.monotonic()
+        with bulk_load_pragmas(connection):
+            counts = seeder.run(volumes, rebuild=not options['no_rebuild'])
+        elapsed = time.monotonic() - started
+
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {rows} rows in {elapsed:.1f}s ({rows / elapsed * 60:,.0f} rows per minute)"
+        ))
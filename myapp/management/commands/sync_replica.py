@@ -0,0 +1,33 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from myapp.routers import REPLICA
+from myproject.database_url import sqlite_path
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into the SQLite file standing in for the read replica "
+        "(DATABASE_REPLICA_URL=sqlite:///...), so replica routing can be tried without PostgreSQL"
+    )
+
+    def handle(self, *args, **options):
+        if REPLICA not in settings.DATABASES:
+            raise CommandError("No replica configured; set DATABASE_REPLICA_URL")
+        primary, replica = settings.DATABASES['default'], settings.DATABASES[REPLICA]
+        if not all(config['ENGINE'] == 'django.db.backends.sqlite3' for config in (primary, replica)):
+            raise CommandError("sync_replica only copies between SQLite files; real replicas replicate themselves")
+
+        # The replica alias opens its file read-only, so write the copy directly
+        connections[REPLICA].close()
+        source = sqlite3.connect(sqlite_path(primary))
+        target = sqlite3.connect(sqlite_path(replica))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f"Copied {sqlite_path(primary)} to {sqlite_path(replica)}"))
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def index_existing_questions(apps, schema_editor):
+    from myapp.dedupe import band_buckets, shingles
+
+    Question = apps.get_model('myapp', 'Question')
+    QuestionLSHBucket = apps.get_model('myapp', 'QuestionLSHBucket')
+    buckets = []
+    for question in Question.objects.prefetch_related('choices').iterator(chunk_size=2000):
+        shingle_set = shingles(question.question_text, [c.text for c in question.choices.all()])
+        for band, bucket in enumerate(band_buckets(shingle_set)):
+            buckets.append(QuestionLSHBucket(question_id=question.id, band=band, bucket=bucket))
+        if len(buckets) >= 10000:
+            QuestionLSHBucket.objects.bulk_create(buckets)
+            buckets = []
+    QuestionLSHBucket.objects.bulk_create(buckets)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_hardquestion_hardquestionattempt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionLSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.SmallIntegerField()),
+                ('bucket', models.BigIntegerField(db_index=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='myapp.question')),
+            ],
+        ),
+        migrations.RunPython(index_existing_questions, migrations.RunPython.noop),
+    ]
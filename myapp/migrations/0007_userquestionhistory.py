@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_histories(apps, schema_editor):
+    from myapp.history import apply_answer
+
+    UserAnswer = apps.get_model('myapp', 'UserAnswer')
+    UserQuestionHistory = apps.get_model('myapp', 'UserQuestionHistory')
+    answers = UserAnswer.objects.order_by('user_id', 'created_at', 'id').values_list(
+        'user_id', 'question_id', 'is_correct'
+    ).iterator(chunk_size=10000)
+
+    histories = []
+    bitmaps = {}
+    for user_id, question_id, is_correct in answers:
+        if user_id not in bitmaps:
+            bitmaps[user_id] = (bytearray(), bytearray(), bytearray())
+        apply_answer(*bitmaps[user_id], question_id, is_correct)
+    for user_id, (seen, missed, mastered) in bitmaps.items():
+        histories.append(UserQuestionHistory(
+            user_id=user_id, seen=bytes(seen), missed=bytes(missed), mastered=bytes(mastered)
+        ))
+    UserQuestionHistory.objects.bulk_create(histories, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_questionlshbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserQuestionHistory',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='question_history', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('seen', models.BinaryField(default=bytes)),
+                ('missed', models.BinaryField(default=bytes)),
+                ('mastered', models.BinaryField(default=bytes)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(build_histories, migrations.RunPython.noop),
+    ]
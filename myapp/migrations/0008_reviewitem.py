@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_review_items(apps, schema_editor):
+    from myapp.review import DEFAULT_EASE, due_time, next_schedule
+
+    UserAnswer = apps.get_model('myapp', 'UserAnswer')
+    ReviewItem = apps.get_model('myapp', 'ReviewItem')
+    answers = UserAnswer.objects.order_by('user_id', 'question_id', 'created_at', 'id').values_list(
+        'user_id', 'question_id', 'is_correct', 'created_at'
+    ).iterator(chunk_size=10000)
+
+    items = []
+    state = None
+    key = None
+
+    def flush():
+        repetitions, interval_days, ease, answered_at = state
+        items.append(ReviewItem(
+            user_id=key[0], question_id=key[1], repetitions=repetitions, interval_days=interval_days,
+            ease=ease, last_reviewed_at=answered_at, due_at=due_time(answered_at, interval_days)
+        ))
+
+    for user_id, question_id, is_correct, created_at in answers:
+        if (user_id, question_id) != key:
+            if key is not None:
+                flush()
+            key = (user_id, question_id)
+            state = (0, 0, DEFAULT_EASE, created_at)
+        state = next_schedule(state[0], state[1], state[2], is_correct) + (created_at,)
+        if len(items) >= 5000:
+            ReviewItem.objects.bulk_create(items)
+            items = []
+    if key is not None:
+        flush()
+    ReviewItem.objects.bulk_create(items)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_userquestionhistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repetitions', models.IntegerField(default=0)),
+                ('interval_days', models.FloatField(default=0)),
+                ('ease', models.FloatField(default=2.5)),
+                ('due_at', models.DateTimeField()),
+                ('last_reviewed_at', models.DateTimeField()),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_items', to='myapp.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_items', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'due_at'], name='myapp_revie_user_id_4d145e_idx')],
+                'unique_together': {('user', 'question')},
+            },
+        ),
+        migrations.RunPython(build_review_items, migrations.RunPython.noop),
+    ]
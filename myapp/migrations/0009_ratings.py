@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:47
+
+from django.db import migrations, models
+
+
+def rate_hard_questions_by_difficulty(apps, schema_editor):
+    from myapp.ratings import difficulty_rating
+
+    HardQuestion = apps.get_model('myapp', 'HardQuestion')
+    for difficulty in HardQuestion.objects.values_list('difficulty', flat=True).distinct():
+        HardQuestion.objects.filter(difficulty=difficulty).update(rating=difficulty_rating(difficulty))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_reviewitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hardquestion',
+            name='rating',
+            field=models.FloatField(db_index=True, default=1000),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='rating',
+            field=models.FloatField(db_index=True, default=1000),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='rating',
+            field=models.FloatField(db_index=True, default=1000),
+        ),
+        migrations.RunPython(rate_hard_questions_by_difficulty, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_ratings'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='hardquestion',
+            name='difficulty',
+            field=models.IntegerField(db_index=True, default=1),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_stats(apps, schema_editor):
+    from django.db.models import Count, Q
+    from myapp.stats import add_wrong_answer, normalize_answer
+
+    UserAnswer = apps.get_model('myapp', 'UserAnswer')
+    HardQuestionAttempt = apps.get_model('myapp', 'HardQuestionAttempt')
+    QuestionStats = apps.get_model('myapp', 'QuestionStats')
+    HardQuestionStats = apps.get_model('myapp', 'HardQuestionStats')
+
+    stats = {}
+    rows = UserAnswer.objects.values('question_id', 'selected_choice_id').annotate(
+        picks=Count('id'), correct=Count('id', filter=Q(is_correct=True))
+    )
+    for row in rows:
+        item = stats.setdefault(row['question_id'], QuestionStats(question_id=row['question_id'], choice_counts={}))
+        item.attempts += row['picks']
+        item.correct_count += row['correct']
+        item.choice_counts[str(row['selected_choice_id'])] = row['picks']
+    QuestionStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+    hard_stats = {}
+    attempts = HardQuestionAttempt.objects.order_by('id').values_list(
+        'question_id', 'user_answer', 'is_correct'
+    ).iterator(chunk_size=10000)
+    for question_id, user_answer, is_correct in attempts:
+        item = hard_stats.setdefault(question_id, HardQuestionStats(question_id=question_id, wrong_answers={}))
+        item.attempts += 1
+        if is_correct:
+            item.correct_count += 1
+        else:
+            add_wrong_answer(item.wrong_answers, normalize_answer(user_answer))
+    HardQuestionStats.objects.bulk_create(hard_stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_hardquestion_difficulty_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HardQuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='myapp.hardquestion')),
+                ('attempts', models.IntegerField(default=0)),
+                ('correct_count', models.IntegerField(default=0)),
+                ('wrong_answers', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='myapp.question')),
+                ('attempts', models.IntegerField(default=0)),
+                ('correct_count', models.IntegerField(default=0)),
+                ('choice_counts', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
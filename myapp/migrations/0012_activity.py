@@ -0,0 +1,97 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_activity(apps, schema_editor):
+    """
+    Roll up the existing attempts per user and UTC day (users have no timezone
+    yet at this point). Frozen here rather than calling myapp.activity.rebuild,
+    which follows the current models and archive format.
+    """
+    from datetime import timedelta, timezone
+
+    from django.db.models import Count, Q
+    from django.db.models.functions import TruncDate
+
+    DailyActivity = apps.get_model('myapp', 'DailyActivity')
+    ActivitySummary = apps.get_model('myapp', 'ActivitySummary')
+    sources = (
+        (apps.get_model('myapp', 'UserAnswer'), 'created_at', 'answers', 'correct_answers'),
+        (apps.get_model('myapp', 'HardQuestionAttempt'), 'created_at', 'hard_attempts', 'hard_correct'),
+        (apps.get_model('myapp', 'TournamentAttempt'), 'start_time', 'tournaments', None),
+    )
+
+    days = {}  # (user_id, day) -> DailyActivity
+    for model, time_field, count_field, correct_field in sources:
+        counts = {count_field: Count('id')}
+        if correct_field:
+            counts[correct_field] = Count('id', filter=Q(is_correct=True))
+        rows = (
+            model.objects.order_by()
+            .annotate(day=TruncDate(time_field, tzinfo=timezone.utc))
+            .values('user_id', 'day')
+            .annotate(**counts)
+        )
+        for row in rows:
+            item = days.setdefault((row['user_id'], row['day']), DailyActivity(user_id=row['user_id'], day=row['day']))
+            for field in counts:
+                setattr(item, field, row[field])
+
+    summaries = {}
+    for (user_id, day), item in sorted(days.items()):
+        summary = summaries.setdefault(user_id, ActivitySummary(user_id=user_id))
+        for field in ('answers', 'correct_answers', 'hard_attempts', 'hard_correct', 'tournaments'):
+            setattr(summary, field, getattr(summary, field) + getattr(item, field))
+        if summary.last_active_day is not None and day == summary.last_active_day + timedelta(days=1):
+            summary.current_streak += 1
+        else:
+            summary.current_streak = 1
+        summary.longest_streak = max(summary.longest_streak, summary.current_streak)
+        summary.last_active_day = day
+
+    DailyActivity.objects.bulk_create(days.values(), batch_size=2000)
+    ActivitySummary.objects.bulk_create(summaries.values(), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_question_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivitySummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('answers', models.IntegerField(default=0)),
+                ('correct_answers', models.IntegerField(default=0)),
+                ('hard_attempts', models.IntegerField(default=0)),
+                ('hard_correct', models.IntegerField(default=0)),
+                ('tournaments', models.IntegerField(default=0)),
+                ('current_streak', models.IntegerField(default=0)),
+                ('longest_streak', models.IntegerField(default=0)),
+                ('last_active_day', models.DateField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('answers', models.IntegerField(default=0)),
+                ('correct_answers', models.IntegerField(default=0)),
+                ('hard_attempts', models.IntegerField(default=0)),
+                ('hard_correct', models.IntegerField(default=0)),
+                ('tournaments', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'day')},
+            },
+        ),
+        migrations.RunPython(build_activity, migrations.RunPython.noop),
+    ]
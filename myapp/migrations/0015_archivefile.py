@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_tournament_rooms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=100)),
+                ('month', models.DateField()),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('rows', models.IntegerField()),
+                ('first_id', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['table', 'first_id'], name='myapp_archi_table_a03bf3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0015_archivefile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roomplayer',
+            name='last_position',
+            field=models.IntegerField(default=-1),
+        ),
+    ]
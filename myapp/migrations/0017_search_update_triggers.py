@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def drop_update_triggers(apps, schema_editor):
+    # The update triggers used to fire on any column, rating included. Dropping
+    # them lets ensure_search_indexes() recreate them, limited to the indexed
+    # columns, when this migrate finishes (see myapp/search.py).
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in ('myapp_question_fts_au', 'myapp_hardquestion_fts_au'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0016_roomplayer_last_position'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_update_triggers, migrations.RunPython.noop),
+    ]
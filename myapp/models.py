@@ -28,6 +28,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     full_name = models.CharField(max_length=255)
     date_of_birth = models.DateField()
     phone_number = models.CharField(max_length=15, blank=True, null=True)
+    rating = models.FloatField(default=1000, db_index=True)  # Elo-style ability, see myapp/ratings.py
+    timezone = models.CharField(max_length=64, default='UTC')  # IANA name, used for daily/weekly stats
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -43,6 +45,7 @@ class User(AbstractBaseUser, PermissionsMixin):
 # Added models for questions
 class Question(models.Model):
     question_text = models.CharField(max_length=500)
+    rating = models.FloatField(default=1000, db_index=True)  # Elo-style difficulty
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -104,7 +107,7 @@ class UserAnswer(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     selected_choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
     is_correct = models.BooleanField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         ordering = ['-created_at']
@@ -138,7 +141,8 @@ class HardQuestionAttempt(models.Model):
 class HardQuestion(models.Model):
     question_text = models.CharField(max_length=500)
     correct_answer = models.CharField(max_length=500)  # Exact answer
-    difficulty = models.IntegerField(default=1)  # 1-5 scale
+    difficulty = models.IntegerField(default=1, db_index=True)  # 1-5 scale
+    rating = models.FloatField(default=1000, db_index=True)  # Elo-style difficulty
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -152,4 +156,159 @@ class HardQuestionAttempt(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.user.email} - {self.question.question_text} - {'Correct' if self.is_correct else 'Incorrect'}"
\ No newline at end of file
+        return f"{self.user.email} - {self.question.question_text} - {'Correct' if self.is_correct else 'Incorrect'}"
+
+class QuestionLSHBucket(models.Model):
+    """One band bucket of a question's MinHash signature, used to find near-duplicates (see myapp/dedupe.py)"""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='lsh_buckets')
+    band = models.SmallIntegerField()
+    bucket = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"{self.question_id} - band {self.band}"
+
+
+class UserQuestionHistory(models.Model):
+    """Per-user bitmaps over question ids, used for adaptive selection (see myapp/history.py)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='question_history')
+    seen = models.BinaryField(default=bytes)  # answered at least once
+    missed = models.BinaryField(default=bytes)  # last answer was wrong
+    mastered = models.BinaryField(default=bytes)  # answered correctly at least twice in a row
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} - question history"
+
+
+class ReviewItem(models.Model):
+    """Spaced-repetition schedule of one question for one user (see myapp/review.py)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='review_items')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='review_items')
+    repetitions = models.IntegerField(default=0)  # correct answers in a row
+    interval_days = models.FloatField(default=0)
+    ease = models.FloatField(default=2.5)
+    due_at = models.DateTimeField()
+    last_reviewed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id} - {self.question_id} - due {self.due_at}"
+
+    class Meta:
+        unique_together = ['user', 'question']
+        indexes = [models.Index(fields=['user', 'due_at'])]
+
+
+class QuestionStats(models.Model):
+    """Answer counts of one question, maintained as answers are recorded (see myapp/stats.py)"""
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    choice_counts = models.JSONField(default=dict)  # choice id -> times picked
+
+    def __str__(self):
+        return f"{self.question_id} - {self.correct_count}/{self.attempts}"
+
+
+class HardQuestionStats(models.Model):
+    """Answer counts of one hard question, maintained as attempts are recorded (see myapp/stats.py)"""
+    question = models.OneToOneField(HardQuestion, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    wrong_answers = models.JSONField(default=dict)  # normalized wrong answer -> approximate count
+
+    def __str__(self):
+        return f"{self.question_id} - {self.correct_count}/{self.attempts}"
+
+
+class DailyActivity(models.Model):
+    """Per-user, per-day answer and tournament counts (see myapp/activity.py)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_activity')
+    day = models.DateField()
+    answers = models.IntegerField(default=0)
+    correct_answers = models.IntegerField(default=0)
+    hard_attempts = models.IntegerField(default=0)
+    hard_correct = models.IntegerField(default=0)
+    tournaments = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.day}"
+
+    class Meta:
+        unique_together = ['user', 'day']
+
+
+class ActivitySummary(models.Model):
+    """Lifetime activity totals and streaks of a user (see myapp/activity.py)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='activity_summary')
+    answers = models.IntegerField(default=0)
+    correct_answers = models.IntegerField(default=0)
+    hard_attempts = models.IntegerField(default=0)
+    hard_correct = models.IntegerField(default=0)
+    tournaments = models.IntegerField(default=0)
+    current_streak = models.IntegerField(default=0)  # consecutive active days ending on last_active_day
+    longest_streak = models.IntegerField(default=0)
+    last_active_day = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.answers} answers"
+
+
+class TournamentRoom(models.Model):
+    """A multiplayer tournament where every player gets the same questions at the same time (see myapp/rooms.py)"""
+    LOBBY = 'lobby'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    STATUS_CHOICES = [(LOBBY, 'Lobby'), (RUNNING, 'Running'), (FINISHED, 'Finished')]
+
+    code = models.CharField(max_length=8, unique=True)
+    host = models.ForeignKey(User, on_delete=models.CASCADE, related_name='hosted_rooms')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=LOBBY)
+    seconds_per_question = models.IntegerField(default=20)
+    created_at = models.DateTimeField(auto_now_add=True)
+    starts_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Room {self.code} ({self.status})"
+
+
+class RoomQuestion(models.Model):
+    room = models.ForeignKey(TournamentRoom, on_delete=models.CASCADE, related_name='room_questions')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    position = models.IntegerField()  # 0-based order within the room
+
+    class Meta:
+        ordering = ['position']
+        unique_together = ['room', 'position']
+
+
+class RoomPlayer(models.Model):
+    room = models.ForeignKey(TournamentRoom, on_delete=models.CASCADE, related_name='players')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='room_players')
+    joined_at = models.DateTimeField(auto_now_add=True)
+    score = models.IntegerField(default=0)  # updated with every answer
+    correct_count = models.IntegerField(default=0)
+    last_position = models.IntegerField(default=-1)  # highest position answered
+
+    def __str__(self):
+        return f"{self.user_id} in {self.room_id} - {self.score}"
+
+    class Meta:
+        unique_together = ['room', 'user']
+
+
+class ArchiveFile(models.Model):
+    """One file of attempt rows moved out of their table (see myapp/archive.py)"""
+    table = models.CharField(max_length=100)  # model label, e.g. myapp.useranswer
+    month = models.DateField()  # first day of the UTC month the rows were created in
+    path = models.CharField(max_length=255, unique=True)  # relative to ARCHIVE_DIR
+    rows = models.IntegerField()
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.path
+
+    class Meta:
+        indexes = [models.Index(fields=['table', 'first_id'])]
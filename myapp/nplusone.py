@@ -0,0 +1,197 @@
+"""
+N+1 query detection.
+
+NPlusOneMiddleware fingerprints every SELECT a request runs, replacing
+literals and IN lists so queries that differ only in their values match. When
+one fingerprint runs more than NPLUSONE_THRESHOLD times in a request, that
+request is loading related rows one at a time instead of with
+select_related/prefetch_related or a single batched query.
+
+NPLUSONE_MODE says what happens then:
+  'raise' - raise NPlusOneError when the request finishes, naming each
+            offending query and where it ran (the test runner below uses this,
+            so regressions fail tests)
+  'log'   - log one JSON line on the myapp.nplusone logger, at most once per
+            view and fingerprint every NPLUSONE_LOG_INTERVAL seconds
+  'off'   - don't track queries at all
+
+Code that deliberately repeats a query per row, such as answer writes whose
+signals update rollups, can run under ignore().
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from . import instrumentation
+
+logger = logging.getLogger('myapp.nplusone')
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Frames of the query-wrapping modules themselves are never the call site
+WRAPPER_FILES = {os.path.abspath(__file__), os.path.abspath(instrumentation.__file__)}
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+_current = contextvars.ContextVar('nplusone_tracker', default=None)
+
+_log_lock = threading.Lock()
+_last_logged = {}  # (view, fingerprint) -> monotonic time of the last log line
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """The shape of a query: literals become ? and IN lists of any length match"""
+    return _LITERAL_RE.sub('?', _IN_LIST_RE.sub('IN (...)', sql))
+
+
+def call_site(skip_files=WRAPPER_FILES):
+    """file:line of the innermost project frame outside `skip_files`, or None"""
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(APP_DIR) and frame.filename not in skip_files:
+            return f"{os.path.relpath(frame.filename, os.path.dirname(APP_DIR))}:{frame.lineno} in {frame.name}"
+    return None
+
+
+def get_mode():
+    return getattr(settings, 'NPLUSONE_MODE', 'log')
+
+
+class Tracker:
+    __slots__ = ('request', 'counts', 'paused', 'mode', 'threshold', 'violations')
+
+    def __init__(self, request, mode):
+        self.request = request
+        self.counts = {}
+        self.paused = 0
+        self.mode = mode
+        self.threshold = getattr(settings, 'NPLUSONE_THRESHOLD', 3)
+        self.violations = []
+
+    def add(self, sql):
+        if self.paused:
+            return
+        shape = fingerprint(sql)
+        count = self.counts.get(shape, 0) + 1
+        self.counts[shape] = count
+        if count == self.threshold + 1:
+            self.report(shape)
+
+    def report(self, shape):
+        view = instrumentation.view_name(self.request)
+        site = call_site()
+        if self.mode == 'raise':
+            # Raised by the middleware, so views' broad except clauses can't swallow it
+            self.violations.append(f"Query repeated more than {self.threshold} times in {view} at {site}: {shape}")
+            return
+        key = (view, shape)
+        now = time.monotonic()
+        with _log_lock:
+            last = _last_logged.get(key)
+            if last is not None and now - last < getattr(settings, 'NPLUSONE_LOG_INTERVAL', 300):
+                return
+            _last_logged[key] = now
+        logger.warning(json.dumps({
+            "event": "n_plus_one",
+            "view": view,
+            "path": self.request.path,
+            "threshold": self.threshold,
+            "site": site,
+            "query": shape,
+        }))
+
+    def check(self):
+        if self.violations:
+            raise NPlusOneError('\n'.join(self.violations))
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    tracker = _current.get()
+    if tracker is not None and not many and sql.lstrip()[:6].upper() == 'SELECT':
+        tracker.add(sql)
+    return execute(sql, params, many, context)
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """connection_created receiver: add the tracking wrapper to each new connection"""
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+@contextlib.contextmanager
+def ignore():
+    """Don't count queries made inside this block"""
+    tracker = _current.get()
+    if tracker is not None:
+        tracker.paused += 1
+    try:
+        yield
+    finally:
+        if tracker is not None:
+            tracker.paused -= 1
+
+
+class NPlusOneMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        mode = get_mode()
+        if mode == 'off':
+            return self.get_response(request)
+        tracker = Tracker(request, mode)
+        token = _current.set(tracker)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        tracker.check()
+        return response
+
+    async def __acall__(self, request):
+        mode = get_mode()
+        if mode == 'off':
+            return await self.get_response(request)
+        tracker = Tracker(request, mode)
+        token = _current.set(tracker)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        tracker.check()
+        return response
+
+
+class NPlusOneTestRunner(DiscoverRunner):
+    """Test runner that turns any N+1 pattern hit by a test request into a failure"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._nplusone_settings = override_settings(NPLUSONE_MODE='raise')
+        self._nplusone_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._nplusone_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,81 @@
+"""
+Percentile rank of tournament times.
+
+Each process keeps every player's best completed tournament time in a sorted
+array, so "faster than X% of players" is a binary search instead of a COUNT
+over all tournaments. The array is rebuilt from one grouped query when it is
+older than TOURNAMENT_PERCENTILE_REBUILD_SECONDS, and completions handled by
+this process are inserted in place straight away. Readers take the same lock
+as those inserts, so they never search an array halfway through a change.
+"""
+import bisect
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.db.models import Min
+
+from .models import TournamentAttempt
+
+_lock = threading.Lock()
+_state = None  # (built_at, sorted best times, user id -> best time)
+
+
+def rebuild_interval():
+    return getattr(settings, 'TOURNAMENT_PERCENTILE_REBUILD_SECONDS', 300)
+
+
+def _load():
+    rows = TournamentAttempt.objects.filter(
+        completed=True, total_seconds__isnull=False
+    ).order_by().values('user_id').annotate(best=Min('total_seconds')).values_list('user_id', 'best')
+    best = dict(rows)
+    return time.monotonic(), array('d', sorted(best.values())), best
+
+
+def _current():
+    global _state
+    state = _state
+    if state is None or time.monotonic() - state[0] > rebuild_interval():
+        state = _load()
+        with _lock:
+            _state = state
+    return state
+
+
+def record_time(user_id, seconds):
+    """Insert a completed tournament time if it is the user's new best"""
+    with _lock:
+        if _state is None:
+            return  # loaded with this time on first lookup
+        _, times, best = _state
+        previous = best.get(user_id)
+        if previous is not None:
+            if seconds >= previous:
+                return
+            del times[bisect.bisect_left(times, previous)]
+        times.insert(bisect.bisect_left(times, seconds), seconds)
+        best[user_id] = seconds
+
+
+def faster_than(user_id, seconds):
+    """
+    Percentage of other players whose best time is slower than the user's
+    `seconds`, or None if nobody else has completed a tournament.
+    """
+    if seconds is None:
+        return None
+    state = _current()
+    with _lock:
+        _, times, best = state
+        # The user's own entry may be missing (completed in another process since
+        # the last rebuild) or older than `seconds`; either way it isn't an "other"
+        own = best.get(user_id)
+        others = len(times) - (own is not None)
+        slower = len(times) - bisect.bisect_right(times, seconds)
+    if own is not None and own > seconds:
+        slower -= 1
+    if others <= 0:
+        return None
+    return round(min(slower / others, 1.0) * 100, 1)
@@ -0,0 +1,128 @@
+"""
+Publish/subscribe fan-out for live updates.
+
+Streaming views subscribe to a topic and wait on an asyncio queue; any code,
+sync or async and on any thread, can publish a JSON-serializable message to
+that topic. The default InProcessBroker delivers within one process, which is
+enough for a single ASGI worker. PUBSUB_BACKEND names a replacement class (for
+example one backed by a local Redis or NATS broker) with the same
+publish()/publish_if_changed()/has_subscribers()/subscribe() interface.
+
+publish_if_changed() drops a message identical to the last one published on
+its topic. The broker remembers that per topic while the topic has
+subscribers, next to the subscribers it is deduplicating for.
+"""
+import asyncio
+import hashlib
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'myapp.pubsub.InProcessBroker'
+
+
+class Subscription:
+    """Messages for one subscriber; slow consumers lose the oldest messages, not the newest"""
+
+    def __init__(self, broker, topic, max_queued):
+        self.broker = broker
+        self.topic = topic
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_queued)
+
+    def deliver(self, message):
+        # Runs on the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Next message, or None if `timeout` seconds pass first"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # topic -> set of Subscription
+        self._digests = {}  # topic -> digest of the last message published on it
+
+    def subscribe(self, topic):
+        """Must be called from a running event loop"""
+        subscription = Subscription(self, topic, getattr(settings, 'PUBSUB_MAX_QUEUED', 16))
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.topic]
+                    self._digests.pop(subscription.topic, None)
+
+    def has_subscribers(self, topic):
+        return topic in self._subscribers
+
+    def publish(self, topic, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+    def publish_if_changed(self, topic, message):
+        """Publish `message` unless it is what this topic last carried; returns whether it was published"""
+        digest = hashlib.sha1(message.encode('utf-8')).hexdigest()
+        with self._lock:
+            if topic not in self._subscribers or self._digests.get(topic) == digest:
+                return False
+            self._digests[topic] = digest
+        self.publish(topic, message)
+        return True
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, 'PUBSUB_BACKEND', DEFAULT_BACKEND))()
+    return _broker
+
+
+def publish(topic, message):
+    return get_broker().publish(topic, message)
+
+
+def publish_if_changed(topic, message):
+    return get_broker().publish_if_changed(topic, message)
+
+
+def has_subscribers(topic):
+    return get_broker().has_subscribers(topic)
+
+
+def subscribe(topic):
+    return get_broker().subscribe(topic)
+
@@ -0,0 +1,84 @@
+"""
+Helpers shared by the question create endpoint and the bulk import/export commands
+"""
+import hashlib
+import re
+
+from . import dedupe, question_pool
+from .models import Question, Choice
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_question_text(text):
+    """Collapse whitespace and case so trivially different texts compare equal"""
+    return _WHITESPACE_RE.sub(' ', text or '').strip().lower()
+
+
+def question_text_hash(text):
+    """Stable hash of the normalized question text, used for deduplication"""
+    return hashlib.sha1(normalize_question_text(text).encode('utf-8')).hexdigest()
+
+
+def validate_choices(choices_data):
+    """
+    Check the one-correct-choice rule for a question.
+    Returns an error message, or None if the choices are valid.
+    """
+    if not choices_data or len(choices_data) < 2:
+        return "At least two choices must be provided for a question"
+
+    correct_choices = [c for c in choices_data if c.get('is_correct')]
+    if len(correct_choices) == 0:
+        return "At least one choice must be marked as correct"
+    if len(correct_choices) > 1:
+        return "Only one choice should be marked as correct"
+
+    indexes = [c.get('index', 0) for c in choices_data]
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in indexes):
+        return "Choice indexes must be integers"
+    if len(set(indexes)) != len(indexes):
+        return "Choice indexes must be unique within a question"
+
+    return None
+
+
+def validate_question(question_text, choices_data):
+    """
+    Check a question's text and choices before insertion.
+    Returns an error message, or None if the question is valid.
+    """
+    max_length = Question._meta.get_field('question_text').max_length
+    if not isinstance(question_text, str) or not question_text.strip():
+        return "question_text is required"
+    if len(question_text) > max_length:
+        return f"question_text must be at most {max_length} characters"
+    return validate_choices(choices_data)
+
+
+def bulk_create_questions(items, batch_size=1000):
+    """
+    Insert questions and their choices with one bulk_create per table.
+    `items` is a list of (question_text, choices_data) pairs that already passed
+    validate_choices. Call inside a transaction.
+    """
+    questions = Question.objects.bulk_create(
+        [Question(question_text=question_text) for question_text, _ in items],
+        batch_size=batch_size
+    )
+
+    choices = [
+        Choice(
+            question=question,
+            text=choice_data.get('text', ''),
+            index=choice_data.get('index', 0),
+            is_correct=bool(choice_data.get('is_correct', False))
+        )
+        for question, (_, choices_data) in zip(questions, items)
+        for choice_data in choices_data
+    ]
+    Choice.objects.bulk_create(choices, batch_size=batch_size)
+    dedupe.index_questions(questions)
+    question_pool.bump_version('question')
+
+    return questions
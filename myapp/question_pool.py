@@ -0,0 +1,170 @@
+"""
+Cached pools of question ids for random selection.
+
+Selecting random questions used to load every row; instead each process keeps
+the ids of the bank in compact arrays (one per difficulty for hard questions)
+and reloads them only when the bank version changes. The version is bumped
+whenever questions are created, edited or deleted, and lives in the Django
+cache, which settings.CACHES shares between processes: a bump by any worker
+or management command reaches every process's pools.
+"""
+import bisect
+import random
+import time
+from array import array
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import HardQuestion, Question
+
+# Pools are read from the primary even for views routed to the replica: they
+# are cached under versions bumped on the primary, and a lagging replica would
+# put deleted ids back under the current version (see myapp/routers.py)
+POOL_DATABASE = 'default'
+
+_local_pools = {}  # pool name -> (version, ids)
+
+
+def _version_key(bank):
+    return f'question_pool:{bank}:version'
+
+
+def bank_version(bank='question'):
+    """Current version of a question bank; starts from the clock so restarts never reuse a version"""
+    return cache.get_or_set(_version_key(bank), time.time_ns(), None)
+
+
+async def abank_version(bank='question'):
+    return await cache.aget_or_set(_version_key(bank), time.time_ns(), None)
+
+
+def _bump(bank):
+    # A clock reading rather than an increment, so the version also tells when
+    # the bank last changed (Last-Modified, see myapp/http_cache.py)
+    key = _version_key(bank)
+    cache.set(key, max(time.time_ns(), (cache.get(key) or 0) + 1), None)
+
+
+def bump_version(bank='question'):
+    """Invalidate cached pools once the current transaction commits"""
+    transaction.on_commit(lambda: _bump(bank))
+
+
+def _cached_pool(name, bank, load):
+    version = bank_version(bank)
+    cached = _local_pools.get(name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    pool = load()
+    _local_pools[name] = (version, pool)
+    return pool
+
+
+def forget(name):
+    """Drop this process's copy of a pool, so the next read reloads it"""
+    _local_pools.pop(name, None)
+
+
+def question_ids():
+    """Ids of all multiple-choice questions"""
+    return _cached_pool(
+        'question', 'question',
+        lambda: array('q', Question.objects.using(POOL_DATABASE).order_by('id').values_list('id', flat=True))
+    )
+
+
+async def aquestion_ids():
+    """question_ids() for async views; shares the same process-local pool"""
+    version = await abank_version('question')
+    cached = _local_pools.get('question')
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    ids = Question.objects.using(POOL_DATABASE).order_by('id').values_list('id', flat=True)
+    pool = array('q', [question_id async for question_id in ids])
+    _local_pools['question'] = (version, pool)
+    return pool
+
+
+def sample_question_ids(count):
+    """
+    Up to `count` distinct random ids of questions that still exist. A pool
+    holding a deleted id, left over from a bump this process hasn't seen yet,
+    is reloaded and sampled again.
+    """
+    pool = question_ids()
+    chosen = random.sample(pool, min(count, len(pool)))
+    if Question.objects.filter(id__in=chosen).count() == len(chosen):
+        return chosen
+    forget('question')
+    pool = question_ids()
+    return random.sample(pool, min(count, len(pool)))
+
+
+def random_question(queryset, tries=3):
+    """
+    A random row of `queryset`, a Question queryset, or None if the bank is
+    empty. An id that no longer exists drops the pool and draws again.
+    """
+    for _ in range(tries):
+        pool = question_ids()
+        if not pool:
+            return None
+        question = queryset.filter(id=random.choice(pool)).first()
+        if question is not None:
+            return question
+        forget('question')
+    return None
+
+
+async def arandom_question(queryset, tries=3):
+    for _ in range(tries):
+        pool = await aquestion_ids()
+        if not pool:
+            return None
+        question = await queryset.filter(id=random.choice(pool)).afirst()
+        if question is not None:
+            return question
+        forget('question')
+    return None
+
+
+def _load_hard_pools():
+    pools = {}
+    rows = HardQuestion.objects.using(POOL_DATABASE).order_by('difficulty', 'id').values_list('difficulty', 'id')
+    for difficulty, question_id in rows.iterator(chunk_size=10000):
+        pools.setdefault(difficulty, array('q')).append(question_id)
+    return pools
+
+
+def hard_question_pools():
+    """Ids of hard questions grouped by difficulty"""
+    return _cached_pool('hard', 'hard', _load_hard_pools)
+
+
+def sample_from_pools(pools, count):
+    """
+    Pick up to `count` distinct ids uniformly across several pools without
+    concatenating them; each draw is a bisect over the pools' cumulative sizes.
+    """
+    pools = [pool for pool in pools if len(pool)]
+    total = sum(len(pool) for pool in pools)
+    if total <= count:
+        return [question_id for pool in pools for question_id in pool]
+
+    offsets = []
+    running = 0
+    for pool in pools:
+        running += len(pool)
+        offsets.append(running)
+
+    chosen = []
+    chosen_set = set()
+    while len(chosen) < count:
+        position = random.randrange(total)
+        p = bisect.bisect_right(offsets, position)
+        question_id = pools[p][position - (offsets[p - 1] if p else 0)]
+        if question_id not in chosen_set:
+            chosen.append(question_id)
+            chosen_set.add(question_id)
+    return chosen
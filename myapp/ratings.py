@@ -0,0 +1,84 @@
+"""
+Online Elo-style ratings of user ability and question difficulty.
+
+Every graded answer is treated as a match between the user and the question:
+a correct answer is a win for the user. Both ratings are adjusted with F()
+increments on their rows, so concurrent answers never overwrite each other.
+A batch of answers reads the ratings it needs once (one query when the
+answers are all one user's) and writes each table once. The
+calibrate_ratings command refits all ratings from the full history when the
+online values drift.
+"""
+from django.db.models import F, Subquery
+
+from .models import User
+
+DEFAULT_RATING = 1000.0
+USER_K = 32.0
+QUESTION_K = 16.0  # questions see many more answers than users, so they move slower
+
+# Starting rating of a hard question from its hand-set 1-5 difficulty
+DIFFICULTY_STEP = 100.0
+
+
+def difficulty_rating(difficulty):
+    return DEFAULT_RATING + (difficulty - 3) * DIFFICULTY_STEP
+
+
+def expected_score(user_rating, question_rating):
+    """Probability that the user answers correctly"""
+    return 1.0 / (1.0 + 10 ** ((question_rating - user_rating) / 400.0))
+
+
+def _current_ratings(question_model, user_ids, question_ids):
+    """(user id -> rating, question id -> rating) for the given rows"""
+    questions = question_model.objects.filter(id__in=question_ids)
+    if len(user_ids) == 1:
+        # A single user's answers, as in a quiz: their rating comes along as a scalar subquery
+        [user_id] = user_ids
+        rows = questions.annotate(
+            user_rating=Subquery(User.objects.filter(id=user_id).values('rating'))
+        ).values_list('id', 'rating', 'user_rating')
+        question_ratings = {}
+        user_ratings = {}
+        for question_id, rating, user_rating in rows:
+            question_ratings[question_id] = rating
+            if user_rating is not None:
+                user_ratings[user_id] = user_rating
+        return user_ratings, question_ratings
+    return (
+        dict(User.objects.filter(id__in=user_ids).values_list('id', 'rating')),
+        dict(questions.values_list('id', 'rating')),
+    )
+
+
+def record_answers(question_model, answers):
+    """
+    Apply (user_id, question_id, is_correct) answers in order: each one moves
+    the ratings the next one sees, as if they were recorded one by one. Every
+    rating is read once and every changed row written once.
+    """
+    answers = list(answers)
+    if not answers:
+        return
+    user_ratings, question_ratings = _current_ratings(
+        question_model, {answer[0] for answer in answers}, {answer[1] for answer in answers}
+    )
+    user_deltas = {}
+    question_deltas = {}
+    for user_id, question_id, is_correct in answers:
+        if user_id not in user_ratings or question_id not in question_ratings:
+            continue
+        surprise = (1.0 if is_correct else 0.0) - expected_score(user_ratings[user_id], question_ratings[question_id])
+        user_ratings[user_id] += USER_K * surprise
+        question_ratings[question_id] -= QUESTION_K * surprise
+        user_deltas[user_id] = user_deltas.get(user_id, 0.0) + USER_K * surprise
+        question_deltas[question_id] = question_deltas.get(question_id, 0.0) - QUESTION_K * surprise
+
+    User.objects.bulk_update(
+        [User(id=user_id, rating=F('rating') + delta) for user_id, delta in user_deltas.items()], ['rating']
+    )
+    question_model.objects.bulk_update(
+        [question_model(id=question_id, rating=F('rating') + delta) for question_id, delta in question_deltas.items()],
+        ['rating']
+    )
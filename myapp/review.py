@@ -0,0 +1,84 @@
+"""
+Spaced-repetition scheduling (SM-2) of multiple-choice questions.
+
+Every recorded answer updates the (user, question) ReviewItem in the same
+transaction, a whole quiz's answers at once. Due items are then served by a range scan of the (user, due_at)
+index, without looking at the answer history.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+
+from .models import ReviewItem
+
+MIN_EASE = 1.3
+DEFAULT_EASE = 2.5
+RELEARN_DELAY = timedelta(minutes=10)  # missed questions come back in the same session
+
+QUALITY_CORRECT = 4
+QUALITY_WRONG = 1
+
+
+def next_schedule(repetitions, interval_days, ease, is_correct):
+    """Apply one SM-2 step. Returns (repetitions, interval_days, ease)"""
+    quality = QUALITY_CORRECT if is_correct else QUALITY_WRONG
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+    if not is_correct:
+        return 0, 0, ease
+
+    if repetitions == 0:
+        interval_days = 1
+    elif repetitions == 1:
+        interval_days = 6
+    else:
+        interval_days = interval_days * ease
+    return repetitions + 1, interval_days, ease
+
+
+def due_time(answered_at, interval_days):
+    if interval_days == 0:
+        return answered_at + RELEARN_DELAY
+    return answered_at + timedelta(days=interval_days)
+
+
+def record_answers(answers):
+    """Apply (user_id, question_id, is_correct, answered_at) answers to their ReviewItems, in order"""
+    answers = list(answers)
+    if not answers:
+        return
+
+    with transaction.atomic():
+        items = {
+            (item.user_id, item.question_id): item
+            for item in ReviewItem.objects.select_for_update().filter(
+                user_id__in={answer[0] for answer in answers}, question_id__in={answer[1] for answer in answers}
+            ).order_by('pk')
+        }
+        created, updated = {}, {}
+        for user_id, question_id, is_correct, answered_at in answers:
+            key = (user_id, question_id)
+            item = items.get(key)
+            if item is None:
+                item = items[key] = created[key] = ReviewItem(user_id=user_id, question_id=question_id, ease=DEFAULT_EASE)
+            elif key not in created:
+                updated[key] = item
+
+            item.repetitions, item.interval_days, item.ease = next_schedule(
+                item.repetitions, item.interval_days, item.ease, is_correct
+            )
+            item.last_reviewed_at = answered_at
+            item.due_at = due_time(answered_at, item.interval_days)
+        ReviewItem.objects.bulk_create(created.values())
+        ReviewItem.objects.bulk_update(
+            updated.values(), ['repetitions', 'interval_days', 'ease', 'last_reviewed_at', 'due_at']
+        )
+
+
+def due_items(user, now, count):
+    return (
+        ReviewItem.objects.filter(user=user, due_at__lte=now)
+        .order_by('due_at')
+        .select_related('question')
+        .prefetch_related('question__choices')[:count]
+    )
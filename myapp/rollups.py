@@ -0,0 +1,43 @@
+"""
+The rollups kept up to date as answers are recorded.
+
+A UserAnswer or HardQuestionAttempt saved on its own reaches these through
+post_save (see myapp/signals.py). Endpoints that record a whole quiz at once
+bulk_create the rows instead, which sends no signals, and pass them all here
+in one call: every rollup then runs a fixed number of queries for the batch
+instead of a few per answer.
+"""
+from . import activity, history, ratings, review, stats
+from .models import HardQuestion, Question
+
+
+def record_answers(answers):
+    """Update every rollup for saved UserAnswer rows, in order"""
+    answers = list(answers)
+    if not answers:
+        return
+    history.record_answers((answer.user_id, answer.question_id, answer.is_correct) for answer in answers)
+    review.record_answers(
+        (answer.user_id, answer.question_id, answer.is_correct, answer.created_at) for answer in answers
+    )
+    ratings.record_answers(Question, ((answer.user_id, answer.question_id, answer.is_correct) for answer in answers))
+    stats.record_answers((answer.question_id, answer.selected_choice_id, answer.is_correct) for answer in answers)
+    activity.record_many(
+        (answer.user, answer.created_at, {"answers": 1, "correct_answers": int(bool(answer.is_correct))})
+        for answer in answers
+    )
+
+
+def record_hard_answers(attempts):
+    """Update every rollup for saved HardQuestionAttempt rows, in order"""
+    attempts = list(attempts)
+    if not attempts:
+        return
+    ratings.record_answers(
+        HardQuestion, ((attempt.user_id, attempt.question_id, attempt.is_correct) for attempt in attempts)
+    )
+    stats.record_hard_answers((attempt.question_id, attempt.user_answer, attempt.is_correct) for attempt in attempts)
+    activity.record_many(
+        (attempt.user, attempt.created_at, {"hard_attempts": 1, "hard_correct": int(bool(attempt.is_correct))})
+        for attempt in attempts
+    )
@@ -0,0 +1,410 @@
+"""
+Live multiplayer tournament rooms.
+
+A room is created with a question set drawn once from the bank. Players join
+in the lobby, and when the host starts the room every player follows the same
+fixed timeline: a short countdown, then each question is open for
+seconds_per_question followed by a results pause. Events ("player_joined",
+"started", "question", "results", "finished") go out on the room's pubsub
+topic and reach players over live.stream_response.
+
+While a room runs its state lives in memory in a RoomState: answers are checked
+against preloaded answer keys and only bump counters, so an answer costs the
+same however many players there are. Standings are computed once per question.
+Each answer adds its points to the player's RoomPlayer row and saves its
+UserAnswer before the in-memory state changes; the rollups of those answers
+(history, review, ratings, stats and activity) are applied in one batch when
+the question closes, so players answering together don't queue on the
+question's shared stats row. Rooms must be served by one process (a single
+ASGI worker, or requests routed by room code). After a restart the state is
+rebuilt from the database, scores and answered positions included; only the
+choice counts of the question open at the time start over, and the rollups of
+its answers so far are skipped. A finished room is dropped from memory, and later reads load it
+from the database.
+"""
+import heapq
+import random
+import string
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import live, pubsub, question_pool, rollups
+from .models import RoomPlayer, RoomQuestion, TournamentRoom, UserAnswer
+
+COUNTDOWN_SECONDS = 3
+RESULTS_SECONDS = 3
+STANDINGS_SIZE = 10
+CODE_LENGTH = 6
+
+
+class RoomError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def room_topic(code):
+    return f'room:{code}'
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc) if timestamp is not None else None
+
+
+class PlayerState:
+    __slots__ = ('user_id', 'name', 'score', 'correct', 'last_position')
+
+    def __init__(self, user_id, name, score=0, correct=0, last_position=-1):
+        self.user_id = user_id
+        self.name = name
+        self.score = score
+        self.correct = correct
+        self.last_position = last_position  # highest position answered
+
+    def standing(self):
+        return {"user_id": self.user_id, "name": self.name, "score": self.score, "correct": self.correct}
+
+
+class RoomState:
+    def __init__(self, room, players, questions, answer_keys):
+        self.id = room.id
+        self.code = room.code
+        self.host_id = room.host_id
+        self.status = room.status
+        self.seconds_per_question = room.seconds_per_question
+        self.starts_at = room.starts_at.timestamp() if room.starts_at else None
+        self.players = {player.user_id: player for player in players}
+        self.questions = questions      # per position: question payload without the answer
+        self.answer_keys = answer_keys  # per position: choice id -> is_correct
+        self.choice_counts = [Counter() for _ in questions]
+        self.announced = -1  # last position whose "question" event went out
+        self.closed = -1     # last position whose "results" event went out
+        self.pending_answers = []  # saved UserAnswers whose rollups wait for their question to close
+        self.lock = threading.Lock()
+
+    # Timeline
+
+    def opens_at(self, position):
+        return self.starts_at + position * (self.seconds_per_question + RESULTS_SECONDS)
+
+    def closes_at(self, position):
+        return self.opens_at(position) + self.seconds_per_question
+
+    def open_position(self, now):
+        """The position of the question open at `now`, or None"""
+        if self.status != TournamentRoom.RUNNING or now < self.starts_at:
+            return None
+        position = int((now - self.starts_at) // (self.seconds_per_question + RESULTS_SECONDS))
+        if position < len(self.questions) and now < self.closes_at(position):
+            return position
+        return None
+
+    def next_deadline(self, now):
+        """Seconds until advance() has something to publish, or None"""
+        if self.status != TournamentRoom.RUNNING:
+            return None
+        deadlines = []
+        if self.announced + 1 < len(self.questions):
+            deadlines.append(self.opens_at(self.announced + 1))
+        if self.closed + 1 < len(self.questions):
+            deadlines.append(self.closes_at(self.closed + 1))
+        return min(deadlines) - now if deadlines else 0
+
+    # Events
+
+    def standings(self):
+        return [p.standing() for p in heapq.nlargest(STANDINGS_SIZE, self.players.values(), key=lambda p: p.score)]
+
+    def _question_event(self, position):
+        return {
+            "type": "question",
+            "position": position,
+            "question": self.questions[position],
+            "closes_at": _iso(self.closes_at(position)),
+        }
+
+    def _results_event(self, position):
+        correct = [choice_id for choice_id, is_correct in self.answer_keys[position].items() if is_correct]
+        counts = self.choice_counts[position]
+        return {
+            "type": "results",
+            "position": position,
+            "correct_choice_ids": correct,
+            "choice_counts": {str(choice_id): count for choice_id, count in counts.items()},
+            "answered": sum(counts.values()),
+            "standings": self.standings(),
+        }
+
+    def advance(self, now):
+        """
+        Move the timeline up to `now`. Returns the events that became due, in
+        order; a "finished" event means the caller must persist the room.
+        """
+        events = []
+        with self.lock:
+            if self.status != TournamentRoom.RUNNING:
+                return events
+            while True:
+                position = self.closed + 1
+                if position < len(self.questions) and now >= self.closes_at(position):
+                    if self.announced < position:
+                        events.append(self._question_event(position))
+                        self.announced = position
+                    events.append(self._results_event(position))
+                    self.closed = position
+                    continue
+                position = self.announced + 1
+                if position < len(self.questions) and now >= self.opens_at(position):
+                    events.append(self._question_event(position))
+                    self.announced = position
+                    continue
+                break
+            if self.closed == len(self.questions) - 1:
+                self.status = TournamentRoom.FINISHED
+                events.append({"type": "finished", "players": len(self.players), "standings": self.standings()})
+        return events
+
+    def grade(self, user_id, position, choice_id, now):
+        """Check and score one answer without recording it; returns (is_correct, points)"""
+        with self.lock:
+            if self.status != TournamentRoom.RUNNING:
+                raise RoomError("Room is not running")
+            player = self.players.get(user_id)
+            if player is None:
+                raise RoomError("You are not in this room", status_code=403)
+            if self.open_position(now) != position:
+                raise RoomError("Question is not open")
+            if player.last_position >= position:
+                raise RoomError("Question already answered")
+            answer_key = self.answer_keys[position]
+            if choice_id not in answer_key:
+                raise RoomError("Selected choice does not belong to this question")
+
+            is_correct = answer_key[choice_id]
+            points = 0
+            if is_correct:
+                # Half the points for being right, half for being quick
+                remaining = self.closes_at(position) - now
+                points = 500 + round(500 * remaining / self.seconds_per_question)
+            return is_correct, points
+
+    def record(self, answer, position, points):
+        """Count a graded answer once its UserAnswer is saved"""
+        with self.lock:
+            player = self.players[answer.user_id]
+            player.last_position = max(player.last_position, position)
+            player.score += points
+            player.correct += int(answer.is_correct)
+            self.choice_counts[position][answer.selected_choice_id] += 1
+            self.pending_answers.append(answer)
+
+    def take_pending_answers(self):
+        with self.lock:
+            answers, self.pending_answers = self.pending_answers, []
+        return answers
+
+    def snapshot(self, now):
+        position = self.open_position(now)
+        data = {
+            "type": "state",
+            "code": self.code,
+            "status": self.status,
+            "host_id": self.host_id,
+            "question_count": len(self.questions),
+            "seconds_per_question": self.seconds_per_question,
+            "results_seconds": RESULTS_SECONDS,
+            "starts_at": _iso(self.starts_at),
+            "players": len(self.players),
+            "standings": self.standings(),
+            "question": None,
+        }
+        if self.status == TournamentRoom.LOBBY:
+            data["player_names"] = [player.name for player in self.players.values()]
+        if position is not None:
+            data["question"] = self._question_event(position)
+        return data
+
+
+_rooms = {}  # code -> RoomState
+_rooms_lock = threading.Lock()
+
+
+def _load(code):
+    try:
+        room = TournamentRoom.objects.get(code=code)
+    except TournamentRoom.DoesNotExist:
+        raise RoomError("Room not found", status_code=404)
+
+    players = [
+        PlayerState(user_id, name, score, correct, last_position)
+        for user_id, name, score, correct, last_position in room.players.order_by('joined_at').values_list(
+            'user_id', 'user__full_name', 'score', 'correct_count', 'last_position'
+        )
+    ]
+    questions = []
+    answer_keys = []
+    room_questions = RoomQuestion.objects.filter(room=room).order_by('position').select_related(
+        'question'
+    ).prefetch_related('question__choices')
+    for room_question in room_questions:
+        choices = sorted(room_question.question.choices.all(), key=lambda choice: choice.index)
+        questions.append({
+            "id": room_question.question_id,
+            "question_text": room_question.question.question_text,
+            "choices": [{"id": c.id, "text": c.text, "index": c.index} for c in choices],
+        })
+        answer_keys.append({c.id: c.is_correct for c in choices})
+
+    state = RoomState(room, players, questions, answer_keys)
+    if state.status == TournamentRoom.RUNNING:
+        # Catch up silently; a room that ran out while nobody was watching is finished now
+        if any(event["type"] == "finished" for event in state.advance(time.time())):
+            _persist_finished(state)
+    return state
+
+
+def get_state(code):
+    state = _rooms.get(code)
+    if state is None:
+        loaded = _load(code)
+        if loaded.status == TournamentRoom.FINISHED:
+            # Only rooms that can still change are kept in memory
+            return loaded
+        with _rooms_lock:
+            state = _rooms.setdefault(code, loaded)
+    return state
+
+
+def _publish(state, events):
+    topic = room_topic(state.code)
+    for event in events:
+        pubsub.publish(topic, live.encode_event(event))
+
+
+def _persist_finished(state):
+    # Scores are already saved answer by answer
+    TournamentRoom.objects.filter(id=state.id).update(status=TournamentRoom.FINISHED, finished_at=timezone.now())
+    with _rooms_lock:
+        _rooms.pop(state.code, None)
+
+
+def _record_pending_answers(state):
+    """Apply the rollups of the answers saved since the last call, as one batch"""
+    answers = state.take_pending_answers()
+    if answers:
+        with transaction.atomic():
+            rollups.record_answers(answers)
+
+
+def _advance(state):
+    events = state.advance(time.time())
+    if events:
+        if any(event["type"] == "results" for event in events):
+            _record_pending_answers(state)
+        if events[-1]["type"] == "finished":
+            _persist_finished(state)
+        _publish(state, events)
+
+
+def tick(code):
+    """Publish whatever is due in the room; returns seconds until the next deadline, or None"""
+    state = get_state(code)
+    _advance(state)
+    return state.next_deadline(time.time())
+
+
+def _new_code():
+    alphabet = string.ascii_uppercase + string.digits
+    while True:
+        code = ''.join(random.choices(alphabet, k=CODE_LENGTH))
+        if not TournamentRoom.objects.filter(code=code).exists():
+            return code
+
+
+def create_room(host, question_count, seconds_per_question):
+    question_ids = question_pool.sample_question_ids(question_count)
+    if len(question_ids) < question_count:
+        raise RoomError(f"Not enough questions available for a room (need at least {question_count})")
+
+    with transaction.atomic():
+        room = TournamentRoom.objects.create(
+            code=_new_code(), host=host, seconds_per_question=seconds_per_question
+        )
+        RoomQuestion.objects.bulk_create([
+            RoomQuestion(room=room, question_id=question_id, position=i)
+            for i, question_id in enumerate(question_ids)
+        ])
+        RoomPlayer.objects.create(room=room, user=host)
+    return get_state(room.code)
+
+
+def join_room(code, user):
+    state = get_state(code)
+    if user.id in state.players:
+        return state
+    if state.status != TournamentRoom.LOBBY:
+        raise RoomError("Room has already started")
+    RoomPlayer.objects.get_or_create(room_id=state.id, user=user)
+    with state.lock:
+        state.players[user.id] = PlayerState(user.id, user.full_name)
+        players = len(state.players)
+    _publish(state, [{"type": "player_joined", "user_id": user.id, "name": user.full_name, "players": players}])
+    return state
+
+
+def start_room(code, user):
+    state = get_state(code)
+    if state.host_id != user.id:
+        raise RoomError("Only the host can start the room", status_code=403)
+
+    starts_at = time.time() + COUNTDOWN_SECONDS
+    with state.lock:
+        if state.status != TournamentRoom.LOBBY:
+            raise RoomError("Room has already started")
+        state.starts_at = starts_at
+        state.status = TournamentRoom.RUNNING
+    TournamentRoom.objects.filter(id=state.id).update(status=TournamentRoom.RUNNING, starts_at=_iso(starts_at))
+    _publish(state, [{
+        "type": "started",
+        "starts_at": _iso(starts_at),
+        "question_count": len(state.questions),
+        "seconds_per_question": state.seconds_per_question,
+        "results_seconds": RESULTS_SECONDS,
+    }])
+    return state
+
+
+def submit_answer(code, user, position, choice_id):
+    state = get_state(code)
+    _advance(state)
+    is_correct, points = state.grade(user.id, position, choice_id, time.time())
+    # Counts towards the player's progress like any other answer
+    answer = UserAnswer(
+        user=user, question_id=state.questions[position]["id"], selected_choice_id=choice_id, is_correct=is_correct
+    )
+    with transaction.atomic():
+        # The position check also turns away a second answer racing this one
+        updated = RoomPlayer.objects.filter(room_id=state.id, user=user, last_position__lt=position).update(
+            score=F('score') + points, correct_count=F('correct_count') + int(is_correct), last_position=position
+        )
+        if not updated:
+            raise RoomError("Question already answered")
+        # No post_save: the rollups are applied with the rest of the question's answers
+        UserAnswer.objects.bulk_create([answer])
+    state.record(answer, position, points)
+    if state.closed >= position:
+        # The question closed while this answer was being saved
+        _record_pending_answers(state)
+    return is_correct, points
+
+
+def snapshot(code):
+    state = get_state(code)
+    _advance(state)
+    return state.snapshot(time.time())
@@ -0,0 +1,87 @@
+"""
+Read-replica routing.
+
+Views that only read mark themselves with `replica_reads = True`. For GET and
+HEAD requests to those views, ReplicaRoutingMiddleware switches on replica
+reads for the rest of the request through a context variable. ReplicaRouter
+then sends that request's reads to the 'replica' alias. Everything else,
+including every write, goes to 'default'. Without a 'replica' database
+(DATABASE_REPLICA_URL unset) nothing changes.
+
+A replica can lag the primary by a moment. The marked views (leaderboard,
+random questions, progress) are the ones that tolerate that. Users, tokens
+and sessions are always read from the primary, so a user who has just
+registered or logged in is never turned away by a lagging replica. Data cached
+under versions bumped on the primary, such as the question id pools, is loaded
+from the primary too.
+"""
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+REPLICA = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+PRIMARY_ONLY_MODELS = {settings.AUTH_USER_MODEL.lower(), 'authtoken.token', 'sessions.session'}
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and replica_configured() and model._meta.label_lower not in PRIMARY_ONLY_MODELS:
+            return REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        return db != REPLICA
+
+
+def _reads_from_replica(request):
+    if request.method not in READ_METHODS or not replica_configured():
+        return False
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    return getattr(getattr(match.func, 'view_class', None), 'replica_reads', False)
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = _use_replica.set(_reads_from_replica(request))
+        try:
+            return self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+    async def __acall__(self, request):
+        token = _use_replica.set(_reads_from_replica(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
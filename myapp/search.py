@@ -0,0 +1,121 @@
+"""
+Full-text search over Question and HardQuestion text.
+
+On SQLite each model gets an external-content FTS5 table that mirrors the
+searchable columns. Triggers on the source table keep it in sync on every
+insert, delete and update of those columns, including bulk_create and
+cascaded deletes.
+Other database backends fall back to icontains filters.
+"""
+import re
+
+from django.db import connections
+
+from .models import Question, HardQuestion
+
+# model -> columns copied into the FTS table
+SEARCH_FIELDS = {
+    Question: ['question_text'],
+    HardQuestion: ['question_text', 'correct_answer'],
+}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_table(model):
+    return f"{model._meta.db_table}_fts"
+
+
+def is_available(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def _trigger_sql(model):
+    table = model._meta.db_table
+    fts = fts_table(model)
+    columns = ', '.join(SEARCH_FIELDS[model])
+    new_values = ', '.join(f"new.{c}" for c in SEARCH_FIELDS[model])
+    old_values = ', '.join(f"old.{c}" for c in SEARCH_FIELDS[model])
+    insert_new = f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+    delete_old = f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    return {
+        f"{fts}_ai": f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f"{fts}_ad": f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END",
+        # Only edits of the indexed text; rating updates on every answer leave the index alone
+        f"{fts}_au": f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {columns} ON {table} BEGIN {delete_old} {insert_new} END",
+    }
+
+
+def ensure_search_indexes(using='default', **kwargs):
+    """
+    Create the FTS tables and sync triggers if they are missing, and rebuild an
+    index whose triggers had to be recreated. Safe to run repeatedly; it runs
+    after every migrate because SQLite table rebuilds drop the triggers.
+    """
+    if not is_available(using):
+        return
+
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {row[0] for row in cursor.fetchall()}
+
+        for model, fields in SEARCH_FIELDS.items():
+            if model._meta.db_table not in existing:
+                continue
+            fts = fts_table(model)
+            rebuild = fts not in existing
+            if rebuild:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {fts} USING fts5({', '.join(fields)}, "
+                    f"content='{model._meta.db_table}', content_rowid='id', tokenize='unicode61')"
+                )
+            for name, sql in _trigger_sql(model).items():
+                if name not in existing:
+                    cursor.execute(sql)
+                    rebuild = True
+            if rebuild:
+                cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix"""
+    tokens = _TOKEN_RE.findall(text or '')
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_ids(model, text, limit=50, using='default'):
+    """
+    Return ids of `model` rows matching `text`, best match first.
+    Returns None when full-text search is unavailable on this backend.
+    """
+    if not is_available(using):
+        return None
+
+    match = build_match_query(text)
+    if match is None:
+        return []
+
+    fts = fts_table(model)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s ORDER BY bm25({fts}) LIMIT %s",
+            [match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search(model, text, limit=50):
+    """Return matching model instances ranked by relevance"""
+    ids = search_ids(model, text, limit=limit)
+    if ids is None:
+        queryset = model.objects.none()
+        for field in SEARCH_FIELDS[model]:
+            queryset = queryset | model.objects.filter(**{f"{field}__icontains": text})
+        return list(queryset.order_by('-created_at')[:limit])
+
+    objects = model.objects.in_bulk(ids)
+    return [objects[i] for i in ids if i in objects]
@@ -0,0 +1,395 @@
+"""
+Synthetic data at realistic volumes, for benchmarks and local load testing.
+
+Seeder writes users, questions with choices, hard questions and the attempt
+tables in batches with bulk_create, one transaction per table. That skips the
+per-row signals, so the rollups they maintain (activity and answer stats) are
+rebuilt once by finish(). Questions get their near-duplicate LSH buckets batch
+by batch as they are inserted. On SQLite, bulk_load_pragmas() speeds the load up
+further by giving up crash safety while it runs.
+Question histories, review schedules and ratings are left as they are; run
+calibrate_ratings for ratings.
+
+Every value is drawn from one random.Random(seed), so the same seed, volumes
+and batch size produce the same rows. The shapes follow real usage: a few
+users account for most of the answers, some questions are answered far more
+often than others, correctness depends on the question's difficulty and the
+user's ability, and timestamps lean towards the recent past.
+"""
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from itertools import islice
+
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import activity, dedupe, question_pool, ratings, stats
+from .models import (
+    Choice, HardQuestion, HardQuestionAttempt, Question, QuestionAttempt, QuestionLSHBucket, TournamentAttempt,
+    TournamentQuestion, User, UserAnswer,
+)
+
+SCALES = {
+    'small': {
+        'users': 200, 'questions': 1000, 'hard_questions': 200, 'answers': 10000,
+        'attempts': 5000, 'hard_attempts': 2000, 'tournaments': 1000,
+    },
+    'medium': {
+        'users': 2000, 'questions': 10000, 'hard_questions': 2000, 'answers': 100000,
+        'attempts': 50000, 'hard_attempts': 20000, 'tournaments': 10000,
+    },
+    'large': {
+        'users': 20000, 'questions': 100000, 'hard_questions': 20000, 'answers': 1000000,
+        'attempts': 500000, 'hard_attempts': 200000, 'tournaments': 100000,
+    },
+}
+# Order matters: the attempt tables pick from the users and questions made before them
+VOLUME_NAMES = ('users', 'questions', 'hard_questions', 'answers', 'attempts', 'hard_attempts', 'tournaments')
+
+EMAIL_DOMAIN = 'seed.example.com'
+PASSWORD = 'seed-password'
+TIMEZONES = (
+    'UTC', 'Europe/London', 'Europe/Berlin', 'America/New_York', 'America/Los_Angeles',
+    'America/Sao_Paulo', 'Asia/Kolkata', 'Asia/Tokyo', 'Australia/Sydney',
+)
+FIRST_NAMES = ('Ada', 'Ben', 'Chloe', 'Dev', 'Elif', 'Femi', 'Grace', 'Hiro', 'Ines', 'Jon', 'Kira', 'Luis', 'Maya', 'Noor')
+LAST_NAMES = ('Ahmed', 'Brown', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Haddad', 'Ito', 'Jones', 'Khan', 'Lopez')
+HARD_SOLVE_RATE = {1: 0.85, 2: 0.7, 3: 0.55, 4: 0.4, 5: 0.25}  # by difficulty
+TOURNAMENT_QUESTIONS = 5
+
+BULK_LOAD_PRAGMAS = {
+    'synchronous': 'OFF',      # don't wait for the disk at each commit
+    'journal_mode': 'MEMORY',  # keep the rollback journal off the filesystem
+    'temp_store': 'MEMORY',
+    'cache_size': '-262144',   # 256 MB of page cache, so index pages stay in memory
+}
+
+
+@contextmanager
+def bulk_load_pragmas(connection):
+    """SQLite settings for a bulk load, restored afterwards; other databases are left alone"""
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    previous = {}
+    with connection.cursor() as cursor:
+        for name, value in BULK_LOAD_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}')
+            previous[name] = cursor.fetchone()[0]
+            cursor.execute(f'PRAGMA {name} = {value}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for name, value in previous.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def keep_timestamps(*models):
+    """Let bulk_create store the given auto_now_add values instead of the current time"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _extend_cumulative(totals, weights):
+    """Append running totals of `weights` to `totals`, the form random.choices(cum_weights=) takes"""
+    total = totals[-1] if totals else 0
+    for weight in weights:
+        total += weight
+        totals.append(total)
+
+
+def _logit(p):
+    return math.log(p / (1 - p))
+
+
+class Seeder:
+    def __init__(self, seed=0, batch_size=5000, days=365, now=None, log=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.days = days
+        self.now = now or timezone.now()
+        self.log = log or (lambda message: None)
+        self.counts = {}  # table -> rows written
+
+        # Users: id, ability (log-odds added to a question's), seconds since joining, cumulative activity
+        self.user_ids = []
+        self.user_ability = []
+        self.user_age = []
+        self.user_weights = []
+        # Questions: id, log-odds of a correct answer, (correct choice, wrong choices), cumulative popularity
+        self.question_ids = []
+        self.question_ease = []
+        self.question_choices = []
+        self.question_weights = []
+        # Hard questions: id, correct answer, difficulty, cumulative popularity
+        self.hard_ids = []
+        self.hard_answers = []
+        self.hard_difficulty = []
+        self.hard_weights = []
+
+    def _insert(self, model, objects):
+        """bulk_create `objects` batch by batch; returns their new primary keys"""
+        ids = []
+        for batch in _batches(objects, self.batch_size):
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+            ids.extend(obj.pk for obj in batch)
+        self.counts[model._meta.db_table] = self.counts.get(model._meta.db_table, 0) + len(ids)
+        return ids
+
+    def _when(self, user):
+        """A time since the user joined, more likely recent than old"""
+        return self.now - timedelta(seconds=self.user_age[user] * self.rng.random() ** 2)
+
+    def _pick_users(self, count):
+        if not self.user_ids:
+            raise ValueError("Seed users first")
+        return self.rng.choices(range(len(self.user_ids)), cum_weights=self.user_weights, k=count)
+
+    def _pick_questions(self, count):
+        if not self.question_ids:
+            raise ValueError("Seed questions first")
+        return self.rng.choices(range(len(self.question_ids)), cum_weights=self.question_weights, k=count)
+
+    def _answers_correctly(self, user, question):
+        odds = self.question_ease[question] + self.user_ability[user]
+        return self.rng.random() < 1 / (1 + math.exp(-odds))
+
+    def users(self, count):
+        rng = self.rng
+        first = User.objects.filter(email__endswith='@' + EMAIL_DOMAIN).count()
+        password = make_password(PASSWORD)  # hashing once keeps this fast; every seeded user shares it
+        joined = [self.days * 86400 * rng.random() for _ in range(count)]
+
+        def rows():
+            for n in range(count):
+                yield User(
+                    email=f'user{first + n}@{EMAIL_DOMAIN}',
+                    full_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                    date_of_birth=date(1960, 1, 1) + timedelta(days=rng.randrange(50 * 365)),
+                    timezone=rng.choice(TIMEZONES),
+                    password=password,
+                    created_at=self.now - timedelta(seconds=joined[n]),
+                )
+
+        with keep_timestamps(User):
+            self.user_ids += self._insert(User, rows())
+        self.user_ability += [rng.gauss(0, 0.8) for _ in range(count)]
+        self.user_age += joined
+        # Pareto activity: roughly a fifth of the users give most of the answers
+        _extend_cumulative(self.user_weights, (rng.paretovariate(1.16) for _ in range(count)))
+
+    def questions(self, count, choices_per_question=4):
+        rng = self.rng
+        first = len(self.question_ids)
+        specs = []  # (a, b, correct index) per question
+        created = []
+
+        def questions():
+            for n in range(count):
+                a, b = rng.randrange(2, 500), rng.randrange(2, 500)
+                specs.append((a, b, rng.randrange(choices_per_question)))
+                question = Question(
+                    question_text=f"Question {first + n + 1}: what is {a} + {b}?",
+                    created_at=self.now - timedelta(seconds=self.days * 86400 * rng.random()),
+                )
+                created.append(question)
+                yield question
+
+        with keep_timestamps(Question):
+            ids = self._insert(Question, questions())
+
+        choice_rows = []
+        for question_id, (a, b, correct) in zip(ids, specs):
+            offsets = rng.sample(range(1, 20), choices_per_question - 1)
+            values = iter(a + b + offset * rng.choice((-1, 1)) for offset in offsets)
+            for index in range(choices_per_question):
+                is_correct = index == correct
+                text = str(a + b) if is_correct else str(next(values))
+                choice_rows.append(Choice(question_id=question_id, text=text, index=index, is_correct=is_correct))
+        choice_ids = self._insert(Choice, choice_rows)
+        for batch in _batches(created, self.batch_size):
+            dedupe.index_questions(batch)
+        table = QuestionLSHBucket._meta.db_table
+        self.counts[table] = self.counts.get(table, 0) + len(created) * dedupe.NUM_BANDS
+
+        for n, question_id in enumerate(ids):
+            own = choice_ids[n * choices_per_question:(n + 1) * choices_per_question]
+            correct = own[specs[n][2]]
+            self.question_choices.append((correct, [choice for choice in own if choice != correct]))
+        self.question_ids += ids
+        self.question_ease += [_logit(rng.betavariate(4, 2)) for _ in ids]
+        _extend_cumulative(self.question_weights, (rng.paretovariate(2.0) for _ in ids))
+
+    def hard_questions(self, count):
+        rng = self.rng
+        first = len(self.hard_ids)
+        answers = []
+        difficulties = []
+
+        def rows():
+            for n in range(count):
+                root = rng.randrange(2, 1000)
+                difficulty = min(5, 1 + int(math.log10(root) * 1.5) + rng.randrange(2))
+                answers.append(str(root))
+                difficulties.append(difficulty)
+                yield HardQuestion(
+                    question_text=f"Hard question {first + n + 1}: what is the square root of {root * root}?",
+                    correct_answer=str(root),
+                    difficulty=difficulty,
+                    rating=ratings.difficulty_rating(difficulty),
+                    created_at=self.now - timedelta(seconds=self.days * 86400 * rng.random()),
+                )
+
+        with keep_timestamps(HardQuestion):
+            self.hard_ids += self._insert(HardQuestion, rows())
+        self.hard_answers += answers
+        self.hard_difficulty += difficulties
+        _extend_cumulative(self.hard_weights, (rng.paretovariate(2.0) for _ in range(count)))
+
+    def answers(self, count):
+        """UserAnswer rows, as written by quizzes and single attempts"""
+        rng = self.rng
+
+        def rows():
+            for batch in _batches(range(count), self.batch_size):
+                for user, question in zip(self._pick_users(len(batch)), self._pick_questions(len(batch))):
+                    correct_choice, wrong_choices = self.question_choices[question]
+                    is_correct = self._answers_correctly(user, question)
+                    yield UserAnswer(
+                        user_id=self.user_ids[user],
+                        question_id=self.question_ids[question],
+                        selected_choice_id=correct_choice if is_correct else rng.choice(wrong_choices),
+                        is_correct=is_correct,
+                        created_at=self._when(user),
+                    )
+
+        with keep_timestamps(UserAnswer):
+            self._insert(UserAnswer, rows())
+
+    def attempts(self, count, anonymous_share=0.2):
+        """QuestionAttempt rows; some come from the public, signed-out endpoint"""
+        rng = self.rng
+
+        def rows():
+            for batch in _batches(range(count), self.batch_size):
+                for user, question in zip(self._pick_users(len(batch)), self._pick_questions(len(batch))):
+                    anonymous = rng.random() < anonymous_share
+                    yield QuestionAttempt(
+                        user_id=None if anonymous else self.user_ids[user],
+                        question_id=self.question_ids[question],
+                        is_correct=self._answers_correctly(user, question),
+                        created_at=self._when(user),
+                    )
+
+        with keep_timestamps(QuestionAttempt):
+            self._insert(QuestionAttempt, rows())
+
+    def hard_attempts(self, count):
+        if not self.hard_ids:
+            raise ValueError("Seed hard questions first")
+        rng = self.rng
+        indexes = range(len(self.hard_ids))
+
+        def rows():
+            for batch in _batches(range(count), self.batch_size):
+                questions = rng.choices(indexes, cum_weights=self.hard_weights, k=len(batch))
+                for user, question in zip(self._pick_users(len(batch)), questions):
+                    odds = _logit(HARD_SOLVE_RATE[self.hard_difficulty[question]]) + self.user_ability[user]
+                    is_correct = rng.random() < 1 / (1 + math.exp(-odds))
+                    answer = self.hard_answers[question]
+                    if not is_correct:
+                        answer = rng.choice((str(int(answer) + rng.choice((-1, 1))), answer + '0', 'no idea'))
+                    yield HardQuestionAttempt(
+                        user_id=self.user_ids[user],
+                        question_id=self.hard_ids[question],
+                        user_answer=answer,
+                        is_correct=is_correct,
+                        created_at=self._when(user),
+                    )
+
+        with keep_timestamps(HardQuestionAttempt):
+            self._insert(HardQuestionAttempt, rows())
+
+    def tournaments(self, count):
+        """Completed tournaments with their questions"""
+        if len(self.question_ids) < TOURNAMENT_QUESTIONS:
+            raise ValueError(f"Seed at least {TOURNAMENT_QUESTIONS} questions first")
+        rng = self.rng
+        indexes = range(len(self.question_ids))
+        picked = []  # (user, question indexes, outcomes) per tournament
+
+        def rows():
+            for batch in _batches(range(count), self.batch_size):
+                for user in self._pick_users(len(batch)):
+                    questions = rng.sample(indexes, TOURNAMENT_QUESTIONS)
+                    outcomes = [self._answers_correctly(user, question) for question in questions]
+                    picked.append((questions, outcomes))
+                    start = self._when(user)
+                    seconds = round(rng.lognormvariate(math.log(45), 0.5), 2)
+                    yield TournamentAttempt(
+                        user_id=self.user_ids[user],
+                        start_time=start,
+                        end_time=start + timedelta(seconds=seconds),
+                        total_seconds=seconds,
+                        questions_count=TOURNAMENT_QUESTIONS,
+                        correct_count=sum(outcomes),
+                        completed=True,
+                    )
+
+        with keep_timestamps(TournamentAttempt):
+            ids = self._insert(TournamentAttempt, rows())
+        self._insert(TournamentQuestion, (
+            TournamentQuestion(
+                tournament_id=tournament_id,
+                question_id=self.question_ids[question],
+                answered=True,
+                is_correct=is_correct,
+                position=position,
+            )
+            for tournament_id, (questions, outcomes) in zip(ids, picked)
+            for position, (question, is_correct) in enumerate(zip(questions, outcomes), start=1)
+        ))
+
+    def finish(self):
+        """Rebuild what the skipped signals would have maintained"""
+        question_pool.bump_version('question')
+        question_pool.bump_version('hard')
+        activity.rebuild(apps.get_model)
+        stats.rebuild(apps.get_model)
+
+    def run(self, volumes, rebuild=True):
+        """Seed every table named in `volumes` (see SCALES), in dependency order"""
+        for name in VOLUME_NAMES:
+            if volumes.get(name):
+                written = sum(self.counts.values())
+                started = time.monotonic()
+                with transaction.atomic():
+                    getattr(self, name)(volumes[name])
+                rows = sum(self.counts.values()) - written
+                self.log(f"{name}: {rows} rows in {time.monotonic() - started:.1f}s")
+        if rebuild:
+            started = time.monotonic()
+            self.finish()
+            self.log(f"rebuilt activity rollups and answer stats in {time.monotonic() - started:.1f}s")
+        return self.counts
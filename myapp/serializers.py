@@ -1,24 +1,37 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import gettext_lazy as _
-from .models import HardQuestion, HardQuestionAttempt, Question, Choice, QuestionAttempt, TournamentAttempt, TournamentQuestion
+from .question_bank import bulk_create_questions
+from .timewindows import get_zone
+from .models import HardQuestion, HardQuestionAttempt, Question, Choice, QuestionAttempt, ReviewItem, TournamentAttempt, TournamentQuestion
 
 User = get_user_model()
 
+def validate_timezone_name(value):
+    if get_zone(value) is None:
+        raise serializers.ValidationError("Unknown timezone.")
+    return value
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ('id', 'email', 'full_name', 'date_of_birth', 'phone_number')
+        fields = ('id', 'email', 'full_name', 'date_of_birth', 'phone_number', 'timezone')
         read_only_fields = ('id',)
 
+    def validate_timezone(self, value):
+        return validate_timezone_name(value)
+
 class RegisterSerializer(serializers.ModelSerializer):
     password2 = serializers.CharField(write_only=True, required=True)
 
     class Meta:
         model = User
-        fields = ('email', 'full_name', 'password', 'password2', 'date_of_birth', 'phone_number')
+        fields = ('email', 'full_name', 'password', 'password2', 'date_of_birth', 'phone_number', 'timezone')
         extra_kwargs = {'password': {'write_only': True}}
 
+    def validate_timezone(self, value):
+        return validate_timezone_name(value)
+
     def validate(self, data):
         if data['password'] != data['password2']:
             raise serializers.ValidationError({"password": "Password fields didn't match."})
@@ -72,12 +85,7 @@ class QuestionCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         choices_data = validated_data.pop('choices', [])
-        question = Question.objects.create(**validated_data)
-
-        for choice_data in choices_data:
-            Choice.objects.create(question=question, **choice_data)
-
-        return question
+        return bulk_create_questions([(validated_data['question_text'], choices_data)])[0]
 
 class QuestionDisplaySerializer(serializers.ModelSerializer):
     choices = ChoiceSerializer(many=True, read_only=True)
@@ -89,14 +97,24 @@ class QuestionDisplaySerializer(serializers.ModelSerializer):
 
     def get_correct_choice(self, obj):
         try:
-            # Get the first correct choice instead of expecting only one
-            correct_choice = obj.choices.filter(is_correct=True).first()
+            # Get the first correct choice instead of expecting only one; reads
+            # the same (possibly prefetched) choices as the choices field
+            correct_choice = min(
+                (choice for choice in obj.choices.all() if choice.is_correct),
+                key=lambda choice: choice.pk,
+                default=None
+            )
             if correct_choice:
                 return correct_choice.index
             return None
         except Exception:
             return None
 
+class QuestionSearchResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Question
+        fields = ['id', 'question_text', 'created_at']
+
 class QuestionAttemptSerializer(serializers.ModelSerializer):
     class Meta:
         model = QuestionAttempt
@@ -104,6 +122,15 @@ class QuestionAttemptSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
+class ReviewItemSerializer(serializers.ModelSerializer):
+    question_data = QuestionDisplaySerializer(source='question', read_only=True)
+
+    class Meta:
+        model = ReviewItem
+        fields = ['id', 'question', 'question_data', 'repetitions', 'interval_days', 'due_at', 'last_reviewed_at']
+        read_only_fields = fields
+
+
 # Tournament serializers
 class TournamentQuestionSerializer(serializers.ModelSerializer):
     question_data = QuestionDisplaySerializer(source='question', read_only=True)
@@ -0,0 +1,67 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import activity, live, question_pool, ratings, rollups
+from .models import Choice, HardQuestion, HardQuestionAttempt, Question, TournamentAttempt, TournamentQuestion, User, UserAnswer
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_bank_changed(sender, **kwargs):
+    question_pool.bump_version('question')
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def choice_changed(sender, **kwargs):
+    # Choices are part of the question bank's responses, such as the admin question list
+    question_pool.bump_version('question')
+
+
+@receiver(pre_save, sender=HardQuestion)
+def rate_new_hard_question(sender, instance, **kwargs):
+    # New hard questions start from their hand-set difficulty, like those rated by migration 0009
+    if instance._state.adding and instance.rating == ratings.DEFAULT_RATING:
+        instance.rating = ratings.difficulty_rating(instance.difficulty)
+
+
+@receiver([post_save, post_delete], sender=HardQuestion)
+def hard_question_bank_changed(sender, **kwargs):
+    question_pool.bump_version('hard')
+
+
+@receiver(post_save, sender=UserAnswer)
+def answer_recorded(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_answers([instance])
+
+
+@receiver(post_save, sender=HardQuestionAttempt)
+def hard_answer_recorded(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_hard_answers([instance])
+
+
+@receiver(post_save, sender=TournamentAttempt)
+def tournament_started(sender, instance, created, **kwargs):
+    if created:
+        activity.record(instance.user, instance.start_time, tournaments=1)
+
+
+@receiver(post_save, sender=TournamentAttempt)
+def tournament_changed(sender, instance, **kwargs):
+    live.tournament_changed(instance.user_id)
+    if instance.completed:
+        live.leaderboard_changed()
+
+
+@receiver([post_save, post_delete], sender=User)
+def player_changed(sender, instance, **kwargs):
+    # Leaderboard entries show the player's name
+    update_fields = kwargs.get('update_fields')
+    if update_fields is None or 'full_name' in update_fields:
+        live.leaderboard_changed()
+
+
+@receiver(post_save, sender=TournamentQuestion)
+def tournament_question_answered(sender, instance, created, **kwargs):
+    if not created:
+        live.tournament_changed(instance.tournament.user_id)
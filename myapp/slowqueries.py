@@ -0,0 +1,189 @@
+"""
+Slow-query log.
+
+Every query that takes SLOW_QUERY_MS or longer is logged as one JSON line on
+the myapp.slowqueries logger and kept in an in-process ring buffer. Each entry
+records the view that ran the query and the line of project code that issued
+it. The first time a query's fingerprint is seen, the entry also stores the
+database's plan for it: EXPLAIN QUERY PLAN on SQLite, EXPLAIN on PostgreSQL.
+
+Entries are grouped by the fingerprint the N+1 detector uses, so one slow
+query repeated across requests becomes a single entry with a count and
+timings. The buffer keeps the SLOW_QUERY_LOG_SIZE most recently seen
+fingerprints. Staff can browse it at admin/slow-queries/. Each process keeps
+its own buffer.
+
+SLOW_QUERY_MS = 0 turns the log off.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import instrumentation, nplusone
+
+logger = logging.getLogger('myapp.slowqueries')
+
+SKIP_FILES = nplusone.WRAPPER_FILES | {os.path.abspath(__file__)}
+MAX_SQL_LENGTH = 4000
+
+_request = contextvars.ContextVar('slowqueries_request', default=None)
+_explaining = contextvars.ContextVar('slowqueries_explaining', default=False)
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # fingerprint -> SlowQuery, least recently seen first
+
+
+class SlowQuery:
+    __slots__ = ('fingerprint', 'sql', 'params', 'count', 'total_ms', 'max_ms', 'view', 'site', 'plan',
+                 'first_seen', 'last_seen')
+
+    def __init__(self, fingerprint, plan):
+        self.fingerprint = fingerprint
+        self.plan = plan
+        self.sql = None  # the slowest occurrence
+        self.params = None
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.view = None
+        self.site = None
+        self.first_seen = timezone.now()
+        self.last_seen = self.first_seen
+
+    @property
+    def mean_ms(self):
+        return self.total_ms / self.count if self.count else 0.0
+
+
+def get_threshold_ms():
+    return getattr(settings, 'SLOW_QUERY_MS', 100)
+
+
+def explain(connection, sql, params):
+    """The database's plan for a SELECT, one step per line, or None for other statements"""
+    if sql.lstrip()[:6].upper() not in ('SELECT', 'WITH'):
+        return None
+    token = _explaining.set(True)
+    try:
+        # Not one of the request's queries, so the metrics and the N+1 detector
+        # don't count it. The savepoint keeps a failed EXPLAIN from aborting
+        # the request's transaction on PostgreSQL.
+        with instrumentation.ignore(), nplusone.ignore(), transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+                # SQLite's rows are (id, parent, notused, detail) and PostgreSQL's a single column
+                return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    except DatabaseError as exc:
+        return f'EXPLAIN failed: {exc}'
+    finally:
+        _explaining.reset(token)
+
+
+def _view():
+    request = _request.get()
+    return instrumentation.view_name(request) if request is not None else None
+
+
+def record(connection, sql, params, many, elapsed_ms):
+    shape = nplusone.fingerprint(sql)
+    with _lock:
+        entry = _entries.get(shape)
+    plan = None
+    if entry is None and not many:
+        # Only the first occurrence is explained; the plan rarely changes between calls
+        plan = explain(connection, sql, params)
+
+    view = _view()
+    site = nplusone.call_site(SKIP_FILES)
+    with _lock:
+        entry = _entries.get(shape)
+        if entry is None:
+            entry = _entries[shape] = SlowQuery(shape, plan)
+            while len(_entries) > getattr(settings, 'SLOW_QUERY_LOG_SIZE', 200):
+                _entries.popitem(last=False)
+        else:
+            _entries.move_to_end(shape)
+        entry.count += 1
+        entry.total_ms += elapsed_ms
+        entry.last_seen = timezone.now()
+        entry.view = view
+        entry.site = site
+        if elapsed_ms >= entry.max_ms:
+            entry.max_ms = elapsed_ms
+            entry.sql = sql[:MAX_SQL_LENGTH]
+            entry.params = None if many else repr(params)[:MAX_SQL_LENGTH]
+
+    logger.warning(json.dumps({
+        "event": "slow_query",
+        "ms": round(elapsed_ms, 1),
+        "view": view,
+        "site": site,
+        "query": shape[:MAX_SQL_LENGTH],
+        "plan": plan,
+    }))
+
+
+def entries():
+    """Snapshot of the buffer, most recently seen first"""
+    with _lock:
+        return list(reversed(_entries.values()))
+
+
+def reset():
+    with _lock:
+        _entries.clear()
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    threshold = get_threshold_ms()
+    if not threshold or _explaining.get():
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms >= threshold:
+        record(context['connection'], sql, params, many, elapsed_ms)
+    return result
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """connection_created receiver: add the timing wrapper to each new connection"""
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+class SlowQueryMiddleware:
+    """Makes the current request known to the wrapper, so entries name their view"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = _request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
+
+    async def __acall__(self, request):
+        token = _request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _request.reset(token)
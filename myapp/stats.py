@@ -0,0 +1,147 @@
+"""
+Per-question answer rollups.
+
+QuestionStats and HardQuestionStats are updated in the same transaction as
+every UserAnswer and HardQuestionAttempt, one row write per question for a
+whole batch of answers, so admin pages and the stats API read
+one row per question instead of grouping over the attempt tables.
+
+QuestionStats counts UserAnswer rows only, the answers that name the chosen
+choice. A QuestionAttempt without one, such as an anonymous attempt through
+questions/attempt/public/, is left out: it has no choice to add to the
+histogram, and nothing tells it apart from the QuestionAttempt row that
+mirrors each UserAnswer, so counting both would count those answers twice.
+
+The wrong-answer histogram of a hard question is bounded with the Space-Saving
+algorithm: it keeps the MAX_WRONG_ANSWERS most common answers, and a new answer
+replaces the rarest one, inheriting its count. Counts of the frequent answers
+are exact or slightly overestimated.
+"""
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from . import archive
+from .models import HardQuestionStats, QuestionStats
+
+MAX_WRONG_ANSWERS = 50
+
+
+def normalize_answer(answer):
+    """Same normalization used when grading hard questions"""
+    return (answer or '').lower().strip()
+
+
+def accuracy(stats):
+    if stats is None or not stats.attempts:
+        return None
+    return stats.correct_count / stats.attempts * 100
+
+
+def _locked_rows(model, question_ids):
+    """question_id -> the model's row for each question, created if missing and locked"""
+    model.objects.bulk_create([model(question_id=question_id) for question_id in question_ids], ignore_conflicts=True)
+    rows = model.objects.select_for_update().filter(question_id__in=question_ids).order_by('pk')
+    return {row.question_id: row for row in rows}
+
+
+def record_answers(answers):
+    """Add (question_id, selected_choice_id, is_correct) answers"""
+    answers = list(answers)
+    if not answers:
+        return
+    with transaction.atomic():
+        rows = _locked_rows(QuestionStats, {answer[0] for answer in answers})
+        for question_id, selected_choice_id, is_correct in answers:
+            stats = rows[question_id]
+            stats.attempts += 1
+            stats.correct_count += int(bool(is_correct))
+            key = str(selected_choice_id)
+            stats.choice_counts[key] = stats.choice_counts.get(key, 0) + 1
+        QuestionStats.objects.bulk_update(rows.values(), ['attempts', 'correct_count', 'choice_counts'])
+
+
+def record_hard_answers(answers):
+    """Add (question_id, user_answer, is_correct) attempts"""
+    answers = list(answers)
+    if not answers:
+        return
+    with transaction.atomic():
+        rows = _locked_rows(HardQuestionStats, {answer[0] for answer in answers})
+        for question_id, user_answer, is_correct in answers:
+            stats = rows[question_id]
+            stats.attempts += 1
+            if is_correct:
+                stats.correct_count += 1
+            else:
+                add_wrong_answer(stats.wrong_answers, normalize_answer(user_answer))
+        HardQuestionStats.objects.bulk_update(rows.values(), ['attempts', 'correct_count', 'wrong_answers'])
+
+
+def add_wrong_answer(histogram, answer, limit=MAX_WRONG_ANSWERS):
+    if answer in histogram or len(histogram) < limit:
+        histogram[answer] = histogram.get(answer, 0) + 1
+        return
+    rarest = min(histogram, key=histogram.get)
+    histogram[answer] = histogram.pop(rarest) + 1
+
+
+def top_wrong_answers(stats, limit=10):
+    if stats is None:
+        return []
+    ranked = sorted(stats.wrong_answers.items(), key=lambda item: (-item[1], item[0]))
+    return [{"answer": answer, "count": count} for answer, count in ranked[:limit]]
+
+
+def rebuild(get_model):
+    """
+    Recompute every QuestionStats and HardQuestionStats row from the attempt tables
+    and their archives.
+    `get_model` is apps.get_model, so migrations can pass their historical registry.
+    """
+    UserAnswer = get_model('myapp', 'UserAnswer')
+    HardQuestionAttempt = get_model('myapp', 'HardQuestionAttempt')
+    QuestionStats = get_model('myapp', 'QuestionStats')
+    HardQuestionStats = get_model('myapp', 'HardQuestionStats')
+
+    stats = {}
+    picks = UserAnswer.objects.order_by().values_list('question_id', 'selected_choice_id').annotate(
+        picks=Count('id'), correct=Count('id', filter=Q(is_correct=True))
+    )
+    # Archived answers count one by one, and may belong to questions deleted since
+    question_ids = set(get_model('myapp', 'Question').objects.values_list('id', flat=True))
+    archived = (
+        (question_id, choice_id, 1, int(bool(is_correct)))
+        for question_id, choice_id, is_correct
+        in archive.rows(get_model, UserAnswer, ('question_id', 'selected_choice_id', 'is_correct'))
+        if question_id in question_ids
+    )
+    for question_id, choice_id, count, correct in chain(archived, picks):
+        item = stats.setdefault(question_id, QuestionStats(question_id=question_id, choice_counts={}))
+        item.attempts += count
+        item.correct_count += correct
+        key = str(choice_id)
+        item.choice_counts[key] = item.choice_counts.get(key, 0) + count
+
+    hard_stats = {}
+    hard_ids = set(get_model('myapp', 'HardQuestion').objects.values_list('id', flat=True))
+    fields = ('question_id', 'user_answer', 'is_correct')
+    attempts = chain(
+        (row for row in archive.rows(get_model, HardQuestionAttempt, fields) if row[0] in hard_ids),
+        HardQuestionAttempt.objects.order_by('id').values_list(*fields).iterator(chunk_size=10000),
+    )
+    for question_id, user_answer, is_correct in attempts:
+        item = hard_stats.setdefault(question_id, HardQuestionStats(question_id=question_id, wrong_answers={}))
+        item.attempts += 1
+        if is_correct:
+            item.correct_count += 1
+        else:
+            add_wrong_answer(item.wrong_answers, normalize_answer(user_answer))
+
+    with transaction.atomic():
+        QuestionStats.objects.all().delete()
+        HardQuestionStats.objects.all().delete()
+        QuestionStats.objects.bulk_create(stats.values(), batch_size=1000)
+        HardQuestionStats.objects.bulk_create(hard_stats.values(), batch_size=1000)
+    return len(stats), len(hard_stats)
@@ -1,3 +1,421 @@
-from django.test import TestCase
+import asyncio
+import logging
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from . import instrumentation, live, nplusone, percentiles, pubsub, question_pool, ratings, rooms, search, slowqueries
+from .models import (
+    HardQuestion, HardQuestionAttempt, HardQuestionStats, Question, QuestionAttempt, QuestionStats, RoomPlayer,
+    TournamentAttempt, TournamentQuestion, TournamentRoom, User, UserAnswer,
+)
+from .question_bank import bulk_create_questions
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class APITestCase(TestCase):
+    """Each test starts with an empty cache and no question pools left over from earlier tests"""
+
+    def setUp(self):
+        cache.clear()
+        question_pool.forget('question')
+        question_pool.forget('hard')
+        self.client = APIClient()
+
+    def make_user(self, email='player@example.com', **extra):
+        return User.objects.create_user(
+            email=email, password='password', full_name=email.split('@')[0].title(), date_of_birth='2000-01-01',
+            **extra
+        )
+
+    def make_questions(self, count, start=0):
+        return bulk_create_questions([
+            (f"What is {i} + {i}?", [{"text": str(i * 2 + k), "index": k, "is_correct": k == 0} for k in range(4)])
+            for i in range(start, start + count)
+        ])
+
+    def count_queries(self, request):
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertLess(response.status_code, 300, getattr(response, 'data', response.content))
+        return len(queries)
+
+
+class FingerprintTests(TestCase):
+    def test_literals_and_in_lists_match(self):
+        self.assertEqual(
+            nplusone.fingerprint("SELECT * FROM q WHERE id = 5 AND text = 'a'"),
+            nplusone.fingerprint("SELECT * FROM q WHERE id = 17 AND text = 'it''s'"),
+        )
+        self.assertEqual(
+            nplusone.fingerprint('SELECT * FROM q WHERE id IN (%s, %s)'),
+            nplusone.fingerprint('SELECT * FROM q WHERE id IN (%s, %s, %s, %s)'),
+        )
+        self.assertNotEqual(
+            nplusone.fingerprint('SELECT * FROM q WHERE id = 1'),
+            nplusone.fingerprint('SELECT * FROM c WHERE id = 1'),
+        )
+
+
+@override_settings(NPLUSONE_MODE='raise', NPLUSONE_THRESHOLD=3)
+class NPlusOneMiddlewareTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ids = [question.id for question in self.make_questions(5)]
+
+    def run_view(self, view):
+        middleware = nplusone.NPlusOneMiddleware(view)
+        return middleware(RequestFactory().get('/api/questions/'))
+
+    def one_by_one(self, count):
+        def view(request):
+            for question_id in self.ids[:count]:
+                Question.objects.filter(id=question_id).first()
+            return 'ok'
+        return view
+
+    def test_repeated_query_raises(self):
+        with self.assertRaisesMessage(nplusone.NPlusOneError, 'Query repeated more than 3 times'):
+            self.run_view(self.one_by_one(4))
+
+    def test_threshold_repeats_pass(self):
+        self.assertEqual(self.run_view(self.one_by_one(3)), 'ok')
+
+    def test_ignored_queries_pass(self):
+        view = self.one_by_one(5)
+
+        def ignoring(request):
+            with nplusone.ignore():
+                return view(request)
+
+        self.assertEqual(self.run_view(ignoring), 'ok')
+
+    @override_settings(NPLUSONE_MODE='log')
+    def test_log_mode_logs_once(self):
+        with self.assertLogs('myapp.nplusone', logging.WARNING) as logs:
+            self.run_view(self.one_by_one(5))
+            self.run_view(self.one_by_one(5))
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('"event": "n_plus_one"', logs.output[0])
+
+
+class QueryCountTests(APITestCase):
+    """The endpoints fixed for N+1 patterns run the same queries however many rows they return"""
+
+    def test_question_list(self):
+        self.client.force_authenticate(self.make_user('admin@example.com', is_staff=True))
+        self.make_questions(2)
+        few = self.count_queries(lambda: self.client.get('/api/questions/create/'))
+        self.make_questions(6, start=2)
+        self.assertEqual(self.count_queries(lambda: self.client.get('/api/questions/create/')), few)
+
+    def test_tournament_questions(self):
+        user = self.make_user()
+        self.client.force_authenticate(user)
+        questions = self.make_questions(6)
+
+        def tournament_of(size):
+            tournament = TournamentAttempt.objects.create(user=user, questions_count=size)
+            TournamentQuestion.objects.bulk_create([
+                TournamentQuestion(tournament=tournament, question=question, position=i + 1)
+                for i, question in enumerate(questions[:size])
+            ])
+            return lambda: self.client.get(f'/api/tournaments/{tournament.id}/questions/')
+
+        self.assertEqual(self.count_queries(tournament_of(2)), self.count_queries(tournament_of(6)))
+
+    def test_quiz_result(self):
+        self.client.force_authenticate(self.make_user())
+        questions = list(
+            Question.objects.filter(id__in=[q.id for q in self.make_questions(9)]).prefetch_related('choices')
+        )
+
+        def quiz_of(chosen):
+            items = [
+                {"question_id": q.id, "selected_choice_id": q.choices.all()[0].id, "is_correct": True} for q in chosen
+            ]
+            return lambda: self.client.post(
+                '/api/user/quiz-result/', {"score": len(items), "total": len(items), "questions": items}, format='json'
+            )
+
+        self.assertEqual(self.count_queries(quiz_of(questions[:3])), self.count_queries(quiz_of(questions[3:])))
+        self.assertEqual(QuestionAttempt.objects.count(), 9)
+        self.assertEqual(UserAnswer.objects.count(), 9)
+        user = User.objects.get()
+        self.assertEqual(user.activity_summary.answers, 9)
+        self.assertEqual(user.review_items.count(), 9)
+        self.assertEqual(QuestionStats.objects.filter(attempts=1, correct_count=1).count(), 9)
+
+    def test_hard_quiz_result(self):
+        self.client.force_authenticate(self.make_user())
+        questions = HardQuestion.objects.bulk_create([
+            HardQuestion(question_text=f"Spell {i}", correct_answer=str(i)) for i in range(9)
+        ])
+
+        def quiz_of(chosen):
+            items = [{"question_id": q.id, "user_answer": "wrong", "is_correct": False} for q in chosen]
+            return lambda: self.client.post(
+                '/api/hard-questions/quiz-result/', {"score": 0, "total": len(items), "questions": items}, format='json'
+            )
+
+        self.assertEqual(self.count_queries(quiz_of(questions[:3])), self.count_queries(quiz_of(questions[3:])))
+        self.assertEqual(HardQuestionAttempt.objects.count(), 9)
+        self.assertEqual(User.objects.get().activity_summary.hard_attempts, 9)
+        self.assertEqual(HardQuestionStats.objects.filter(attempts=1, wrong_answers={"wrong": 1}).count(), 9)
+
+
+class QuestionSearchTests(APITestCase):
+    def test_limit_is_clamped(self):
+        self.client.force_authenticate(self.make_user('admin@example.com', is_staff=True))
+        self.make_questions(5)
+        response = self.client.get('/api/questions/search/', {'q': 'what', 'limit': -1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        response = self.client.get('/api/questions/search/', {'q': 'what', 'limit': 3})
+        self.assertEqual(len(response.data), 3)
+
+    def test_index_follows_text_edits_only(self):
+        question = self.make_questions(1)[0]
+        Question.objects.filter(id=question.id).update(question_text='Name the largest ocean')
+        self.assertEqual(search.search_ids(Question, 'ocean'), [question.id])
+        self.assertEqual(search.search_ids(Question, 'what'), [])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE name = %s", [f'{search.fts_table(Question)}_au'])
+            self.assertIn('AFTER UPDATE OF question_text ON', cursor.fetchone()[0])
+
+
+class RatingTests(APITestCase):
+    def test_new_hard_questions_start_from_difficulty(self):
+        self.client.force_authenticate(self.make_user('admin@example.com', is_staff=True))
+        response = self.client.post(
+            '/api/hard-questions/create/', {"question_text": "Spell it", "correct_answer": "it", "difficulty": 5},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(HardQuestion.objects.get(id=response.data['id']).rating, ratings.difficulty_rating(5))
+
+    def test_answer_reads_both_ratings_once(self):
+        user = self.make_user()
+        question = self.make_questions(1)[0]
+        with self.assertNumQueries(3):
+            ratings.record_answers(Question, [(user.id, question.id, True)])
+        user.refresh_from_db()
+        question.refresh_from_db()
+        self.assertEqual(user.rating, ratings.DEFAULT_RATING + ratings.USER_K / 2)
+        self.assertEqual(question.rating, ratings.DEFAULT_RATING - ratings.QUESTION_K / 2)
+
+
+class PercentileTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(percentiles, '_state', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def complete(self, user, seconds):
+        TournamentAttempt.objects.create(user=user, questions_count=1, completed=True, total_seconds=seconds)
+
+    def test_own_time_is_not_counted_among_others(self):
+        players = [self.make_user(f'player{i}@example.com') for i in range(3)]
+        for player, seconds in zip(players, (10.0, 20.0, 30.0)):
+            self.complete(player, seconds)
+        self.assertEqual(percentiles.faster_than(players[0].id, 10.0), 100.0)
+
+        # A best time recorded by another process since the last rebuild
+        newcomer = self.make_user('newcomer@example.com')
+        self.complete(newcomer, 15.0)
+        self.assertEqual(percentiles.faster_than(newcomer.id, 15.0), round(2 / 3 * 100, 1))
+        # Improved elsewhere: the stale 30s entry is the user's own, not a slower player
+        self.assertEqual(percentiles.faster_than(players[2].id, 5.0), 100.0)
+
+
+class StalePoolTests(APITestCase):
+    """Ids of questions deleted since the pool was loaded are never served or inserted"""
+
+    def setUp(self):
+        super().setUp()
+        questions = self.make_questions(10)
+        question_pool.question_ids()
+        # The version bump waits for a commit that never comes, so the pool stays stale
+        Question.objects.filter(id__in=[q.id for q in questions[:4]]).delete()
+        self.remaining = set(Question.objects.values_list('id', flat=True))
+
+    def test_random_question(self):
+        for _ in range(10):
+            response = self.client.get('/api/questions/random/')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(response.json()['id'], self.remaining)
+
+    def test_start_tournament(self):
+        self.client.force_authenticate(self.make_user())
+        response = self.client.post('/api/tournaments/start/')
+        self.assertEqual(response.status_code, 201)
+        chosen = TournamentQuestion.objects.filter(tournament_id=response.data['tournament_id'])
+        self.assertEqual(len(chosen), 5)
+        self.assertLessEqual({row.question_id for row in chosen}, self.remaining)
+
+    def test_sample_question_ids(self):
+        self.assertLessEqual(set(question_pool.sample_question_ids(6)), self.remaining)
+        self.assertEqual(len(question_pool.sample_question_ids(20)), 6)
+
+
+class RoomTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_questions(3)
+        self.host = self.make_user('host@example.com')
+        self.guest = self.make_user('guest@example.com')
+        self.now = 1_000_000.0
+        clock = mock.patch('myapp.rooms.time')
+        clock.start().time.side_effect = lambda: self.now
+        self.addCleanup(clock.stop)
+        self.state = rooms.create_room(self.host, 2, 10)
+        self.addCleanup(rooms._rooms.pop, self.state.code, None)
+        rooms.join_room(self.state.code, self.guest)
+        rooms.start_room(self.state.code, self.host)
+        self.now += rooms.COUNTDOWN_SECONDS + 1
+
+    def right_choice(self, position):
+        return next(choice for choice, is_correct in self.state.answer_keys[position].items() if is_correct)
+
+    def test_restart_keeps_scores_and_answered_positions(self):
+        is_correct, points = rooms.submit_answer(self.state.code, self.host, 0, self.right_choice(0))
+        self.assertTrue(is_correct)
+        rooms._rooms.clear()  # as after a restart
+
+        state = rooms.get_state(self.state.code)
+        self.assertIsNot(state, self.state)
+        self.assertEqual(state.players[self.host.id].score, points)
+        self.assertEqual(state.players[self.host.id].correct, 1)
+        with self.assertRaisesMessage(rooms.RoomError, 'Question already answered'):
+            rooms.submit_answer(self.state.code, self.host, 0, self.right_choice(0))
+
+    def test_finished_room_leaves_memory(self):
+        rooms.submit_answer(self.state.code, self.guest, 0, self.right_choice(0))
+        self.now += 60
+        rooms.tick(self.state.code)
+
+        self.assertNotIn(self.state.code, rooms._rooms)
+        self.assertEqual(TournamentRoom.objects.get(code=self.state.code).status, TournamentRoom.FINISHED)
+        scores = dict(RoomPlayer.objects.filter(room_id=self.state.id).values_list('user_id', 'score'))
+        self.assertEqual(scores[self.host.id], 0)
+        self.assertGreater(scores[self.guest.id], 0)
+        self.assertEqual(rooms.snapshot(self.state.code)['status'], TournamentRoom.FINISHED)
+        self.assertNotIn(self.state.code, rooms._rooms)
+
+    def test_failed_save_leaves_the_answer_open(self):
+        with mock.patch.object(UserAnswer.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                rooms.submit_answer(self.state.code, self.host, 0, self.right_choice(0))
+        self.assertEqual(self.state.players[self.host.id].score, 0)
+        self.assertEqual(RoomPlayer.objects.get(room_id=self.state.id, user=self.host).score, 0)
+        is_correct, points = rooms.submit_answer(self.state.code, self.host, 0, self.right_choice(0))
+        self.assertEqual(self.state.players[self.host.id].score, points)
+
+    def test_rollups_wait_for_the_question_to_close(self):
+        question_id = self.state.questions[0]["id"]
+        rooms.submit_answer(self.state.code, self.host, 0, self.right_choice(0))
+        rooms.submit_answer(self.state.code, self.guest, 0, self.right_choice(0))
+        self.assertEqual(UserAnswer.objects.count(), 2)
+        self.assertFalse(QuestionStats.objects.filter(question_id=question_id).exists())
+
+        self.now += self.state.seconds_per_question
+        rooms.tick(self.state.code)
+        self.assertEqual(QuestionStats.objects.get(question_id=question_id).attempts, 2)
+        self.assertEqual(self.host.activity_summary.answers, 1)
+
+
+class LiveTests(TestCase):
+    def test_publishes_only_changes_to_subscribed_topics(self):
+        snapshots = []
+
+        def snapshot():
+            snapshots.append(1)
+            return {"entries": []}
+
+        self.assertFalse(live.publish_if_changed('test', snapshot))
+        self.assertEqual(snapshots, [])
+
+        async def subscribed():
+            with pubsub.subscribe('test') as subscription:
+                published = [live.publish_if_changed('test', snapshot) for _ in range(2)]
+                return published, await subscription.get(timeout=1)
+
+        published, message = asyncio.run(subscribed())
+        self.assertEqual(published, [True, False])
+        self.assertEqual(message, '{"entries": []}')
+        self.assertFalse(pubsub.has_subscribers('test'))
+
+
+class SlowQueryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        instrumentation.reset()
+        slowqueries.reset()
+        self.addCleanup(instrumentation.reset)
+        self.addCleanup(slowqueries.reset)
+
+    def test_explain_is_not_one_of_the_requests_queries(self):
+        def view(request):
+            Question.objects.count()
+            return HttpResponse('ok')
+
+        # Every query is slow, but only inside assertLogs, so none of them reach the test output
+        with self.assertLogs('myapp.slowqueries'), override_settings(SLOW_QUERY_MS=1e-6):
+            instrumentation.InstrumentationMiddleware(view)(RequestFactory().get('/'))
+        self.assertTrue(slowqueries.entries()[0].plan)
+        self.assertIn('myapp_request_queries_sum{view="<unresolved>"} 1', instrumentation.render_prometheus())
+
+    def test_failed_explain_leaves_the_transaction_usable(self):
+        with transaction.atomic():
+            plan = slowqueries.explain(connection, 'SELECT * FROM no_such_table WHERE id = %s', [1])
+            self.assertTrue(plan.startswith('EXPLAIN failed'))
+            self.assertFalse(connection.needs_rollback)
+            self.assertEqual(Question.objects.count(), 0)
+
+
+class ConditionalGetTests(APITestCase):
+    def test_leaderboard_validates_by_body(self):
+        player = self.make_user()
+        TournamentAttempt.objects.create(
+            user=player, completed=True, questions_count=5, correct_count=5, total_seconds=30.0
+        )
+        response = self.client.get('/api/tournaments/leaderboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        etag = response['ETag']
+
+        response = self.client.get('/api/tournaments/leaderboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        player.full_name = 'Renamed'
+        player.save()
+        response = self.client.get('/api/tournaments/leaderboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['user_name'], 'Renamed')
+
+    def test_question_list_revalidates_after_choice_changes(self):
+        admin = self.make_user('admin@example.com', is_staff=True)
+        self.make_questions(2)
+        self.client.force_authenticate(admin)
+        response = self.client.get('/api/questions/create/')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/questions/create/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.force_authenticate(self.make_user())
+        self.assertEqual(self.client.get('/api/questions/create/', HTTP_IF_NONE_MATCH=etag).status_code, 403)
+
+        self.client.force_authenticate(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            choice = Question.objects.first().choices.first()
+            choice.text = 'changed'
+            choice.save()
+        self.assertEqual(self.client.get('/api/questions/create/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
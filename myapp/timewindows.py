@@ -0,0 +1,43 @@
+"""
+Calendar windows in a user's own timezone.
+
+Day and week boundaries are computed in the user's timezone and converted to
+UTC datetimes up front, so queries filter with plain range predicates on the
+timestamp column (which can use an index) instead of casting every row with
+__date in the server's timezone.
+"""
+import zoneinfo
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+
+def get_zone(name):
+    """ZoneInfo for a timezone name, or None if the name is unknown"""
+    try:
+        return zoneinfo.ZoneInfo(name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError, TypeError):
+        return None
+
+
+def user_zone(user):
+    return get_zone(getattr(user, 'timezone', None) or 'UTC') or dt_timezone.utc
+
+
+def local_day(user, when):
+    """The calendar day `when` falls on for the user"""
+    return when.astimezone(user_zone(user)).date()
+
+
+def local_today(user, now=None):
+    return local_day(user, now or timezone.now())
+
+
+def week_start(day):
+    """Monday of the week containing `day`"""
+    return day - timedelta(days=day.weekday())
+
+
+def day_start_utc(user, day):
+    """UTC instant at which `day` begins for the user"""
+    return datetime.combine(day, time.min, tzinfo=user_zone(user)).astimezone(dt_timezone.utc)
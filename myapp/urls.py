@@ -1,35 +1,57 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
-    CompleteTournamentAPIView, GetActiveTournamentAPIView, GetTournamentQuestionsAPIView, HardQuestionAttemptAPIView, HardQuestionCreateAPIView, HardQuizResultAPIView, LeaderboardAPIView, MultipleRandomQuestionsAPIView, PublicHardQuestionAttemptAPIView, QuizResultAPIView, RandomHardQuestionsAPIView, RegisterView, LoginView,
+    ActiveTournamentStreamView, CohortAnalyticsAPIView, CompleteTournamentAPIView, GetActiveTournamentAsyncView, LeaderboardAsyncView, RandomQuestionAsyncView, DueReviewsAPIView, GetActiveTournamentAPIView, GetTournamentQuestionsAPIView, HardQuestionAttemptAPIView, HardQuestionCreateAPIView, HardQuestionStatsAPIView, HardQuizResultAPIView, LeaderboardAPIView, LeaderboardStreamView, MetricsAPIView, MultipleRandomQuestionsAPIView, PublicHardQuestionAttemptAPIView, QuestionAccuracyMatrixAPIView, QuestionSearchAPIView, QuestionStatsAPIView, QuizResultAPIView, RandomHardQuestionsAPIView, RegisterView, LoginView,
+    RoomAnswerAPIView, RoomCreateAPIView, RoomDetailAPIView, RoomJoinAPIView, RoomStartAPIView, RoomStreamView,
     QuestionCreateAPIView, RandomQuestionAPIView,
     QuestionAttemptAPIView, PublicQuestionAttemptAPIView, StartTournamentAPIView, SubmitTournamentAnswerAPIView, UserProfileAPIView,
     UserProgressAPIView, 
 )
 
+
+def read_view(sync_view, async_view):
+    return (async_view if settings.ASYNC_READ_VIEWS else sync_view).as_view()
+
+
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
 
     # Question-related endpoints
     path('questions/create/', QuestionCreateAPIView.as_view(), name='create-question'),
-    path('questions/random/', RandomQuestionAPIView.as_view(), name='random-question'),
+    path('questions/search/', QuestionSearchAPIView.as_view(), name='search-questions'),
+    path('questions/<int:question_id>/stats/', QuestionStatsAPIView.as_view(), name='question-stats'),
+    path('questions/random/', read_view(RandomQuestionAPIView, RandomQuestionAsyncView), name='random-question'),
     path('questions/attempt/', QuestionAttemptAPIView.as_view(), name='question-attempt'),
     path('questions/attempt/public/', PublicQuestionAttemptAPIView.as_view(), name='public-question-attempt'),
     path('user/progress/', UserProgressAPIView.as_view(), name='user-progress'),
-    path('tournaments/leaderboard/', LeaderboardAPIView.as_view(), name='tournament-leaderboard'),
+    path('review/due/', DueReviewsAPIView.as_view(), name='review-due'),
+    path('tournaments/leaderboard/', read_view(LeaderboardAPIView, LeaderboardAsyncView), name='tournament-leaderboard'),
+    path('tournaments/leaderboard/stream/', LeaderboardStreamView.as_view(), name='tournament-leaderboard-stream'),
     path('tournaments/start/', StartTournamentAPIView.as_view(), name='tournament-start'),
     path('tournaments/<int:tournament_id>/questions/', GetTournamentQuestionsAPIView.as_view(), name='tournament-questions'),
     path('tournaments/submit-answer/', SubmitTournamentAnswerAPIView.as_view(), name='tournament-submit'),
     path('tournaments/<int:tournament_id>/complete/', CompleteTournamentAPIView.as_view(), name='tournament-complete'),
-    path('tournaments/active/', GetActiveTournamentAPIView.as_view(), name='tournament-active'),
+    path('tournaments/active/', read_view(GetActiveTournamentAPIView, GetActiveTournamentAsyncView), name='tournament-active'),
+    path('tournaments/active/stream/', ActiveTournamentStreamView.as_view(), name='tournament-active-stream'),
+    path('rooms/create/', RoomCreateAPIView.as_view(), name='room-create'),
+    path('rooms/<str:code>/', RoomDetailAPIView.as_view(), name='room-detail'),
+    path('rooms/<str:code>/join/', RoomJoinAPIView.as_view(), name='room-join'),
+    path('rooms/<str:code>/start/', RoomStartAPIView.as_view(), name='room-start'),
+    path('rooms/<str:code>/answer/', RoomAnswerAPIView.as_view(), name='room-answer'),
+    path('rooms/<str:code>/stream/', RoomStreamView.as_view(), name='room-stream'),
     path('user/progress/', UserProgressAPIView.as_view(), name='user-progress'),
     path('user/quiz-result/', QuizResultAPIView.as_view(), name='quiz-result'),
     path('tournaments/complete/', CompleteTournamentAPIView.as_view(), name='tournament-complete'),
     path('questions/random-multiple/', MultipleRandomQuestionsAPIView.as_view(), name='random-multiple-questions'),
     path('user/profile/', UserProfileAPIView.as_view(), name='user-profile'),
     path('hard-questions/create/', HardQuestionCreateAPIView.as_view(), name='create-hard-question'),
+    path('hard-questions/<int:question_id>/stats/', HardQuestionStatsAPIView.as_view(), name='hard-question-stats'),
     path('hard-questions/random/', RandomHardQuestionsAPIView.as_view(), name='random-hard-questions'),
     path('hard-questions/attempt/', HardQuestionAttemptAPIView.as_view(), name='hard-question-attempt'),
     path('hard-questions/attempt/public/', PublicHardQuestionAttemptAPIView.as_view(), name='public-hard-question-attempt'),
     path('hard-questions/quiz-result/', HardQuizResultAPIView.as_view(), name='hard-quiz-result'),
+    path('metrics/', MetricsAPIView.as_view(), name='metrics'),
+    path('analytics/cohorts/', CohortAnalyticsAPIView.as_view(), name='analytics-cohorts'),
+    path('analytics/question-matrix/', QuestionAccuracyMatrixAPIView.as_view(), name='analytics-question-matrix'),
 ]
\ No newline at end of file
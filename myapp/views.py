@@ -1,19 +1,26 @@
+from asgiref.sync import sync_to_async
 from django.db.models import F  
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
-from rest_framework import permissions
+from rest_framework import permissions, serializers
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
-import random
+import functools
 from django.db import transaction
 from django.utils import timezone
-from .models import HardQuestion, HardQuestionAttempt, Question, Choice, QuestionAttempt, TournamentAttempt, TournamentQuestion, UserAnswer
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views import View
+from .authentication import aauthenticate, unauthorized_response
+from .models import ActivitySummary, HardQuestion, HardQuestionAttempt, Question, Choice, QuestionAttempt, TournamentAttempt, TournamentQuestion, UserAnswer
 from .models import Question, Choice, QuestionAttempt, TournamentAttempt, TournamentQuestion, UserAnswer
+from . import activity, analytics, dedupe, history, instrumentation, live, percentiles, question_pool, review, rollups, rooms, search, stats, timewindows
+from .http_cache import conditional
+from .question_bank import bulk_create_questions, validate_choices
 from .serializers import (
-    HardQuestionAttemptSerializer, HardQuestionCreateSerializer, HardQuestionSerializer, LeaderboardEntrySerializer, RegisterSerializer, LoginSerializer, TournamentQuestionSerializer, UserSerializer,
-    QuestionCreateSerializer, QuestionDisplaySerializer, QuestionAttemptSerializer
+    HardQuestionAttemptSerializer, HardQuestionCreateSerializer, HardQuestionSerializer, RegisterSerializer, LoginSerializer, TournamentQuestionSerializer, UserSerializer,
+    QuestionCreateSerializer, QuestionDisplaySerializer, QuestionAttemptSerializer, QuestionSearchResultSerializer, ReviewItemSerializer
 )
 
 User = get_user_model()
@@ -48,60 +55,83 @@ class QuestionCreateAPIView(APIView):
     """
     permission_classes = [permissions.IsAdminUser]
 
-    def post(self, request):
-        # First validate the question data
-        serializer = QuestionCreateSerializer(data=request.data)
-
-        if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-        # Check if choices were provided
-        choices_data = request.data.get('choices', [])
-        if not choices_data or len(choices_data) < 2:
-            return Response(
-                {"error": "At least two choices must be provided for a question"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        # Ensure only one choice is marked correct
-        correct_choices = [c for c in choices_data if c.get('is_correct')]
+    max_batch_size = 500
 
-        if len(correct_choices) == 0:
+    def post(self, request):
+        """
+        Create one question, or a list of questions in a single transaction.
+        A batch is validated up front; if any item is invalid nothing is inserted
+        and the response lists the errors by item index. Near-duplicates are
+        rejected unless ?allow_duplicates=true is passed.
+        """
+        many = isinstance(request.data, list)
+        items = request.data if many else [request.data]
+
+        if many and not items:
             return Response(
-                {"error": "At least one choice must be marked as correct"},
+                {"error": "At least one question must be provided"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        if len(correct_choices) > 1:
+        if len(items) > self.max_batch_size:
             return Response(
-                {"error": "Only one choice should be marked as correct"},
+                {"error": f"At most {self.max_batch_size} questions can be created per request"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Create the question first
-        question = Question.objects.create(
-            question_text=serializer.validated_data['question_text']
-        )
-
-        # Then add all the choices
-        for choice_data in choices_data:
-            Choice.objects.create(
-                question=question,
-                text=choice_data.get('text', ''),
-                index=choice_data.get('index', 0),
-                is_correct=choice_data.get('is_correct', False)
-            )
-
-        # Return the created question with all its choices
-        result_serializer = QuestionCreateSerializer(question)
+        allow_duplicates = request.query_params.get('allow_duplicates', '').lower() in ('1', 'true', 'yes')
+        valid_items = []
+        valid_indexes = []
+        errors = []
+        for i, item in enumerate(items):
+            serializer = QuestionCreateSerializer(data=item)
+            if not serializer.is_valid():
+                errors.append({"index": i, "errors": serializer.errors})
+                continue
+
+            # Check the choices: at least two, exactly one marked correct
+            choices_data = serializer.validated_data.get('choices', [])
+            error = validate_choices(choices_data)
+            if error:
+                errors.append({"index": i, "errors": {"error": error}})
+                continue
+
+            valid_items.append((serializer.validated_data['question_text'], choices_data))
+            valid_indexes.append(i)
+
+        # Reject near-duplicates of existing questions or of other items in the batch
+        if not allow_duplicates and valid_items:
+            for i, matches in zip(valid_indexes, dedupe.find_near_duplicates(valid_items)):
+                if matches:
+                    for match in matches:
+                        if "index" in match:
+                            match["index"] = valid_indexes[match["index"]]
+                    errors.append({"index": i, "errors": {
+                        "error": "Question is a near-duplicate of an existing question",
+                        "duplicates": matches,
+                    }})
+            errors.sort(key=lambda e: e["index"])
+
+        if errors:
+            body = {"errors": errors} if many else errors[0]["errors"]
+            return Response(body, status=status.HTTP_400_BAD_REQUEST)
+
+        # Insert all questions, then all choices
+        with transaction.atomic():
+            questions = bulk_create_questions(valid_items)
+
+        created = Question.objects.filter(
+            id__in=[q.id for q in questions]
+        ).order_by('id').prefetch_related('choices')
+        result_serializer = QuestionCreateSerializer(created, many=True)
         return Response(
-            result_serializer.data,
+            result_serializer.data if many else result_serializer.data[0],
             status=status.HTTP_201_CREATED
         )
 
+    @conditional('questions', functools.partial(question_pool.bank_version, 'question'))
     def get(self, request):
         """List all questions (admin only)"""
-        questions = Question.objects.all().order_by('-created_at')
+        questions = Question.objects.prefetch_related('choices').order_by('-created_at')
         serializer = QuestionCreateSerializer(questions, many=True)
         return Response(serializer.data)
 
@@ -124,31 +154,158 @@ class QuestionCreateAPIView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
         
+class QuestionSearchAPIView(APIView):
+    """
+    Full-text search over questions for authors checking for duplicates (admin only)
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        kind = request.query_params.get('type', 'question')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            limit = 20
+
+        if not query:
+            return Response(
+                {"error": "Query parameter q is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if kind not in ('question', 'hard'):
+            return Response(
+                {"error": "type must be 'question' or 'hard'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if kind == 'hard':
+            results = search.search(HardQuestion, query, limit=limit)
+            serializer = HardQuestionCreateSerializer(results, many=True)
+        else:
+            results = search.search(Question, query, limit=limit)
+            serializer = QuestionSearchResultSerializer(results, many=True)
+        return Response(serializer.data)
+
+class MetricsAPIView(APIView):
+    """
+    Per-view request metrics in the Prometheus text format (admin only)
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(
+            instrumentation.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+
+class CohortAnalyticsAPIView(APIView):
+    """
+    Answer totals and accuracy per signup week or age band cohort (admin only)
+    """
+    permission_classes = [permissions.IsAdminUser]
+    replica_reads = True
+
+    def get(self, request):
+        by = request.query_params.get('by', 'signup_week')
+        if by not in analytics.COHORTS:
+            return Response(
+                {"error": f"by must be one of {', '.join(analytics.COHORTS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(analytics.cohort_report(by))
+
+
+class QuestionAccuracyMatrixAPIView(APIView):
+    """
+    Accuracy of the most answered questions per cohort (admin only)
+    """
+    permission_classes = [permissions.IsAdminUser]
+    replica_reads = True
+
+    def get(self, request):
+        by = request.query_params.get('by', 'age_band')
+        if by not in analytics.COHORTS:
+            return Response(
+                {"error": f"by must be one of {', '.join(analytics.COHORTS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', analytics.MATRIX_LIMIT)), 1), 500)
+        except ValueError:
+            limit = analytics.MATRIX_LIMIT
+        return Response(analytics.question_matrix(by, limit))
+
+
+class QuestionStatsAPIView(APIView):
+    """
+    Answer statistics of a question from its rollup row (admin only)
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, question_id):
+        question = get_object_or_404(
+            Question.objects.select_related('stats').prefetch_related('choices'), id=question_id
+        )
+        question_stats = getattr(question, 'stats', None)
+        choice_counts = question_stats.choice_counts if question_stats else {}
+
+        return Response({
+            "question_id": question.id,
+            "question_text": question.question_text,
+            "attempts": question_stats.attempts if question_stats else 0,
+            "correct_count": question_stats.correct_count if question_stats else 0,
+            "accuracy": stats.accuracy(question_stats),
+            "choices": [
+                {
+                    "id": choice.id,
+                    "index": choice.index,
+                    "text": choice.text,
+                    "is_correct": choice.is_correct,
+                    "picks": choice_counts.get(str(choice.id), 0),
+                }
+                for choice in sorted(question.choices.all(), key=lambda c: c.index)
+            ],
+        })
+
 class RandomQuestionAPIView(APIView):
     """
     API for getting a random question for students
     """
     permission_classes = [permissions.AllowAny]
+    replica_reads = True
 
     def get(self, request):
-        question_count = Question.objects.count()
-        if question_count == 0:
+        question = question_pool.random_question(Question.objects.prefetch_related('choices'))
+        if question is None:
             return Response(
                 {"error": "No questions available"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        random_index = random.randint(0, question_count - 1)
-        question = Question.objects.all()[random_index]
         serializer = QuestionDisplaySerializer(question)
         return Response(serializer.data)
 
+
+class RandomQuestionAsyncView(View):
+    """
+    Async version of RandomQuestionAPIView, used when ASYNC_READ_VIEWS is on
+    """
+    replica_reads = True
+    async def get(self, request):
+        question = await question_pool.arandom_question(Question.objects.prefetch_related('choices'))
+        if question is None:
+            return JsonResponse({"error": "No questions available"}, status=status.HTTP_404_NOT_FOUND)
+
+        return JsonResponse(QuestionDisplaySerializer(question).data)
+
 class QuestionAttemptAPIView(APIView):
     """
     API for submitting question attempts and tracking progress
     """
     permission_classes = [permissions.IsAuthenticated]
 
+    @transaction.atomic
     def post(self, request):
         question_id = request.data.get('question_id')
         is_correct = request.data.get('is_correct')
@@ -183,6 +340,7 @@ class PublicQuestionAttemptAPIView(APIView):
     """
     permission_classes = [permissions.AllowAny]
 
+    @transaction.atomic
     def post(self, request):
         question_id = request.data.get('question_id')
         is_correct = request.data.get('is_correct')
@@ -219,11 +377,28 @@ class PublicQuestionAttemptAPIView(APIView):
         serializer = QuestionAttemptSerializer(attempt)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+class DueReviewsAPIView(APIView):
+    """
+    Get the user's next spaced-repetition reviews that are due
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            count = min(max(int(request.query_params.get('count', 10)), 1), 50)
+        except ValueError:
+            count = 10
+
+        items = review.due_items(request.user, timezone.now(), count)
+        serializer = ReviewItemSerializer(items, many=True)
+        return Response(serializer.data)
+
 class UserProgressAPIView(APIView):
     """
     API for getting a user's progress
     """
     permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
 
     def get(self, request):
         # Get user's attempts
@@ -244,16 +419,31 @@ class LeaderboardAPIView(APIView):
     Get the top 5 fastest tournament completions
     """
     permission_classes = [permissions.AllowAny]
+    replica_reads = True
 
+    @conditional('leaderboard', public=True)
     def get(self, request):
         # Get only completed tournaments with all correct answers
-        leaderboard = TournamentAttempt.objects.filter(
-            completed=True,
-            correct_count=F('questions_count')
-        ).order_by('total_seconds')[:5]
+        return Response(live.leaderboard_snapshot())
 
-        serializer = LeaderboardEntrySerializer(leaderboard, many=True)
-        return Response(serializer.data)
+
+class LeaderboardAsyncView(View):
+    """
+    Async version of LeaderboardAPIView, used when ASYNC_READ_VIEWS is on
+    """
+    replica_reads = True
+
+    @conditional('leaderboard', public=True)
+    async def get(self, request):
+        return JsonResponse(await live.aleaderboard_snapshot(), safe=False)
+
+
+class LeaderboardStreamView(View):
+    """
+    Server-sent events with the leaderboard, sent again whenever it changes
+    """
+    async def get(self, request):
+        return live.stream_response(live.LEADERBOARD_TOPIC, 'leaderboard', live.leaderboard_snapshot)
 
 class StartTournamentAPIView(APIView):
     """
@@ -276,33 +466,27 @@ class StartTournamentAPIView(APIView):
                 "message": "You already have an active tournament"
             })
 
-        # Create new tournament attempt
-        tournament = TournamentAttempt.objects.create(
-            user=request.user,
-            questions_count=5
-        )
-
-        # Select 5 random questions
-        question_count = Question.objects.count()
-        if question_count < 5:
-            tournament.delete()
+        # Select 5 random questions without repetition
+        selected_ids = question_pool.sample_question_ids(5)
+        if len(selected_ids) < 5:
             return Response(
                 {"error": "Not enough questions available for a tournament (need at least 5)"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Get random questions without repetition
-        all_questions = list(Question.objects.all())
-        selected_questions = random.sample(all_questions, 5)
-
-        # Create tournament questions
-        for i, question in enumerate(selected_questions):
-            TournamentQuestion.objects.create(
-                tournament=tournament,
-                question=question,
-                position=i+1
+        with transaction.atomic():
+            # Create new tournament attempt
+            tournament = TournamentAttempt.objects.create(
+                user=request.user,
+                questions_count=5
             )
 
+            # Create tournament questions
+            TournamentQuestion.objects.bulk_create([
+                TournamentQuestion(tournament=tournament, question_id=question_id, position=i+1)
+                for i, question_id in enumerate(selected_ids)
+            ])
+
         return Response({
             "tournament_id": tournament.id,
             "start_time": tournament.start_time
@@ -325,7 +509,9 @@ class GetTournamentQuestionsAPIView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            questions = TournamentQuestion.objects.filter(tournament=tournament)
+            questions = TournamentQuestion.objects.filter(tournament=tournament).select_related(
+                'question'
+            ).prefetch_related('question__choices')
 
             # Check if questions exist
             if not questions.exists():
@@ -394,27 +580,28 @@ class SubmitTournamentAnswerAPIView(APIView):
             # Update the question's status
             is_correct = selected_choice.is_correct
 
-            # If this answer is correct (and wasn't already marked correct), increment the count
-            if is_correct and not tournament_question.is_correct:
-                tournament_question.is_correct = True
-                tournament_question.answered = True
-                tournament_question.save()
-
-                # Increment correct_count
-                tournament_question.tournament.correct_count += 1
-                tournament_question.tournament.save()
-            else:
-                # For wrong answers, mark as answered
-                tournament_question.answered = True
-                tournament_question.save()
-
-            # Record in UserAnswer for progress tracking
-            UserAnswer.objects.create(
-                user=request.user,
-                question=tournament_question.question,
-                selected_choice=selected_choice,
-                is_correct=is_correct
-            )
+            with transaction.atomic():
+                # If this answer is correct (and wasn't already marked correct), increment the count
+                if is_correct and not tournament_question.is_correct:
+                    tournament_question.is_correct = True
+                    tournament_question.answered = True
+                    tournament_question.save()
+
+                    # Increment correct_count
+                    tournament_question.tournament.correct_count += 1
+                    tournament_question.tournament.save()
+                else:
+                    # For wrong answers, mark as answered
+                    tournament_question.answered = True
+                    tournament_question.save()
+
+                # Record in UserAnswer for progress tracking
+                UserAnswer.objects.create(
+                    user=request.user,
+                    question=tournament_question.question,
+                    selected_choice=selected_choice,
+                    is_correct=is_correct
+                )
 
             # Get correct choice
             try:
@@ -484,6 +671,9 @@ class CompleteTournamentAPIView(APIView):
             tournament.correct_count = correct_count
             tournament.save()
 
+            if tournament.total_seconds is not None:
+                percentiles.record_time(request.user.id, tournament.total_seconds)
+
             return Response({
                 "message": "Tournament completed successfully",
                 "tournament_id": tournament.id,
@@ -527,52 +717,213 @@ class GetActiveTournamentAPIView(APIView):
             return Response({"message": "No active tournament found"}, status=status.HTTP_404_NOT_FOUND)        
 
 
+class GetActiveTournamentAsyncView(View):
+    """
+    Async version of GetActiveTournamentAPIView, used when ASYNC_READ_VIEWS is on
+    """
+    async def get(self, request):
+        user = await aauthenticate(request)
+        if user is None:
+            return unauthorized_response()
+
+        active_tournament = await TournamentAttempt.objects.filter(
+            user=user,
+            completed=False
+        ).order_by('-start_time').afirst()
+
+        if active_tournament:
+            return JsonResponse({
+                "tournament_id": active_tournament.id,
+                "start_time": serializers.DateTimeField().to_representation(active_tournament.start_time),
+                "questions_count": active_tournament.questions_count
+            })
+        else:
+            return JsonResponse({"message": "No active tournament found"}, status=status.HTTP_404_NOT_FOUND)
+
+
+class ActiveTournamentStreamView(View):
+    """
+    Server-sent events with the user's active tournament state, sent again whenever it changes.
+    Authenticated with an Authorization header or ?token=
+    """
+    async def get(self, request):
+        user = await aauthenticate(request)
+        if user is None:
+            return unauthorized_response()
+        return live.stream_response(
+            live.tournament_topic(user.id), 'tournament', lambda: live.tournament_state(user.id)
+        )
+
+
+class RoomCreateAPIView(APIView):
+    """
+    Create a multiplayer tournament room; the creator is its host and first player
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            question_count = int(request.data.get('question_count', 5))
+            seconds_per_question = int(request.data.get('seconds_per_question', 20))
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "question_count and seconds_per_question must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 1 <= question_count <= 20 or not 5 <= seconds_per_question <= 120:
+            return Response(
+                {"error": "question_count must be 1-20 and seconds_per_question 5-120"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            state = rooms.create_room(request.user, question_count, seconds_per_question)
+        except rooms.RoomError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+        return Response(rooms.snapshot(state.code), status=status.HTTP_201_CREATED)
+
+
+class RoomDetailAPIView(APIView):
+    """
+    Current state of a room
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, code):
+        try:
+            return Response(rooms.snapshot(code))
+        except rooms.RoomError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+
+
+class RoomJoinAPIView(APIView):
+    """
+    Join a room while it is in the lobby
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, code):
+        try:
+            rooms.join_room(code, request.user)
+            return Response(rooms.snapshot(code))
+        except rooms.RoomError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+
+
+class RoomStartAPIView(APIView):
+    """
+    Start a room (host only); questions begin after a short countdown
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, code):
+        try:
+            rooms.start_room(code, request.user)
+            return Response(rooms.snapshot(code))
+        except rooms.RoomError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+
+
+class RoomAnswerAPIView(APIView):
+    """
+    Answer the room's open question
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, code):
+        try:
+            position = int(request.data.get('position'))
+            selected_choice_id = int(request.data.get('selected_choice_id'))
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "position and selected_choice_id are required integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            is_correct, points = rooms.submit_answer(code, request.user, position, selected_choice_id)
+        except rooms.RoomError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+        return Response({"is_correct": is_correct, "points": points})
+
+
+class RoomStreamView(View):
+    """
+    Server-sent events for a room: its state, then lobby, question, results and finish events.
+    Authenticated with an Authorization header or ?token=
+    """
+    async def get(self, request, code):
+        user = await aauthenticate(request)
+        if user is None:
+            return unauthorized_response()
+        try:
+            await sync_to_async(rooms.get_state)(code)
+        except rooms.RoomError as e:
+            return JsonResponse({"error": str(e)}, status=e.status_code)
+        return live.stream_response(
+            rooms.room_topic(code), 'room', lambda: rooms.snapshot(code), tick=lambda: rooms.tick(code)
+        )
+
+
 
 
 
 
 
 
-from django.db.models import Avg, Count, F, Q
+from django.db.models import Avg, Count, F, Q, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import timedelta
 
 class UserProgressAPIView(APIView):
     """Get detailed user progress statistics compared to other users"""
     permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
 
     def get(self, request):
         user = request.user
-        today = timezone.now().date()
-        start_of_week = today - timedelta(days=today.weekday())
+        # Days and weeks follow the user's timezone; raw timestamps are compared
+        # against the precomputed UTC start of their week
+        today = timewindows.local_today(user)
+        start_of_week = timewindows.week_start(today)
+        week_start_utc = timewindows.day_start_utc(user, start_of_week)
 
-        # Count regular question answers (non-tournament)
-        user_answers = UserAnswer.objects.filter(user=user)
-        weekly_user_answers = user_answers.filter(created_at__date__gte=start_of_week)
+        # Personal figures come from the activity rollups: one summary row plus
+        # one range read of daily rows covering both this week and the sparkline
+        summary = ActivitySummary.objects.filter(user=user).first()
+        sparkline_start = today - timedelta(days=activity.SPARKLINE_DAYS - 1)
+        daily = activity.daily_rows(user, min(start_of_week, sparkline_start), today)
+        week = activity.window_totals(daily, start_of_week, today)
 
-        # Calculate personal stats
-        total_answers = user_answers.count()
-        correct_answers = user_answers.filter(is_correct=True).count()
+        total_answers = summary.answers if summary else 0
+        correct_answers = summary.correct_answers if summary else 0
 
-        weekly_answers = weekly_user_answers.count()
-        weekly_correct = weekly_user_answers.filter(is_correct=True).count()
+        weekly_answers = week['answers']
+        weekly_correct = week['correct_answers']
 
         # Tournament stats
-        tournament_attempts = TournamentAttempt.objects.filter(user=user).count()
+        tournament_attempts = summary.tournaments if summary else 0
         completed_tournaments = TournamentAttempt.objects.filter(user=user, completed=True).count()
 
-        # Calculate app-wide averages
-        active_users = User.objects.filter(
-            Q(answers__isnull=False) | Q(tournament_attempts__isnull=False)
-        ).distinct().count()
-
-        if active_users == 0:
-            active_users = 1  # Prevent division by zero
+        # App-wide lifetime figures are sums over the activity summaries, which
+        # also count answers that have been archived (see myapp/archive.py).
+        # This week's answers are never old enough to be archived.
+        app = ActivitySummary.objects.aggregate(
+            all_answers=Coalesce(Sum('answers'), 0),
+            all_correct=Coalesce(Sum('correct_answers'), 0),
+            all_hard_attempts=Coalesce(Sum('hard_attempts'), 0),
+            all_hard_correct=Coalesce(Sum('hard_correct'), 0),
+            all_tournaments=Coalesce(Sum('tournaments'), 0),
+            active_users=Count('pk', filter=Q(answers__gt=0) | Q(tournaments__gt=0)),
+            hard_active_users=Count('pk', filter=Q(hard_attempts__gt=0)),
+        )
+        active_users = app['active_users'] or 1  # Prevent division by zero
 
         # App-wide averages
-        all_answers = UserAnswer.objects.count()
-        all_weekly_answers = UserAnswer.objects.filter(created_at__date__gte=start_of_week).count()
-        all_correct_answers = UserAnswer.objects.filter(is_correct=True).count()
+        all_answers = app['all_answers']
+        all_weekly_answers = UserAnswer.objects.filter(created_at__gte=week_start_utc).count()
+        all_correct_answers = app['all_correct']
 
         # Average stats per user
         avg_answers_per_user = all_answers / active_users
@@ -582,7 +933,7 @@ class UserProgressAPIView(APIView):
         app_correct_pct = (all_correct_answers / all_answers * 100) if all_answers > 0 else 0
 
         # Tournament stats
-        all_tournaments = TournamentAttempt.objects.count()
+        all_tournaments = app['all_tournaments']
         avg_tournaments_per_user = all_tournaments / active_users
 
         # Average tournament times
@@ -600,16 +951,15 @@ class UserProgressAPIView(APIView):
         ).order_by('total_seconds').first()
 
         # Add hard questions statistics
-        hard_question_attempts = HardQuestionAttempt.objects.filter(user=user)
-        hard_total_attempts = hard_question_attempts.count()
-        hard_correct_attempts = hard_question_attempts.filter(is_correct=True).count()
-        hard_weekly_attempts = hard_question_attempts.filter(created_at__date__gte=start_of_week).count()
-        hard_weekly_correct = hard_question_attempts.filter(created_at__date__gte=start_of_week, is_correct=True).count()
+        hard_total_attempts = summary.hard_attempts if summary else 0
+        hard_correct_attempts = summary.hard_correct if summary else 0
+        hard_weekly_attempts = week['hard_attempts']
+        hard_weekly_correct = week['hard_correct']
 
         # Calculate app-wide hard question stats
-        all_hard_attempts = HardQuestionAttempt.objects.count()
-        all_hard_correct = HardQuestionAttempt.objects.filter(is_correct=True).count()
-        hard_active_users = User.objects.filter(hard_question_attempts__isnull=False).distinct().count() or 1
+        all_hard_attempts = app['all_hard_attempts']
+        all_hard_correct = app['all_hard_correct']
+        hard_active_users = app['hard_active_users'] or 1
 
         return Response({
             "personal_stats": {
@@ -621,12 +971,14 @@ class UserProgressAPIView(APIView):
 
                 "tournament_attempts": tournament_attempts,
                 "completed_tournaments": completed_tournaments,
-                "tournaments_this_week": TournamentAttempt.objects.filter(
-                    user=user, start_time__date__gte=start_of_week
-                ).count(),
+                "tournaments_this_week": week['tournaments'],
 
                 "avg_tournament_time": avg_tournament_time,
                 "best_tournament_time": best_tournament.total_seconds if best_tournament else None,
+                # Share of other players whose best time is slower than the user's best
+                "faster_than_percentage": percentiles.faster_than(
+                    user.id, best_tournament.total_seconds if best_tournament else None
+                ),
 
                 # Hard questions statistics
                 "hard_questions": {
@@ -636,6 +988,12 @@ class UserProgressAPIView(APIView):
                     "this_week": hard_weekly_attempts,
                     "correct_this_week": hard_weekly_correct,
                     "weekly_percentage": (hard_weekly_correct / hard_weekly_attempts * 100) if hard_weekly_attempts > 0 else 0,
+                },
+
+                "activity": {
+                    "current_streak": activity.current_streak(summary, today),
+                    "longest_streak": summary.longest_streak if summary else 0,
+                    "last_30_days": activity.sparkline(daily, sparkline_start, today),
                 }
             },
             "app_averages": {
@@ -654,6 +1012,17 @@ class UserProgressAPIView(APIView):
         })    
 
 
+def _int_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _int_ids(values):
+    return {i for i in map(_int_id, values) if i is not None}
+
+
 # Add to views.py
 class QuizResultAPIView(APIView):
     """
@@ -661,6 +1030,7 @@ class QuizResultAPIView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
 
+    @transaction.atomic
     def post(self, request):
         score = request.data.get('score')
         total = request.data.get('total')
@@ -673,33 +1043,41 @@ class QuizResultAPIView(APIView):
             )
 
         # Record individual question attempts
-        for question_data in questions_data:
-            question_id = question_data.get('question_id')
-            is_correct = question_data.get('is_correct')
-            selected_choice_id = question_data.get('selected_choice_id')
-
-            if question_id and is_correct is not None:
-                question = get_object_or_404(Question, id=question_id)
-
-                # Create question attempt
-                attempt = QuestionAttempt.objects.create(
+        items = [
+            item for item in questions_data
+            if item.get('question_id') and item.get('is_correct') is not None
+        ]
+        # Load every question and choice up front instead of one query per item
+        questions = Question.objects.in_bulk(_int_ids(item['question_id'] for item in items))
+        choices = Choice.objects.in_bulk(_int_ids(
+            item.get('selected_choice_id') for item in items if item.get('selected_choice_id')
+        ))
+        if any(_int_id(item['question_id']) not in questions for item in items):
+            raise Http404("No Question matches the given query.")
+
+        QuestionAttempt.objects.bulk_create([
+            QuestionAttempt(
+                user=request.user,
+                question=questions[_int_id(item['question_id'])],
+                is_correct=item['is_correct']
+            )
+            for item in items
+        ])
+
+        # Also record in UserAnswer, skipping choices that don't exist
+        answers = []
+        for item in items:
+            selected_choice = choices.get(_int_id(item.get('selected_choice_id')))
+            if selected_choice is not None:
+                answers.append(UserAnswer(
                     user=request.user,
-                    question=question,
-                    is_correct=is_correct
-                )
-
-                # Also record in UserAnswer
-                if selected_choice_id:
-                    try:
-                        selected_choice = Choice.objects.get(id=selected_choice_id)
-                        UserAnswer.objects.create(
-                            user=request.user,
-                            question=question,
-                            selected_choice=selected_choice,
-                            is_correct=is_correct
-                        )
-                    except Choice.DoesNotExist:
-                        pass  # Skip if choice doesn't exist
+                    question=questions[_int_id(item['question_id'])],
+                    selected_choice=selected_choice,
+                    is_correct=item['is_correct']
+                ))
+        UserAnswer.objects.bulk_create(answers)
+        # bulk_create sends no post_save, so the rollups are updated here, once for the whole quiz
+        rollups.record_answers(answers)
 
         return Response({
             "message": "Quiz results recorded successfully",
@@ -712,6 +1090,7 @@ class MultipleRandomQuestionsAPIView(APIView):
     API for getting multiple random questions for quizzes
     """
     permission_classes = [permissions.AllowAny]
+    replica_reads = True
 
     def get(self, request):
         count = int(request.query_params.get('count', 10))  # Default to 10 questions
@@ -720,20 +1099,17 @@ class MultipleRandomQuestionsAPIView(APIView):
         if count > 20:
             count = 20
 
-        question_count = Question.objects.count()
-        if question_count == 0:
+        pool = question_pool.question_ids()
+        if len(pool) == 0:
             return Response(
                 {"error": "No questions available"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # If we have fewer questions than requested, return all available
-        if question_count <= count:
-            questions = Question.objects.all()
-        else:
-            # Get random questions without repetition
-            questions = list(Question.objects.all())
-            questions = random.sample(questions, count)
+        # Favour questions the user hasn't seen or got wrong; uniform for anonymous users
+        question_ids = history.choose_question_ids(request.user, count, pool=pool)
+        questions = Question.objects.prefetch_related('choices').in_bulk(question_ids)
+        questions = [questions[i] for i in question_ids if i in questions]
 
         serializer = QuestionDisplaySerializer(questions, many=True)
         return Response(serializer.data)
@@ -755,6 +1131,7 @@ class UserProfileAPIView(APIView):
             'full_name': user.full_name,
             'date_of_birth': user.date_of_birth,
             'phone_number': user.phone_number,
+            'timezone': user.timezone,
             'created_at': user.created_at,
             'is_staff': user.is_staff
         })
@@ -768,6 +1145,7 @@ class UserProfileAPIView(APIView):
         full_name = request.data.get('full_name')
         date_of_birth = request.data.get('date_of_birth')
         phone_number = request.data.get('phone_number')
+        user_timezone = request.data.get('timezone')
         
         # Validate email uniqueness if changing
         if email and email != user.email:
@@ -784,15 +1162,22 @@ class UserProfileAPIView(APIView):
             
         if phone_number is not None:  # Allow empty string to clear phone
             user.phone_number = phone_number
+
+        if user_timezone:
+            if timewindows.get_zone(user_timezone) is None:
+                return Response({'error': 'Unknown timezone'}, status=status.HTTP_400_BAD_REQUEST)
+            user.timezone = user_timezone
         
         try:
-            user.save()
+            # Only write profile fields; ratings and rollups on the row are updated concurrently
+            user.save(update_fields=['email', 'full_name', 'date_of_birth', 'phone_number', 'timezone'])
             return Response({
                 'message': 'Profile updated successfully',
                 'email': user.email,
                 'full_name': user.full_name,
                 'date_of_birth': user.date_of_birth,
-                'phone_number': user.phone_number
+                'phone_number': user.phone_number,
+                'timezone': user.timezone
             })
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -822,6 +1207,7 @@ class HardQuestionCreateAPIView(APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @conditional('hard-questions', functools.partial(question_pool.bank_version, 'hard'))
     def get(self, request):
         """List all hard questions (admin only)"""
         questions = HardQuestion.objects.all().order_by('-created_at')
@@ -847,11 +1233,32 @@ class HardQuestionCreateAPIView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+class HardQuestionStatsAPIView(APIView):
+    """
+    Answer statistics of a hard question from its rollup row (admin only)
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, question_id):
+        question = get_object_or_404(HardQuestion.objects.select_related('stats'), id=question_id)
+        question_stats = getattr(question, 'stats', None)
+
+        return Response({
+            "question_id": question.id,
+            "question_text": question.question_text,
+            "correct_answer": question.correct_answer,
+            "attempts": question_stats.attempts if question_stats else 0,
+            "correct_count": question_stats.correct_count if question_stats else 0,
+            "accuracy": stats.accuracy(question_stats),
+            "common_wrong_answers": stats.top_wrong_answers(question_stats),
+        })
+
 class RandomHardQuestionsAPIView(APIView):
     """
     API for getting random hard questions
     """
     permission_classes = [permissions.AllowAny]
+    replica_reads = True
 
     def get(self, request):
         count = int(request.query_params.get('count', 5))  # Default to 5 questions
@@ -860,21 +1267,36 @@ class RandomHardQuestionsAPIView(APIView):
         if count > 10:
             count = 10
 
-        question_count = HardQuestion.objects.count()
-        if question_count == 0:
+        # Optional difficulty filter: ?difficulty=3 or ?min_difficulty=2&max_difficulty=4
+        try:
+            difficulty = request.query_params.get('difficulty')
+            if difficulty is not None:
+                min_difficulty = max_difficulty = int(difficulty)
+            else:
+                min_difficulty = request.query_params.get('min_difficulty')
+                max_difficulty = request.query_params.get('max_difficulty')
+                min_difficulty = int(min_difficulty) if min_difficulty is not None else None
+                max_difficulty = int(max_difficulty) if max_difficulty is not None else None
+        except ValueError:
+            return Response(
+                {"error": "Difficulty values must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        pools = [
+            pool for level, pool in question_pool.hard_question_pools().items()
+            if (min_difficulty is None or level >= min_difficulty)
+            and (max_difficulty is None or level <= max_difficulty)
+        ]
+        question_ids = question_pool.sample_from_pools(pools, count)
+        if not question_ids:
             return Response(
                 {"error": "No hard questions available"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # If we have fewer questions than requested, return all available
-        if question_count <= count:
-            questions = HardQuestion.objects.all()
-        else:
-            # Get random questions without repetition
-            questions = list(HardQuestion.objects.all())
-            questions = random.sample(questions, count)
-
+        questions = HardQuestion.objects.in_bulk(question_ids)
+        questions = [questions[i] for i in question_ids if i in questions]
         serializer = HardQuestionSerializer(questions, many=True)
         return Response(serializer.data)
 
@@ -884,6 +1306,7 @@ class HardQuestionAttemptAPIView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
 
+    @transaction.atomic
     def post(self, request):
         question_id = request.data.get('question_id')
         user_answer = request.data.get('user_answer')
@@ -932,6 +1355,7 @@ class PublicHardQuestionAttemptAPIView(APIView):
     """
     permission_classes = [permissions.AllowAny]
 
+    @transaction.atomic
     def post(self, request):
         question_id = request.data.get('question_id')
         user_answer = request.data.get('user_answer')
@@ -989,6 +1413,7 @@ class HardQuizResultAPIView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
 
+    @transaction.atomic
     def post(self, request):
         score = request.data.get('score')
         total = request.data.get('total')
@@ -1001,24 +1426,25 @@ class HardQuizResultAPIView(APIView):
             )
 
         # Record individual question attempts
-        for question_data in questions_data:
-            question_id = question_data.get('question_id')
-            user_answer = question_data.get('user_answer')
-            is_correct = question_data.get('is_correct')
-
-            if question_id and user_answer is not None and is_correct is not None:
-                try:
-                    question = HardQuestion.objects.get(id=question_id)
-
-                    # Create question attempt
-                    HardQuestionAttempt.objects.create(
-                        user=request.user,
-                        question=question,
-                        user_answer=user_answer,
-                        is_correct=is_correct
-                    )
-                except HardQuestion.DoesNotExist:
-                    pass  # Skip if question doesn't exist
+        items = [
+            item for item in questions_data
+            if item.get('question_id') and item.get('user_answer') is not None and item.get('is_correct') is not None
+        ]
+        questions = HardQuestion.objects.in_bulk(_int_ids(item['question_id'] for item in items))
+
+        attempts = [
+            HardQuestionAttempt(
+                user=request.user,
+                question=questions[_int_id(item['question_id'])],
+                user_answer=item['user_answer'],
+                is_correct=item['is_correct']
+            )
+            for item in items
+            if _int_id(item['question_id']) in questions  # Skip questions that don't exist
+        ]
+        HardQuestionAttempt.objects.bulk_create(attempts)
+        # bulk_create sends no post_save, so the rollups are updated here, once for the whole quiz
+        rollups.record_hard_answers(attempts)
 
         return Response({
             "message": "Hard quiz results recorded successfully",
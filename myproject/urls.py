@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from myapp.admin import slow_query_log_view
+
 urlpatterns = [
+    path('admin/slow-queries/', admin.site.admin_view(slow_query_log_view), name='slow-queries'),
     path('admin/', admin.site.urls),
     path('api/', include('myapp.urls')),
 ]
\ No newline at end of file